@@ -2,19 +2,128 @@
 # SPDX-License-Identifier: MIT
 
 from argparse import ArgumentParser
+from functools import lru_cache
+from io import TextIOBase
+from json import dumps
 from time import perf_counter
 
 from tensorflow.keras.callbacks import Callback
 
+# Batch sizes in a row not improving throughput before a sweep stops
+PLATEAU_PATIENCE = 2
+
+# Whether this process is a worker running the benchmarks the harness sends
+WORKER = False
+
+
+class RestartWorker(Exception):
+    """The benchmark can't run in this worker's process, a fresh worker has to."""
+
+    pass
+
+
+class StatsChannel:
+    """
+    The harness' stats channel.
+
+    Samples are written as newline-delimited JSON records into the file
+    descriptor in the `O4BCB_STATS_FD` environment variable (if set).
+    """
+
+    def __init__(self):
+        from os import environ, fdopen
+
+        fd = environ.get("O4BCB_STATS_FD")
+        self.file = fdopen(int(fd), "w", buffering=1) if fd is not None else None
+
+    def reply(self, id, status, output):
+        """Write a worker's reply to a request into the channel."""
+        if self.file is not None:
+            self.file.write(
+                dumps({"id": id, "status": status, "output": output}) + "\n"
+            )
+
+    def restart(self, id):
+        """Write a worker's reply asking the harness to run a request in a new one."""
+        if self.file is not None:
+            self.file.write(dumps({"id": id, "restart": True}) + "\n")
+
+    def emit(self, stat, value, count=1, time=None):
+        """
+        Write a sample, accounting for `count` items, into the channel.
+
+        The sample is timestamped with the current time unless its `time` (a
+        `perf_counter` value) is given.
+        """
+        if self.file is not None:
+            self.file.write(
+                dumps(
+                    {
+                        "stat": stat,
+                        "value": value,
+                        "time": perf_counter() if time is None else time,
+                        "count": count,
+                    }
+                )
+                + "\n"
+            )
+
+
+def find_steady_state(times, batch=5):
+    """
+    Find where a series of timings reaches its steady state.
+
+    Uses the MSER-5 rule: the timings are averaged into batches of `batch`
+    samples and truncated where the standard error of the remaining batch means
+    is minimal (truncating at most half of them).
+
+    :returns: the index of the first steady-state timing.
+    """
+    import numpy as np
+
+    n = len(times) // batch
+    if n < 2:
+        return 0
+
+    means = np.asarray(times[: n * batch], dtype=float).reshape(n, batch).mean(1)
+    # Sums of the remaining means (and of their squares) for each truncation
+    remaining = np.arange(n, 0, -1)
+    sums = np.cumsum(means[::-1])[::-1]
+    squares = np.cumsum((means**2)[::-1])[::-1]
+    variances = squares / remaining - (sums / remaining) ** 2
+
+    return int(np.argmin((variances / remaining)[: n // 2 + 1])) * batch
+
+
+def parse_batch_sizes(value):
+    """Parse a comma-separated list of batch sizes (an `argparse` type)."""
+    from argparse import ArgumentTypeError
+
+    try:
+        batch_sizes = [int(size) for size in value.split(",")]
+    except ValueError:
+        batch_sizes = []
+    if not batch_sizes or min(batch_sizes) < 1:
+        raise ArgumentTypeError(f'invalid batch sizes: "{value}"')
+
+    return batch_sizes
+
+
+@lru_cache(maxsize=None)
+def get_channel():
+    """Get the stats channel (the process shares a single one)."""
+    return StatsChannel()
+
 
 class Benchmark:
-    def __init__(self, name: str):
+    def __init__(self, name: str, argv=None):
         from sys import exit
 
         from tensorflow.config import list_physical_devices
         from tensorflow.config.experimental import set_memory_growth
 
         self.name = name
+        self.channel = get_channel()
 
         parser = ArgumentParser(description="A ML MNIST benchmark")
         parser.add_argument("device_type", choices=["gpu", "cpu"], default="gpu")
@@ -26,20 +135,85 @@ class Benchmark:
             "-n", "--n_epochs_training", default=50, nargs="?", type=int
         )
         parser.add_argument("-bs", "--batch_size", default=32, nargs="?", type=int)
+        parser.add_argument(
+            "--batch_sizes",
+            type=parse_batch_sizes,
+            help="Comma-separated batch sizes to sweep (instead of --batch_size), "
+            "stopping once throughput plateaus or memory runs out",
+        )
+        parser.add_argument(
+            "--plateau_threshold",
+            default=0.05,
+            type=float,
+            help="Minimum relative throughput gain of a batch size over the best "
+            "previous one not to count towards the sweep's plateau",
+        )
         parser.add_argument(
             "-l",
             "--iteration_limit",
             help="Maximum number of inference iterations",
             type=int,
         )
+        parser.add_argument(
+            "--warmup_batches",
+            default=0,
+            type=int,
+            help="Number of batches left out of the latency and throughput stats",
+        )
+        parser.add_argument(
+            "--no_steady_state",
+            action="store_true",
+            help="Don't leave out the batches before the timings reach their "
+            "steady state (after the warm-up batches)",
+        )
+        parser.add_argument(
+            "--intra_op_threads",
+            type=int,
+            help="Number of threads running each operation (TensorFlow's default "
+            "if not given)",
+        )
+        parser.add_argument(
+            "--inter_op_threads",
+            type=int,
+            help="Number of threads running independent operations (TensorFlow's "
+            "default if not given)",
+        )
+        parser.add_argument(
+            "--xla",
+            choices=["off", "on"],
+            default="off",
+            help="Compile the model with XLA",
+        )
+        parser.add_argument(
+            "--precision",
+            choices=["float32", "mixed_float16", "mixed_bfloat16"],
+            default="float32",
+            help="Keras precision policy of the model",
+        )
+        parser.add_argument(
+            "--inference_mode",
+            choices=["eager", "compiled"],
+            default="eager",
+            help="Run the model eagerly on slices of the data or as a compiled "
+            "function fed by a prefetched tf.data pipeline",
+        )
 
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
         dev_type = args.device_type
         self.mode = args.mode
         gpu_index = args.gpu_index
         self.n_epochs_training = args.n_epochs_training
         self.batch_size = args.batch_size
+        self.batch_sizes = args.batch_sizes
+        self.plateau_threshold = args.plateau_threshold
         self.iteration_limit = args.iteration_limit
+        self.inference_mode = args.inference_mode
+        self.warmup_batches = args.warmup_batches
+        self.steady_state = not args.no_steady_state
+        self.xla = args.xla == "on"
+        self.precision = args.precision
+
+        self.configure(args.intra_op_threads, args.inter_op_threads)
 
         # SET DEVICE
         if dev_type == "cpu":
@@ -65,6 +239,64 @@ class Benchmark:
 
             self.dev = f"/device:GPU:{gpu_index}"
 
+    def configure(self, intra_op_threads, inter_op_threads):
+        """
+        Configure TensorFlow's threading, XLA and the Keras precision policy.
+
+        These are process-wide settings: XLA and the precision policy are always
+        set, so that they don't leak from a benchmark to the next one in worker
+        mode. Thread counts (TensorFlow's default ones, 0, if not given) can't be
+        changed once TensorFlow is initialized (e.g. by a previous benchmark in
+        worker mode): the worker is then asked to be restarted, while otherwise
+        the effective ones are reported with the stats (see `print_config`).
+
+        :raises RestartWorker: if the thread counts can't be changed in worker mode.
+        """
+        from tensorflow.config import optimizer, threading
+        from tensorflow.keras.mixed_precision import set_global_policy
+
+        for name, threads, set_threads, get_threads in [
+            (
+                "Intra-op",
+                intra_op_threads or 0,
+                threading.set_intra_op_parallelism_threads,
+                threading.get_intra_op_parallelism_threads,
+            ),
+            (
+                "Inter-op",
+                inter_op_threads or 0,
+                threading.set_inter_op_parallelism_threads,
+                threading.get_inter_op_parallelism_threads,
+            ),
+        ]:
+            if threads == get_threads():
+                continue
+            try:
+                set_threads(threads)
+            except RuntimeError:
+                message = f"{name} threads can't be changed once TensorFlow is started"
+                if WORKER:
+                    raise RestartWorker(message) from None
+                print(f"{message}, keeping {get_threads()}")
+
+        optimizer.set_jit(self.xla)
+        set_global_policy(self.precision)
+
+    def print_config(self):
+        """
+        Print the effective TensorFlow configuration the stats were obtained with.
+
+        Thread counts are 0 when TensorFlow chooses them.
+        """
+        from tensorflow.config import threading
+
+        print(
+            f"intra_op_threads: {threading.get_intra_op_parallelism_threads()}\n"
+            f"inter_op_threads: {threading.get_inter_op_parallelism_threads()}\n"
+            f"xla: {int(self.xla)}\n"
+            f"precision: {self.precision}"
+        )
+
     @staticmethod
     def gen_stats_file_name(prefix):
         """Generate stats file name with prefix."""
@@ -77,20 +309,107 @@ class Benchmark:
         self.Y = Y
 
     def set_model(self, model):
+        if self.xla:
+            # Compiles the model's training and inference steps
+            model.jit_compile = True
         self.model = model
 
     def run(self):
         from tensorflow import device
 
+        self.print_config()
         if self.mode == "test":
             print("total_time: 0.0\navg_time_per_sample: 0.0")
-            exit(0)
+            print(f"batch_size: {self.batch_size}")
+            self.print_batch_stats([], [])
+            return
 
         with device(self.dev):
-            if self.mode == "training":
-                self.training_benchmark()
-            elif self.mode == "inference":
-                self.inference_benchmark()
+            if self.batch_sizes:
+                self.batch_size_sweep()
+            else:
+                self.print_stats(*self.benchmark())
+
+    def benchmark(self):
+        """
+        Perform the training or inference benchmark with the current batch size.
+
+        :returns: the batch times, the number of samples of each batch and the
+            number of passes over the data.
+        """
+        if self.mode == "training":
+            return self.training_benchmark()
+        return self.inference_benchmark()
+
+    def batch_size_sweep(self):
+        """
+        Perform the benchmark with each batch size, keeping the data and the model.
+
+        The sweep stops once the throughput plateaus, i.e. when the last
+        `PLATEAU_PATIENCE` batch sizes didn't improve the best throughput by more
+        than `--plateau_threshold`, or when a batch size runs out of memory. The
+        stats of each batch size are printed as a table, then the usual stats are
+        printed for the batch size with the best throughput.
+
+        Training goes on with the same model from one batch size to the next:
+        only its speed is measured.
+        """
+        from sys import exit
+
+        from tensorflow.errors import ResourceExhaustedError
+
+        results = []
+        best = None
+        n_plateau = 0
+        for batch_size in self.batch_sizes:
+            print(f"Batch size {batch_size}")
+            self.batch_size = batch_size
+            try:
+                result = self.benchmark()
+            except ResourceExhaustedError:
+                print(f"Batch size {batch_size} ran out of memory, stopping sweep")
+                break
+
+            stats = self.get_batch_stats(*result[:2])
+            results.append((batch_size, result, stats))
+
+            throughput = stats["throughput"]
+            if best is None or throughput > best * (1 + self.plateau_threshold):
+                n_plateau = 0
+            else:
+                n_plateau += 1
+            best = max(best or 0.0, throughput)
+            if n_plateau >= PLATEAU_PATIENCE:
+                print(f"Throughput plateaued at batch size {batch_size}")
+                break
+
+        if not results:
+            print("No batch size completed. Aborting.")
+            exit(1)
+
+        print("BATCH SIZE SWEEP COMPLETED!")
+        print(
+            f"{'batch size':>10}  {'throughput':>14}  {'latency p50':>12}  "
+            f"{'latency p90':>12}  {'latency p99':>12}"
+        )
+        for batch_size, _, stats in results:
+            print(
+                f"{batch_size:>10}  {stats['throughput']:>14.3f}  "
+                f"{stats['latency_p50']:>12.9f}  {stats['latency_p90']:>12.9f}  "
+                f"{stats['latency_p99']:>12.9f}"
+            )
+
+        batch_size, result, _ = max(results, key=lambda r: r[2]["throughput"])
+        self.batch_size = batch_size
+        self.print_stats(*result)
+
+    def get_stats_file_name(self, kind):
+        """Generate the stats file name of a training or inference benchmark."""
+        if self.batch_sizes:
+            return Benchmark.gen_stats_file_name(
+                f"{self.name}-{kind}-bs{self.batch_size}"
+            )
+        return Benchmark.gen_stats_file_name(f"{self.name}-{kind}")
 
     def training_benchmark(self):
         """
@@ -98,7 +417,7 @@ class Benchmark:
 
         Evaluates number of training inputs processed per second.
         """
-        time_callback = TimeHistory()
+        time_callback = TimeHistory(self.channel, self.batch_size)
         self.model.fit(
             self.X,
             self.Y,
@@ -108,20 +427,16 @@ class Benchmark:
             callbacks=[time_callback],
         )
 
-        with open(
-            Benchmark.gen_stats_file_name(f"{self.name}-training"), "w"
-        ) as stats_file:
+        with open(self.get_stats_file_name("training"), "w") as stats_file:
             for batch_time in time_callback.batch_times:
                 stats_file.write(f"{batch_time}\n")
 
         print("TRAINING COMPLETED!")
 
-        total_time = sum(time_callback.batch_times)
-
-        print(
-            f"total_time: {total_time}\n"
-            "avg_time_per_sample: "
-            + f"{total_time / self.n_epochs_training / self.X.shape[0]}"
+        return (
+            time_callback.batch_times,
+            self.get_batch_sizes(len(time_callback.batch_times)),
+            self.n_epochs_training,
         )
 
     def inference_benchmark(self):
@@ -130,15 +445,20 @@ class Benchmark:
 
         Evaluates number of Out-of-Sample inputs processed per second.
         """
+        if self.inference_mode == "compiled":
+            return self.compiled_inference_benchmark()
+        return self.eager_inference_benchmark()
+
+    def eager_inference_benchmark(self):
+        """Perform inference benchmark calling the model eagerly on each batch."""
         from math import ceil
 
         # Perform inference on Out-of-Sample multiple times to obtain average performance
         n_iterations = 0
-        total_time = 0.0
+        batch_times = []
+        batch_sizes = []
         keep_running = True
-        with open(
-            Benchmark.gen_stats_file_name(f"{self.name}-inference"), "w"
-        ) as stats_file:
+        with open(self.get_stats_file_name("inference"), "w") as stats_file:
             while keep_running:
                 print(f"Iteration {n_iterations}")
                 try:
@@ -148,9 +468,11 @@ class Benchmark:
                         start_time = perf_counter()
                         _ = self.model(x)
                         batch_time = perf_counter() - start_time
-                        total_time += batch_time
+                        batch_times.append(batch_time)
+                        batch_sizes.append(len(x))
                         stats_file.write(f"{batch_time / len(x)}\n")
                         stats_file.flush()
+                        self.channel.emit("batch_time", batch_time, len(x))
                 except KeyboardInterrupt:
                     keep_running = False
                     break
@@ -159,15 +481,149 @@ class Benchmark:
                     break
 
         print("INFERENCE COMPLETED!")
+
+        return batch_times, batch_sizes, n_iterations
+
+    def compiled_inference_benchmark(self):
+        """
+        Perform inference benchmark with a compiled forward pass.
+
+        Batches come from a prefetched `tf.data` pipeline and are fed to the
+        model's forward pass compiled with `tf.function`. Batch timings are kept
+        into preallocated arrays and only written (into the stats file and the
+        stats channel) once inference is over, so that they don't include I/O.
+        """
+        from math import ceil
+
+        import numpy as np
+        from tensorflow import function
+        from tensorflow.data import AUTOTUNE, Dataset
+
+        dataset = (
+            Dataset.from_tensor_slices(self.X).batch(self.batch_size).prefetch(AUTOTUNE)
+        )
+        # A single graph for every batch (the last one may be smaller)
+        forward = function(
+            lambda x: self.model(x, training=False),
+            input_signature=[dataset.element_spec],
+            jit_compile=self.xla,
+        )
+
+        n_batches = ceil(len(self.X) / self.batch_size)
+
+        # Each iteration's batch times and end timestamps
+        batch_times = []
+        timestamps = []
+        n_iterations = 0
+        while True:
+            print(f"Iteration {n_iterations}")
+            times = np.empty(n_batches)
+            ends = np.empty(n_batches)
+            try:
+                for i, x in enumerate(dataset):
+                    start_time = perf_counter()
+                    # Fetching the result waits for the device to finish
+                    forward(x).numpy()
+                    ends[i] = perf_counter()
+                    times[i] = ends[i] - start_time
+            except KeyboardInterrupt:
+                break
+            batch_times.append(times)
+            timestamps.append(ends)
+            n_iterations += 1
+            if self.iteration_limit and n_iterations + 1 > self.iteration_limit:
+                break
+
+        all_times = np.concatenate(batch_times) if batch_times else np.empty(0)
+        all_sizes = self.get_batch_sizes(len(all_times))
+        with open(self.get_stats_file_name("inference"), "w") as stats_file:
+            stats_file.write("".join(f"{t}\n" for t in all_times / all_sizes))
+        for batch_time, size, end in zip(
+            all_times, all_sizes, np.concatenate(timestamps) if timestamps else []
+        ):
+            self.channel.emit("batch_time", float(batch_time), int(size), float(end))
+
+        print("INFERENCE COMPLETED!")
+
+        return all_times, all_sizes, n_iterations
+
+    def get_batch_sizes(self, n_batches):
+        """
+        Get the number of samples of each batch of consecutive passes over the data.
+
+        Each pass is made of full batches but the last one, which has the
+        remaining samples.
+        """
+        from math import ceil
+
+        import numpy as np
+
+        batches_per_pass = ceil(len(self.X) / self.batch_size)
+        sizes = np.full(batches_per_pass, self.batch_size)
+        sizes[-1] = len(self.X) - self.batch_size * (batches_per_pass - 1)
+
+        return np.resize(sizes, n_batches)
+
+    def print_stats(self, batch_times, batch_sizes, n_passes):
+        """Print the stats of a benchmark which made `n_passes` over the data."""
+        total_time = float(sum(batch_times))
         print(
             f"total_time: {total_time}\n"
-            f"avg_time_per_sample: {total_time / (len(self.X) * n_iterations)}"
+            f"avg_time_per_sample: {total_time / (len(self.X) * n_passes)}\n"
+            f"batch_size: {self.batch_size}"
+        )
+        self.print_batch_stats(batch_times, batch_sizes)
+
+    def get_batch_stats(self, batch_times, batch_sizes):
+        """
+        Get the latency and throughput stats of the steady-state batches.
+
+        The warm-up batches, and then the batches before the timings reach their
+        steady state (see `find_steady_state`), are left out: their number is
+        `warmup_batches`. The stats are the 50th, 90th and 99th percentiles of the
+        batch latency, in seconds, and the throughput, in samples per second.
+        """
+        import numpy as np
+
+        times = np.asarray(batch_times, dtype=float)
+        sizes = np.asarray(batch_sizes, dtype=float)
+
+        start = min(self.warmup_batches, len(times))
+        if self.steady_state:
+            start += find_steady_state(times[start:])
+        times, sizes = times[start:], sizes[start:]
+
+        p50, p90, p99 = np.percentile(times, [50, 90, 99]) if len(times) else (0, 0, 0)
+        total_time = times.sum()
+
+        return {
+            "warmup_batches": start,
+            "latency_p50": float(p50),
+            "latency_p90": float(p90),
+            "latency_p99": float(p99),
+            "throughput": float(sizes.sum() / total_time) if total_time > 0 else 0.0,
+        }
+
+    def print_batch_stats(self, batch_times, batch_sizes):
+        """Print the latency and throughput stats (see `get_batch_stats`)."""
+        stats = self.get_batch_stats(batch_times, batch_sizes)
+        print(
+            f"warmup_batches: {stats['warmup_batches']}\n"
+            f"latency_p50: {stats['latency_p50']:.9f}\n"
+            f"latency_p90: {stats['latency_p90']:.9f}\n"
+            f"latency_p99: {stats['latency_p99']:.9f}\n"
+            f"throughput: {stats['throughput']:.3f}"
         )
 
 
 class TimeHistory(Callback):
     """A set of custom Keras callbacks to monitor Nvidia GPUs compute time."""
 
+    def __init__(self, channel=None, batch_size=1):
+        super().__init__()
+        self.channel = channel
+        self.batch_size = batch_size
+
     def on_train_begin(self, logs={}):
         self.batch_times = []
         self.epoch_times = []
@@ -185,6 +641,8 @@ class TimeHistory(Callback):
 
     def on_train_batch_end(self, batch, logs={}):
         self.batch_times.append(perf_counter() - self.batch_time_start)
+        if self.channel is not None:
+            self.channel.emit("batch_time", self.batch_times[-1], self.batch_size)
 
     def on_train_epoch_begin(self, batch, logs={}):
         self.epoch_time_start = perf_counter()
@@ -209,3 +667,94 @@ class TimeHistory(Callback):
 
     def on_predict_end(self, batch, logs={}):
         self.training_time.append(perf_counter() - self.training_time_start)
+
+
+class Tee(TextIOBase):
+    """A text stream writing to another one while keeping what's written."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text):
+        self.stream.write(text)
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+def serve():
+    """
+    Run the benchmarks the harness sends (worker mode).
+
+    Each request's command is `python <script> <args>`: the script's `main` is
+    called with the arguments, in this process, so that TensorFlow is imported
+    and each script's datasets are loaded only once. The command's stdout is sent
+    back with the reply, through the stats channel. The worker exits, asking the
+    harness to run the request in a new one, if the benchmark needs settings it
+    can't change anymore (see `RestartWorker`).
+    """
+    global WORKER
+    import sys
+    from contextlib import redirect_stdout
+    from importlib import import_module
+    from json import loads
+    from os import chdir, environ, getcwd
+    from os.path import basename, splitext
+    from traceback import print_exc
+
+    channel = get_channel()
+    if channel.file is None:
+        print("The stats channel is needed in worker mode. Aborting.")
+        sys.exit(1)
+    WORKER = True
+
+    for line in sys.stdin:
+        request = loads(line)
+        args = request["args"]
+        # The interpreter is already running
+        if args and basename(args[0]).startswith("python"):
+            args = args[1:]
+
+        cwd, env = getcwd(), dict(environ)
+        output = Tee(sys.stdout)
+        status = 0
+        try:
+            if request.get("cwd"):
+                chdir(request["cwd"])
+            environ.update(request.get("env") or {})
+
+            with redirect_stdout(output):
+                import_module(splitext(basename(args[0]))[0]).main(args[1:])
+        except RestartWorker as e:
+            print(f"{e}, asking for a new worker")
+            channel.restart(request["id"])
+            return
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            print_exc()
+            status = 1
+        finally:
+            chdir(cwd)
+            environ.clear()
+            environ.update(env)
+            sys.stdout.flush()
+
+        channel.reply(request["id"], status, output.getvalue())
+
+
+if __name__ == "__main__":
+    # Benchmarks import this file as the `base` module
+    import base
+
+    base.serve()
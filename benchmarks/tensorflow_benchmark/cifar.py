@@ -6,12 +6,14 @@
 # - Daniele Monteleone <daniele.monteleone@to.infn.it>, 2022
 # - Gabriele Gaetano Fronze' <gabriele.fronze@to.infn.it>, 2022
 
+from functools import lru_cache
 
 import tensorflow.keras as keras
 
 from base import Benchmark
 
 
+@lru_cache(maxsize=None)
 def load_CIFAR_data():
     """Load and reshape the standard CIFAR dataset."""
     (train_images, train_labels), (
@@ -46,8 +48,12 @@ def create_CIFAR_model():
     return model
 
 
-if __name__ == "__main__":
-    bench = Benchmark("CIFAR")
+def main(argv=None):
+    bench = Benchmark("CIFAR", argv)
     bench.set_data(*load_CIFAR_data()[0])
     bench.set_model(create_CIFAR_model())
     bench.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@
 # - Daniele Monteleone <daniele.monteleone@to.infn.it>, 2022
 # - Gabriele Gaetano Fronze' <gabriele.fronze@to.infn.it>, 2022
 
+from functools import lru_cache
+
 from base import Benchmark
 
 import tensorflow.keras as keras
@@ -19,6 +21,7 @@ N = 150
 teacher_size = 8
 
 
+@lru_cache(maxsize=None)
 def load_MNIST_data():
     """Load and reshape the standard MNIST dataset."""
     from keras.datasets import mnist
@@ -47,8 +50,12 @@ def create_MNIST_model():
     return model
 
 
-if __name__ == "__main__":
-    bench = Benchmark("MNIST")
+def main(argv=None):
+    bench = Benchmark("MNIST", argv)
     bench.set_data(*load_MNIST_data())
     bench.set_model(create_MNIST_model())
     bench.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: MIT
 # File created in 2022 by Filippo Valle
 
+from functools import lru_cache
+
 import pandas as pd
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense
@@ -16,6 +18,7 @@ import numpy as np
 from base import Benchmark
 
 
+@lru_cache(maxsize=None)
 def preprocess_data(
     verbose=True,
     L=0,
@@ -128,8 +131,8 @@ def create_model(
     return model
 
 
-if __name__ == "__main__":
-    bench = Benchmark("TCGA")
+def main(argv=None):
+    bench = Benchmark("TCGA", argv)
 
     bench.set_data(*preprocess_data(True))
 
@@ -148,3 +151,7 @@ if __name__ == "__main__":
     )
 
     bench.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@
 # - Daniele Monteleone <daniele.monteleone@to.infn.it>, 2022
 # - Gabriele Gaetano Fronze' <gabriele.fronze@to.infn.it>, 2022
 
+from functools import lru_cache
 
 import tensorflow as tf
 import tensorflow.keras as keras
@@ -28,6 +29,7 @@ net_size = 2000
 input_shape = 20000
 
 
+@lru_cache(maxsize=None)
 def generate_data(input_shape_X, N, n_of_class):
     initializer = keras.initializers.RandomNormal(mean=0.0, stddev=1.0)
     teacher = keras.Sequential()
@@ -67,8 +69,12 @@ def create_model(input_shape_X):
     return model
 
 
-if __name__ == "__main__":
-    bench = Benchmark("MNIST")
+def main(argv=None):
+    bench = Benchmark("MNIST", argv)
     bench.set_data(*generate_data(input_shape, N, n_of_class))
     bench.set_model(create_model(input_shape))
     bench.run()
+
+
+if __name__ == "__main__":
+    main()
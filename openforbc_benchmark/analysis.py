@@ -0,0 +1,672 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`analysis` module contains the statistical tools used on benchmark stats."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+class StatSummary:
+    """
+    Summary of the samples collected for a stat over repeated trials.
+
+    The confidence interval is the Student's t interval of the mean, it is only
+    available when there are at least two samples.
+    """
+
+    def __init__(
+        self, samples: "List[Union[int, float]]", confidence: float = 0.95
+    ) -> None:
+        """
+        Create a StatSummary from a (non-empty) list of samples.
+
+        :param samples: the stat's value for each trial.
+        :param confidence: the confidence level of the confidence interval.
+        """
+        from statistics import fmean, median, stdev
+
+        if not samples:
+            raise ValueError("Can't summarize an empty list of samples")
+
+        self.samples = samples
+        self.confidence = confidence
+        self.mean = fmean(samples)
+        self.median = median(samples)
+        self.stddev = stdev(samples) if len(samples) > 1 else 0.0
+        self.min = min(samples)
+        self.max = max(samples)
+
+        self.ci: "Optional[Tuple[float, float]]" = None
+        if len(samples) > 1:
+            from math import sqrt
+
+            half_width = (
+                t_quantile((1 + confidence) / 2, len(samples) - 1)
+                * self.stddev
+                / sqrt(len(samples))
+            )
+            self.ci = (self.mean - half_width, self.mean + half_width)
+
+    def relative_ci(self) -> "Optional[float]":
+        """
+        Get the confidence interval half-width relative to the mean.
+
+        :returns: `None` if there's no confidence interval, infinity if the mean is
+            zero and the samples are not all equal.
+        """
+        if self.ci is None:
+            return None
+
+        half_width = (self.ci[1] - self.ci[0]) / 2
+        if self.mean == 0:
+            return 0.0 if half_width == 0 else float("inf")
+
+        return abs(half_width / self.mean)
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a summary into a JSON object (the samples as an array)."""
+        return {
+            "mean": obj.mean,
+            "median": obj.median,
+            "stddev": obj.stddev,
+            "min": obj.min,
+            "max": obj.max,
+            "ci": list(obj.ci) if obj.ci is not None else None,
+            "confidence": obj.confidence,
+            "samples": obj.samples,
+        }
+
+
+class RepetitionPolicy:
+    """
+    How many times each preset is run.
+
+    The first `warmup` trials are run and their results discarded, then `repeat`
+    trials are measured.
+
+    When a `target_ci` is set the policy is adaptive: `repeat` is the minimum number
+    of measured trials, which go on until the relative confidence interval of every
+    stat is below the target or `max_runs` trials have been run. In both modes no
+    new trial is started after `max_time` seconds from the start of the first one.
+    """
+
+    DEFAULT_MAX_RUNS = 30
+
+    def __init__(
+        self,
+        repeat: int = 1,
+        warmup: int = 0,
+        target_ci: "Optional[float]" = None,
+        max_runs: "Optional[int]" = None,
+        max_time: "Optional[float]" = None,
+    ) -> None:
+        """
+        Create a RepetitionPolicy.
+
+        :param target_ci: target confidence interval half-width, relative to the
+            mean (e.g. 0.01 for 1%), enables the adaptive mode.
+        :param max_runs: maximum number of measured trials in adaptive mode
+            (defaults to `DEFAULT_MAX_RUNS`).
+        :param max_time: wall time budget, in seconds, for each preset.
+        """
+        if repeat < 1 or warmup < 0:
+            raise ValueError("At least a measured trial is needed")
+        if target_ci is not None and target_ci <= 0:
+            raise ValueError("The target confidence interval must be positive")
+
+        self.repeat = repeat
+        self.warmup = warmup
+        self.target_ci = target_ci
+        self.max_runs = max(
+            max_runs if max_runs is not None else self.DEFAULT_MAX_RUNS, repeat
+        )
+        self.max_time = max_time
+
+    def is_single(self) -> bool:
+        """Check whether each preset is run once, without warm-up."""
+        return self.repeat == 1 and self.warmup == 0 and not self.is_adaptive()
+
+    def is_adaptive(self) -> bool:
+        """Check whether trials go on until the stats are stable."""
+        return self.target_ci is not None
+
+    def is_stable(self, samples: "Dict[str, List[Union[int, float]]]") -> bool:
+        """
+        Check whether the samples collected so far meet the target confidence.
+
+        :param samples: the samples collected for each stat.
+        """
+        if self.target_ci is None:
+            return True
+
+        summaries = summarize(samples)
+        if not summaries:
+            return False
+
+        for summary in summaries.values():
+            relative_ci = summary.relative_ci()
+            if relative_ci is None or relative_ci > self.target_ci:
+                return False
+
+        return True
+
+    def trials(
+        self, samples: "Optional[Dict[str, List[Union[int, float]]]]" = None
+    ) -> "Iterator[Tuple[str, bool]]":
+        """
+        Get the trials to be run.
+
+        :param samples: the samples collected for each stat, which must be updated
+            with a trial's stats before requesting the next trial (only needed in
+            adaptive mode).
+        :returns: an iterator into tuples containing a trial's label and whether the
+            trial is measured (`False` for warm-up trials).
+        """
+        from time import monotonic
+
+        start = monotonic()
+
+        for i in range(self.warmup):
+            yield f"warmup{i + 1}", False
+
+        n = 0
+        while True:
+            n += 1
+            yield f"trial{n}", True
+
+            if self.max_time is not None and monotonic() - start >= self.max_time:
+                return
+
+            if not self.is_adaptive():
+                if n >= self.repeat:
+                    return
+                continue
+
+            if n >= self.max_runs:
+                return
+            if n >= max(self.repeat, 2) and self.is_stable(samples or {}):
+                return
+
+
+class Distribution:
+    """
+    A time series of samples of a stat, e.g. the latency of every iteration.
+
+    Each sample may have a timestamp (in seconds) and the number of items it
+    accounts for (e.g. the batch size), which are used to compute the throughput.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(
+        self,
+        samples: "Optional[Iterable[float]]" = None,
+        timestamps: "Optional[Iterable[float]]" = None,
+        counts: "Optional[Iterable[float]]" = None,
+    ) -> None:
+        """
+        Create a Distribution.
+
+        :param timestamps: each sample's timestamp (the throughput isn't available
+            without them).
+        :param counts: the number of items of each sample (1 by default).
+        """
+        from array import array
+
+        self.samples = array("d", samples or [])
+        self.timestamps = array("d", timestamps or [])
+        self.counts = array("d", counts or [1.0] * len(self.samples))
+
+        if len(self.counts) != len(self.samples) or len(self.timestamps) not in (
+            0,
+            len(self.samples),
+        ):
+            raise ValueError("Every sample needs its timestamp and count")
+
+    def add(
+        self, value: float, timestamp: "Optional[float]" = None, count: float = 1.0
+    ) -> None:
+        """Add a sample."""
+        if (timestamp is None) != (not self.timestamps) and self.samples:
+            raise ValueError("Either every sample or none has a timestamp")
+
+        self.samples.append(value)
+        self.counts.append(count)
+        if timestamp is not None:
+            self.timestamps.append(timestamp)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def percentile(self, q: float) -> float:
+        """
+        Get a percentile of the samples.
+
+        Percentiles are linearly interpolated between the closest ranks.
+
+        :param q: the percentile, in [0, 100].
+        """
+        if not self.samples:
+            raise ValueError("Can't compute a percentile of an empty distribution")
+
+        ordered = sorted(self.samples)
+        rank = q / 100 * (len(ordered) - 1)
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+    def get_throughput(self) -> "Optional[float]":
+        """
+        Get the number of items per second between the first and the last sample.
+
+        :returns: `None` if there are no timestamps or they span no time.
+        """
+        if len(self.timestamps) < 2:
+            return None
+
+        order = sorted(range(len(self.timestamps)), key=self.timestamps.__getitem__)
+        span = self.timestamps[order[-1]] - self.timestamps[order[0]]
+        if span <= 0:
+            return None
+
+        # The first sample's items were processed before its timestamp
+        return sum(self.counts[i] for i in order[1:]) / span
+
+    def get_throughput_curve(
+        self, interval: float = 1.0
+    ) -> "List[Tuple[float, float]]":
+        """
+        Get the throughput over time.
+
+        :param interval: the width of the time buckets, in seconds.
+        :returns: a list of (bucket start, items per second) tuples, the start
+            being relative to the first sample.
+        """
+        if not self.timestamps:
+            return []
+
+        start = min(self.timestamps)
+        buckets: "Dict[int, float]" = {}
+        for timestamp, count in zip(self.timestamps, self.counts):
+            bucket = int((timestamp - start) // interval)
+            buckets[bucket] = buckets.get(bucket, 0.0) + count
+
+        return [
+            (bucket * interval, buckets.get(bucket, 0.0) / interval)
+            for bucket in range(max(buckets) + 1)
+        ]
+
+    def summarize(self) -> "Dict[str, float]":
+        """
+        Summarize the distribution into scalar stats.
+
+        :returns: the number of samples, their mean, minimum, maximum, percentiles
+            (`p50`, `p95` and `p99`) and the throughput (if available).
+        """
+        from statistics import fmean
+
+        summary = {
+            "count": float(len(self.samples)),
+            "mean": fmean(self.samples),
+            "min": min(self.samples),
+            "max": max(self.samples),
+        }
+        summary.update({f"p{q}": self.percentile(q) for q in self.PERCENTILES})
+
+        throughput = self.get_throughput()
+        if throughput is not None:
+            summary["throughput"] = throughput
+
+        return summary
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a distribution, with its summary and throughput curve."""
+        json: "Dict[str, Any]" = {"samples": list(obj.samples)}
+        if obj.timestamps:
+            json["timestamps"] = list(obj.timestamps)
+        if any(count != 1 for count in obj.counts):
+            json["counts"] = list(obj.counts)
+        if obj.samples:
+            json["summary"] = obj.summarize()
+        if obj.timestamps:
+            json["throughput_curve"] = obj.get_throughput_curve()
+
+        return json
+
+
+class ScalingCurve:
+    """
+    The scaling of a stat (e.g. a run time) against a problem size.
+
+    The stat is fitted to a power law of the size (`value = coefficient *
+    size^exponent`) with a least squares regression of their logarithms. Each
+    point also has the local exponent between it and the previous point: a local
+    exponent well above the fitted one shows where the stat falls off a cliff
+    (e.g. when the problem doesn't fit into a cache anymore).
+
+    When the number of floating point operations of each point is known the
+    achieved GFLOP/s are computed as well, the stat being a time in seconds.
+    """
+
+    def __init__(
+        self,
+        stat: str,
+        axis: str,
+        sizes: "List[float]",
+        values: "List[float]",
+        flops: "Optional[List[float]]" = None,
+        labels: "Dict[str, str]" = {},
+    ) -> None:
+        """
+        Create a ScalingCurve.
+
+        :param sizes: the problem size of each point.
+        :param values: the stat's value of each point.
+        :param flops: the number of floating point operations of each point.
+        :param labels: the values of the other parameters the curve was measured
+            with (e.g. the device).
+        :raises ValueError: if the sizes and values don't match or there are no
+            points.
+        """
+        if (
+            not sizes
+            or len(sizes) != len(values)
+            or (flops is not None and len(flops) != len(sizes))
+        ):
+            raise ValueError("Every point needs a size and a value")
+
+        order = sorted(range(len(sizes)), key=sizes.__getitem__)
+        self.stat = stat
+        self.axis = axis
+        self.labels = labels
+        self.sizes = [sizes[i] for i in order]
+        self.values = [values[i] for i in order]
+        self.flops = [flops[i] for i in order] if flops is not None else None
+
+        self.coefficient: "Optional[float]" = None
+        self.exponent: "Optional[float]" = None
+        self.r_squared: "Optional[float]" = None
+        fit = fit_power_law(self.sizes, self.values)
+        if fit is not None:
+            self.coefficient, self.exponent, self.r_squared = fit
+
+    def get_local_exponents(self) -> "List[Optional[float]]":
+        """
+        Get the exponent between each point and the previous one.
+
+        :returns: `None` for the first point and the points whose size or value
+            (or the previous point's one) is not positive or is the same as the
+            previous point's one.
+        """
+        from math import log
+
+        exponents: "List[Optional[float]]" = [None]
+        for i in range(1, len(self.sizes)):
+            x0, x1 = self.sizes[i - 1], self.sizes[i]
+            y0, y1 = self.values[i - 1], self.values[i]
+            exponents.append(
+                log(y1 / y0) / log(x1 / x0)
+                if min(x0, x1, y0, y1) > 0 and x1 != x0
+                else None
+            )
+
+        return exponents
+
+    def get_gflops(self) -> "Optional[List[Optional[float]]]":
+        """
+        Get the GFLOP/s achieved by each point.
+
+        :returns: `None` if the FLOP counts are unknown, and `None` for the points
+            whose time is not positive.
+        """
+        if self.flops is None:
+            return None
+
+        return [
+            flops / value / 1e9 if value > 0 else None
+            for flops, value in zip(self.flops, self.values)
+        ]
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a curve into a JSON object, with its fit and points."""
+        gflops = obj.get_gflops()
+        return {
+            "stat": obj.stat,
+            "axis": obj.axis,
+            "labels": obj.labels,
+            "coefficient": obj.coefficient,
+            "exponent": obj.exponent,
+            "r_squared": obj.r_squared,
+            "points": [
+                {
+                    "size": size,
+                    "value": value,
+                    "local_exponent": local_exponent,
+                    "flops": obj.flops[i] if obj.flops is not None else None,
+                    "gflops": gflops[i] if gflops is not None else None,
+                }
+                for i, (size, value, local_exponent) in enumerate(
+                    zip(obj.sizes, obj.values, obj.get_local_exponents())
+                )
+            ],
+        }
+
+
+def fit_power_law(
+    xs: "List[float]", ys: "List[float]"
+) -> "Optional[Tuple[float, float, float]]":
+    """
+    Fit points to a power law (`y = coefficient * x^exponent`).
+
+    Uses a least squares linear regression of `log(y)` against `log(x)`.
+
+    :returns: the coefficient, the exponent and the coefficient of determination
+        (R², of the logarithms) of the fit, `None` if there aren't two points with
+        different positive `x` and a positive `y`.
+    """
+    from math import exp, log
+    from statistics import fmean
+
+    points = [(log(x), log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len({x for x, _ in points}) < 2:
+        return None
+
+    mean_x = fmean(x for x, _ in points)
+    mean_y = fmean(y for _, y in points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    syy = sum((y - mean_y) ** 2 for _, y in points)
+
+    exponent = sxy / sxx
+    intercept = mean_y - exponent * mean_x
+    r_squared = sxy**2 / (sxx * syy) if syy > 0 else 1.0
+    return exp(intercept), exponent, r_squared
+
+
+def evaluate_formula(formula: str, variables: "Dict[str, float]") -> float:
+    """
+    Evaluate an arithmetic formula, e.g. a FLOP count such as `2 * n**3`.
+
+    Formulas may only contain numbers, variables, parentheses and the `+`, `-`,
+    `*`, `/` and `**` operators.
+
+    :param variables: the value of each variable.
+    :raises ValueError: if the formula is not valid or uses an unknown variable.
+    """
+    from ast import (
+        Add,
+        BinOp,
+        Constant,
+        Div,
+        Expression,
+        Mult,
+        Name,
+        parse,
+        Pow,
+        Sub,
+        UAdd,
+        UnaryOp,
+        USub,
+    )
+    from operator import add, mul, neg, pos, pow, sub, truediv
+
+    operators: "Dict[type, Any]" = {
+        Add: add,
+        Sub: sub,
+        Mult: mul,
+        Div: truediv,
+        Pow: pow,
+        USub: neg,
+        UAdd: pos,
+    }
+
+    def evaluate(node: "Any") -> float:
+        if isinstance(node, Expression):
+            return evaluate(node.body)
+        if isinstance(node, Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        if isinstance(node, Name):
+            if node.id not in variables:
+                raise ValueError(f'Unknown variable "{node.id}" in "{formula}"')
+            return variables[node.id]
+        if isinstance(node, BinOp) and type(node.op) in operators:
+            return operators[type(node.op)](evaluate(node.left), evaluate(node.right))
+        if isinstance(node, UnaryOp) and type(node.op) in operators:
+            return operators[type(node.op)](evaluate(node.operand))
+        raise ValueError(f'Invalid formula "{formula}"')
+
+    try:
+        return evaluate(parse(formula, mode="eval"))
+    except SyntaxError:
+        raise ValueError(f'Invalid formula "{formula}"') from None
+    except (ArithmeticError, TypeError) as e:
+        raise ValueError(f'Can\'t evaluate "{formula}": {e}') from None
+
+
+def flatten_distributions(
+    distributions: "Dict[str, Distribution]",
+) -> "Dict[str, float]":
+    """
+    Flatten distributions into scalar stats, named `<stat>_<summary key>`.
+
+    Empty distributions are skipped.
+    """
+    return {
+        f"{name}_{key}": value
+        for name, distribution in distributions.items()
+        if distribution
+        for key, value in distribution.summarize().items()
+    }
+
+
+def summarize(
+    samples: "Dict[str, List[Union[int, float]]]", confidence: float = 0.95
+) -> "Dict[str, StatSummary]":
+    """Summarize the samples collected for a set of stats."""
+    return {
+        name: StatSummary(values, confidence)
+        for name, values in samples.items()
+        if values
+    }
+
+
+def prediction_test(baseline: "List[float]", value: float) -> float:
+    """
+    Test whether a value is a new sample of the population a baseline was sampled from.
+
+    Uses the Student's t prediction interval for a new observation (assuming a normal
+    population).
+
+    :param baseline: at least two samples.
+    :param value: the new value.
+    :returns: the two-sided p-value.
+    """
+    from math import sqrt
+    from statistics import fmean, stdev
+
+    if len(baseline) < 2:
+        raise ValueError("At least two baseline samples are needed")
+
+    mean = fmean(baseline)
+    stddev = stdev(baseline)
+    if stddev == 0:
+        return 1.0 if value == mean else 0.0
+
+    t = (value - mean) / (stddev * sqrt(1 + 1 / len(baseline)))
+    return 2 * (1 - _t_cdf(abs(t), len(baseline) - 1))
+
+
+def t_quantile(p: float, df: int) -> float:
+    """
+    Get the quantile function of the Student's t distribution.
+
+    The Cornish-Fisher expansion is used as the first approximation and refined with
+    Newton's method.
+
+    :param p: the probability, in (0, 1).
+    :param df: the number of degrees of freedom (>= 1).
+    """
+    from math import pi, sqrt, tan
+    from statistics import NormalDist
+
+    if df == 1:
+        return tan(pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / sqrt(2 * p * (1 - p))
+
+    z = NormalDist().inv_cdf(p)
+    t = (
+        z
+        + (z**3 + z) / 4 / df
+        + (5 * z**5 + 16 * z**3 + 3 * z) / 96 / df**2
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384 / df**3
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z)
+        / 92160
+        / df**4
+    )
+
+    for _ in range(3):
+        t -= (_t_cdf(t, df) - p) / _t_pdf(t, df)
+
+    return t
+
+
+def _t_cdf(t: float, df: int) -> float:
+    """Student's t cumulative distribution function (Abramowitz-Stegun 26.7.3-4)."""
+    from math import atan, cos, pi, sin, sqrt
+
+    theta = atan(t / sqrt(df))
+    cos2 = cos(theta) ** 2
+
+    if df % 2:
+        series = term = cos(theta) if df > 1 else 0.0
+        for k in range(3, df - 1, 2):
+            term *= (k - 1) / k * cos2
+            series += term
+        a = 2 / pi * (theta + sin(theta) * series)
+    else:
+        series = term = 1.0
+        for k in range(2, df - 1, 2):
+            term *= (k - 1) / k * cos2
+            series += term
+        a = sin(theta) * series
+
+    return (1 + a) / 2
+
+
+def _t_pdf(t: float, df: int) -> float:
+    """Student's t probability density function."""
+    from math import exp, lgamma, log, pi
+
+    return exp(
+        lgamma((df + 1) / 2)
+        - lgamma(df / 2)
+        - log(df * pi) / 2
+        - (df + 1) / 2 * log(1 + t * t / df)
+    )
@@ -9,12 +9,33 @@ from openforbc_benchmark.json import (
     BenchmarkSuiteDefinition,
     CommandInfo,
     PresetDefinition,
+    ResourcesDefinition,
 )
 from openforbc_benchmark.utils import Runnable
+from openforbc_benchmark.worker import WorkerTask
 
 if TYPE_CHECKING:
-    from typing import Dict, Iterator, List, Optional, TextIO, Tuple, Union
-    from openforbc_benchmark.json import BenchmarkRunDefinition, StatMatchInfo
+    from typing import (
+        Any,
+        Callable,
+        Dict,
+        IO,
+        Iterator,
+        List,
+        Optional,
+        TextIO,
+        Tuple,
+        Union,
+    )
+    from openforbc_benchmark.catalog import BenchmarkCatalog
+    from openforbc_benchmark.json import (
+        BenchmarkRunDefinition,
+        PlacementDefinition,
+        StatMatchInfo,
+    )
+    from openforbc_benchmark.setup_stamps import SetupStamps
+    from openforbc_benchmark.stats import StatMatcher
+    from openforbc_benchmark.venv_cache import VenvCache
 
 
 class BenchmarkNotFound(Exception):
@@ -61,6 +82,7 @@ class Benchmark(BenchmarkDefinition):
         stats: "Union[CommandInfo, Dict[str, StatMatchInfo]]",
         virtualenv: bool,
         dir: str,
+        worker_command: "Optional[CommandInfo]" = None,
     ) -> None:
         """Create a Benchmark object."""
         super().__init__(
@@ -74,6 +96,7 @@ class Benchmark(BenchmarkDefinition):
             test_commands,
             stats,
             virtualenv,
+            worker_command,
         )
         self.dir = dir
 
@@ -97,6 +120,7 @@ class Benchmark(BenchmarkDefinition):
             self.test_commands,
             self.stats,
             self.virtualenv,
+            self.worker_command,
         )
 
     @classmethod
@@ -141,16 +165,29 @@ class Benchmark(BenchmarkDefinition):
         return self.get_preset(self.test_preset) if self.test_preset else None
 
     def get_preset(self, name: str) -> "Optional[Preset]":
-        """Get (eventually) benchmark's preset by name."""
+        """
+        Get (eventually) benchmark's preset by name.
+
+        The presets of a sweep can be selected by appending the values of some of
+        its axes to its name (e.g. `sweep@device=gpu`, see `Preset.select`).
+        """
         from os.path import exists, join
 
         presets_dir = join(self.dir, "presets")
 
+        name, _, selector = name.partition("@")
         filename = name if name.endswith(".json") else name + ".json"
         if not exists(join(presets_dir, filename)):
             return None
 
-        return Preset.from_definition_file(join(presets_dir, filename))
+        preset = Preset.from_definition_file(join(presets_dir, filename))
+        if not selector:
+            return preset
+
+        selection = dict(
+            value.partition("=")[::2] for value in selector.split(",") if value
+        )
+        return preset.select(selection)
 
     def run(self, presets: "List[Preset]") -> "BenchmarkRun":
         """Create a `BenchmarkRun` for this benchmark."""
@@ -165,9 +202,33 @@ class Preset(PresetDefinition):
         init_commands: "Optional[List[CommandInfo]]" = None,
         env: "Dict[str, str]" = {},
         post_commands: "Optional[List[CommandInfo]]" = None,
+        resources: "Optional[ResourcesDefinition]" = None,
+        placement: "Optional[PlacementDefinition]" = None,
+        timeout: "Optional[float]" = None,
+        matrix: "Optional[Dict[str, List[Union[str, int, float]]]]" = None,
+        sweep: "Optional[str]" = None,
+        axes: "Optional[Dict[str, Union[str, int, float]]]" = None,
     ) -> None:
-        super().__init__(args, init_commands, env, post_commands)
+        """
+        Create a Preset.
+
+        :param sweep: the name of the sweep preset this preset was expanded from
+            (`None` if it's not part of a sweep).
+        :param axes: the value of each of the sweep's axes for this preset.
+        """
+        super().__init__(
+            args,
+            init_commands,
+            env,
+            post_commands,
+            resources,
+            placement,
+            timeout,
+            matrix,
+        )
         self.name = name
+        self.sweep = sweep
+        self.axes = axes
 
     @classmethod
     def from_definition(
@@ -179,9 +240,79 @@ class Preset(PresetDefinition):
     def into_definition(self) -> PresetDefinition:
         """Transform benchmark into a definition."""
         return PresetDefinition(
-            self.args, self.init_commands, self.env, self.post_commands
+            self.args,
+            self.init_commands,
+            self.env,
+            self.post_commands,
+            self.resources,
+            self.placement,
+            self.timeout,
+            self.matrix,
         )
 
+    def expand(self) -> "List[Preset]":
+        """
+        Expand a sweep preset into a preset for each combination of its axes' values.
+
+        The presets are named after the sweep and their axes' values (e.g.
+        `sweep@size=20,device=gpu`) and have the `{axis}` placeholders in their
+        args, env and init and post commands replaced by the axes' values.
+
+        :returns: the sweep's presets (this preset if it's not a sweep).
+        """
+        from itertools import product
+
+        if self.matrix is None:
+            return [self]
+
+        presets = []
+        for values in product(*self.matrix.values()):
+            axes = dict(zip(self.matrix, values))
+            strings = {axis: str(value) for axis, value in axes.items()}
+            presets.append(
+                Preset(
+                    get_sweep_preset_name(self.name, strings),
+                    [substitute_axes(arg, strings) for arg in self.args]
+                    if self.args is not None
+                    else None,
+                    substitute_commands(self.init_commands, strings),
+                    {k: substitute_axes(v, strings) for k, v in self.env.items()},
+                    substitute_commands(self.post_commands, strings),
+                    self.resources,
+                    self.placement,
+                    self.timeout,
+                    sweep=self.name,
+                    axes=axes,
+                )
+            )
+
+        return presets
+
+    def select(self, selection: "Dict[str, str]") -> "Optional[Preset]":
+        """
+        Select some of the values of a sweep's axes.
+
+        :param selection: the value selected for some of the axes.
+        :returns: the sweep, restricted to the selected values, or its only preset
+            if every axis has a selected value (`None` if some value or axis is not
+            in the sweep).
+        """
+        if self.matrix is None:
+            return None
+
+        matrix = dict(self.matrix)
+        for axis, selected in selection.items():
+            values = [v for v in matrix.get(axis, []) if str(v) == selected]
+            if not values:
+                return None
+            matrix[axis] = values[:1]
+
+        sweep = Preset(
+            self.name, **{**self.into_definition().__dict__, "matrix": matrix}
+        )
+        presets = sweep.expand()
+        return presets[0] if len(presets) == 1 else sweep
+
     @classmethod
     def from_definition_file(self_class, path: str) -> "Preset":
         """Create a Preset from its definition file path."""
@@ -215,14 +346,15 @@ class BenchmarkSuite:
         self_class, definition: BenchmarkSuiteDefinition, search_path: str
     ) -> "BenchmarkSuite":
         """Create a BenchmarkSuite from its definition and a benchmark search path."""
-        return self_class(
-            definition.name,
-            definition.description,
-            [
-                BenchmarkRun.from_definition(bench_run_def, search_path)
-                for bench_run_def in definition.benchmark_runs
-            ],
-        )
+        benchmark_runs = [
+            BenchmarkRun.from_definition(bench_run_def, search_path)
+            for bench_run_def in definition.benchmark_runs
+        ]
+        for run in benchmark_runs:
+            if run.timeout is None:
+                run.timeout = definition.timeout
+
+        return self_class(definition.name, definition.description, benchmark_runs)
 
     @classmethod
     def from_definition_file(
@@ -245,11 +377,44 @@ class BenchmarkRun:
     Consists of a Benchmark with an associated list of `Preset`s.
     """
 
-    def __init__(self, benchmark: "Benchmark", presets: "List[Preset]") -> None:
-        """Create a BenchmarkRun."""
+    def __init__(
+        self,
+        benchmark: "Benchmark",
+        presets: "List[Preset]",
+        resources: "Optional[ResourcesDefinition]" = None,
+        placement: "Optional[PlacementDefinition]" = None,
+        venv_cache: "Optional[VenvCache]" = None,
+        force_setup: bool = False,
+        worker: bool = False,
+        timeout: "Optional[float]" = None,
+    ) -> None:
+        """
+        Create a BenchmarkRun.
+
+        :param resources: resources needed by this run, overriding the presets' ones.
+        :param placement: where this run's commands are executed, overriding the
+            presets' placement.
+        :param venv_cache: the cache the benchmark's virtualenv is shared through
+            (`None` to create it in the benchmark's directory).
+        :param force_setup: `True` to run the setup commands even when they're up
+            to date.
+        :param worker: `True` to have the benchmark's worker (if it has one) execute
+            the run commands with the presets' arguments.
+        :param timeout: the time each command is given to finish, in seconds, unless
+            the command or its preset specify another timeout (`None` for no limit).
+        """
         self.benchmark = benchmark
-        self.presets = presets
+        # Sweeps are run as their presets
+        self.presets = [p for preset in presets for p in preset.expand()]
+        self.resources = resources
+        self.placement = placement
+        self.venv_cache = venv_cache
+        self.force_setup = force_setup
+        self.worker = worker
+        self.timeout = timeout
+        self.skipped_setup: "List[Runnable]" = []
         self._virtualenv: "Optional[str]" = None
+        self._venv_lock: "Optional[IO[bytes]]" = None
 
     @classmethod
     def from_definition(
@@ -264,35 +429,114 @@ class BenchmarkRun:
             )
 
         selected_presets = []
-        presets = benchmark.get_presets()
         for name in definition.presets:
-            if name.endswith(".json"):
-                name = name[:-5]
-            try:
-                selected_presets.append(
-                    # Try to find preset with matching name (will raise `StopIteration`
-                    # if no match is found)
-                    next(preset for preset in presets if preset.name == name)
-                )
-            except StopIteration:
+            preset = benchmark.get_preset(name)
+            if preset is None:
                 raise BenchmarkPresetNotFound(
                     f'Preset "{name}" not found for benchmark "{benchmark.name}"'
-                ) from None
+                )
+            selected_presets.append(preset)
+
+        return self_class(
+            benchmark,
+            selected_presets,
+            definition.resources,
+            definition.placement,
+            timeout=definition.timeout,
+        )
+
+    def into_definition(self) -> "BenchmarkRunDefinition":
+        """Transform this BenchmarkRun into a definition."""
+        from openforbc_benchmark.json import BenchmarkRunDefinition
+
+        return BenchmarkRunDefinition(
+            self.benchmark.get_id(),
+            [preset.name for preset in self.presets],
+            self.resources,
+            self.placement,
+            self.timeout,
+        )
+
+    def get_resources(self) -> "ResourcesDefinition":
+        """
+        Get the resources needed by this run.
+
+        If the run doesn't specify its resources they are derived from its presets:
+        the run uses the largest number of cores any of its presets needs and is
+        exclusive if any of them is.
+        """
+        if self.resources is not None:
+            return self.resources
+
+        cores = [p.resources.cores for p in self.presets if p.resources is not None]
+        return ResourcesDefinition(
+            max((c for c in cores if c is not None), default=None),
+            any(
+                p.resources is not None and p.resources.exclusive for p in self.presets
+            ),
+        )
 
-        return self_class(benchmark, selected_presets)
+    def uses_worker(self) -> bool:
+        """Check whether the presets are run by the benchmark's worker."""
+        return self.worker and self.benchmark.worker_command is not None
+
+    def get_worker_task(
+        self, placement: "Optional[PlacementDefinition]" = None
+    ) -> Runnable:
+        """
+        Get the task starting the benchmark's worker.
+
+        :param placement: where the worker is executed.
+        """
+        assert self.benchmark.worker_command is not None
+        return self._add_context(
+            self.benchmark.worker_command.into_runnable(), placement
+        )
+
+    def get_placement(self, preset: "Preset") -> "Optional[PlacementDefinition]":
+        """Get where a preset's run commands are executed (`None` for anywhere)."""
+        return self.placement if self.placement is not None else preset.placement
 
     def setup(self) -> "Iterator[Runnable]":
-        """Get tasks for this benchmark run setup commands."""
+        """
+        Get tasks for this benchmark run setup commands.
+
+        Setup commands which are up to date (see `SetupStamps`) are skipped, unless
+        the setup is forced, and collected into `skipped_setup`.
+        """
         from os.path import join
 
+        from openforbc_benchmark.setup_stamps import SetupStamps
+
+        stamps = SetupStamps(self.benchmark.dir, reset=self.force_setup)
+        self.skipped_setup = []
+        step = 0
+
+        if self.benchmark.virtualenv and self.venv_cache is not None:
+            yield from self._setup_cached_virtualenv(self.venv_cache, stamps)
+            return
+
         # (Eventually) create a virtualenv for the benchmark
         if self.benchmark.virtualenv:
-            yield self._add_context(Runnable(["python3", "-m", "venv", ".venv"]))
+            yield from self._memoize_setup(
+                stamps,
+                step,
+                self._add_context(Runnable(["python3", "-m", "venv", ".venv"])),
+                outputs=[join(".venv", "pyvenv.cfg")],
+            )
             self._virtualenv = join(self.benchmark.dir, ".venv")
+            step += 1
 
         if self.benchmark.setup_commands is not None:
             for command in self.benchmark.setup_commands:
-                yield self._add_context(command.into_runnable())
+                yield from self._memoize_setup(
+                    stamps,
+                    step,
+                    self._add_context(command.into_runnable()),
+                    command.inputs,
+                    command.outputs,
+                )
+                step += 1
 
     def run(self) -> "Iterator[Tuple[Preset, Iterator[Runnable]]]":
         """
@@ -305,27 +549,39 @@ class BenchmarkRun:
         for preset in self.presets:
             yield preset, self._run_preset(preset)
 
+    def run_preset(self, preset: "Preset") -> "Iterator[Runnable]":
+        """
+        Get tasks for a single preset.
+
+        Every call returns a new iterator, which allows to run a preset repeatedly.
+        """
+        return self._run_preset(preset)
+
     def test(self) -> "Iterator[Runnable]":
         """Get the tasks for this benchmark run's test commands."""
         for command in self.benchmark.test_commands:
             yield self._add_context(command.into_runnable())
 
-    def get_stats(self, stdout: "Union[str, TextIO]") -> "Dict[str, Union[int, float]]":
+    def get_stats(
+        self, stdout: "Union[str, TextIO]", partial: bool = False
+    ) -> "Dict[str, Union[int, float]]":
         """
         Parse stats out of benchmark's standard output.
 
         :param stdout: benchmark's output as a file or file path.
+        :param partial: `True` if the output is incomplete (e.g. the benchmark timed
+            out): the stats which can't be matched are left out instead of raising
+            `BenchmarkStatsMatchError`.
         :returns: dictionary of stat name and stat value (int or float).
         :raises BenchmarkStatsDecodeError: if the stats script's json output couldn't be
             parsed correctly.
         :raises BenchmarkStatsMatchError: if a stat's regex couldn't match any line in
             the benchmark's output.
         """
-        from json import load, loads
+        from json import loads
         from json.decoder import JSONDecodeError
-        from jsonschema import validate, ValidationError
-        from os.path import abspath, dirname, join
-        from re import compile
+        from jsonschema import ValidationError
+        from os.path import abspath
         from subprocess import PIPE, run
 
         if isinstance(self.benchmark.stats, CommandInfo):
@@ -352,50 +608,44 @@ class BenchmarkRun:
                     f"Failed to decode stats script json output: {e}", stats_output
                 ) from None
 
-            # Validate stats script output against stats jsonschema (should prevent
-            # further errors when deserializing)
-            schema_path = join(
-                dirname(__file__), "jsonschema", "benchmark_stats.schema.json"
-            )
-            with open(schema_path, "r") as schema_file:
-                schema = load(schema_file)
-                try:
-                    validate(json, schema)
-                except ValidationError as e:
-                    raise BenchmarkStatsDecodeError(
-                        f"Decoded output from stats script is not valid: {e}",
-                        stats_output,
-                    )
-
-            return BenchmarkStats.deserialize(json).stats
-
-        stats: "Dict[str, Union[int, float]]" = {}
-        for name, match in self.benchmark.stats.items():
-
-            file = (
-                open(stdout, "r") if isinstance(stdout, str) else stdout  # noqa: SIM115
-            )
-
-            if match.file is not None:
-                file = open(join(self.benchmark.dir, match.file), "r")  # noqa: SIM115
-
-            # (Try to) match regex agains every line in the file
-            regex = compile(match.regex)
-            if (
-                m := regex.search(file if isinstance(file, str) else file.read())
-            ) is not None:
-                number = m.group(1)
-                stats[name] = float(number) if "." in number else int(number)
+            # Stats script output is validated against stats jsonschema while
+            # deserializing
+            try:
+                return BenchmarkStats.deserialize(json).get_all_stats()
+            except ValidationError as e:
+                raise BenchmarkStatsDecodeError(
+                    f"Decoded output from stats script is not valid: {e}",
+                    stats_output,
+                ) from None
 
-            if name not in stats:
-                raise BenchmarkStatsMatchError(
-                    f'No match for stat "{name}" in benchmark output'
-                )
+        matcher = self.get_stat_matcher()
+        assert matcher is not None
 
+        file = open(stdout, "r") if isinstance(stdout, str) else stdout  # noqa: SIM115
+        try:
+            while chunk := file.read(64 * 1024):
+                matcher.feed_text(chunk)
+        finally:
             if file is not stdout:
                 file.close()
 
-        return stats
+        return matcher.get_stats(self.benchmark.dir, partial)
+
+    def get_stat_matcher(
+        self, on_match: "Optional[Callable[[str, Union[int, float]], Any]]" = None
+    ) -> "Optional[StatMatcher]":
+        """
+        Get a matcher for the benchmark's stats, to be fed with the output.
+
+        :param on_match: called with a stat's name and value as soon as it matches.
+        :returns: `None` if the stats are extracted by a stats script.
+        """
+        from openforbc_benchmark.stats import StatMatcher
+
+        if isinstance(self.benchmark.stats, CommandInfo):
+            return None
+
+        return StatMatcher(self.benchmark.stats, on_match)
 
     def cleanup(self) -> "Iterator[Runnable]":
         """Get cleanup tasks for this benchmark."""
@@ -403,33 +653,155 @@ class BenchmarkRun:
             for command in self.benchmark.cleanup_commands:
                 yield self._add_context(command.into_runnable())
 
+    def _memoize_setup(
+        self,
+        stamps: "SetupStamps",
+        step: int,
+        task: Runnable,
+        inputs: "Optional[List[str]]" = None,
+        outputs: "Optional[List[str]]" = None,
+        env: "Optional[Dict[str, str]]" = None,
+    ) -> "Iterator[Runnable]":
+        """
+        Get a setup task unless it's up to date, stamping it once it's been run.
+
+        :param env: environment variables the task is run with, which aren't part
+            of its stamp.
+        """
+        if stamps.is_valid(step, task, inputs, outputs):
+            self.skipped_setup.append(task)
+            return
+
+        stamps.invalidate(step)
+        yield (
+            task
+            if env is None
+            else Runnable(
+                task.args,
+                task.cwd,
+                {**(task.env or {}), **env},
+                task.path,
+                task.placement,
+                task.timeout,
+            )
+        )
+        # Only reached if the task succeeded
+        stamps.record(step, task, inputs, outputs)
+
+    def _setup_cached_virtualenv(
+        self, cache: "VenvCache", stamps: "SetupStamps"
+    ) -> "Iterator[Runnable]":
+        """
+        Get the setup tasks of a benchmark whose virtualenv is shared through the cache.
+
+        If the cache has no matching virtualenv it's built, running every setup
+        command; when the setup is forced it's built again, unless another run is
+        using it (e.g. it's just been rebuilt by a parallel run). Otherwise the
+        setup commands which are not up to date (e.g. in a fresh checkout, whose
+        files they produce are missing) are run again with the cached virtualenv:
+        pip can't reach any package index, since the virtualenv already has every
+        package they install and it's read-only.
+        """
+        from openforbc_benchmark.venv_cache import get_venv_key
+
+        key = get_venv_key(self.benchmark)
+        path = cache.get_path(key)
+
+        if self._venv_lock is not None:
+            self._venv_lock.close()
+            self._venv_lock = None
+
+        if self.force_setup:
+            with cache.lock(key):
+                cache.try_clear(key)
+
+        # The virtualenv is in use (and can't be evicted) as long as this run is
+        self._venv_lock = cache.acquire(key)
+
+        with cache.lock(key):
+            if cache.is_ready(key):
+                cache.touch(key)
+                self._virtualenv = path
+            else:
+                cache.clear(key)
+                yield self._add_context(Runnable(["python3", "-m", "venv", path]))
+                self._virtualenv = path
+
+                # Every setup command is run (and stamped) into the new virtualenv
+                stamps.invalidate(0)
+                yield from self._run_setup_commands(stamps)
+
+                # Only reached after every setup task has been run
+                cache.commit(key)
+                return
+
+        yield from self._run_setup_commands(stamps, {"PIP_NO_INDEX": "1"})
+
+    def _run_setup_commands(
+        self, stamps: "SetupStamps", env: "Optional[Dict[str, str]]" = None
+    ) -> "Iterator[Runnable]":
+        """Get the tasks of the benchmark's setup commands which are not up to date."""
+        if self.benchmark.setup_commands is not None:
+            for step, command in enumerate(self.benchmark.setup_commands):
+                yield from self._memoize_setup(
+                    stamps,
+                    step,
+                    self._add_context(command.into_runnable()),
+                    command.inputs,
+                    command.outputs,
+                    env,
+                )
+
     def _run_preset(self, preset: "Preset") -> "Iterator[Runnable]":
         """Get tasks for the selected preset."""
         if preset.init_commands is not None:
             for command in preset.init_commands:
-                yield self._add_context(command.into_runnable())
+                yield self._add_context(command.into_runnable(), timeout=preset.timeout)
 
         last = len(self.benchmark.run_commands) - 1
         for i, command in enumerate(self.benchmark.run_commands):
-            yield self._add_context(
+            task = self._add_context(
                 (
                     # Add preset arguments only to last run command
                     command.extend(preset.args, preset.env)
                     if i == last and preset.args is not None
                     else command
-                ).into_runnable()
+                ).into_runnable(),
+                self.get_placement(preset),
+                preset.timeout,
+            )
+            yield (
+                WorkerTask(
+                    task.args,
+                    task.cwd,
+                    task.env,
+                    task.path,
+                    task.placement,
+                    task.timeout,
+                )
+                if i == last and self.uses_worker()
+                else task
             )
 
         if preset.post_commands is not None:
             for command in preset.post_commands:
-                yield self._add_context(command.into_runnable())
+                yield self._add_context(command.into_runnable(), timeout=preset.timeout)
 
-    def _add_context(self, runnable: Runnable) -> Runnable:
+    def _add_context(
+        self,
+        runnable: Runnable,
+        placement: "Optional[PlacementDefinition]" = None,
+        timeout: "Optional[float]" = None,
+    ) -> Runnable:
         """
         Populate command context with this run's environment.
 
         Will add benchmark's directory as cwd and (eventually) set up a python virtualenv
         to isolate this benchmark.
+
+        :param placement: where the command is executed.
+        :param timeout: the command's timeout, unless it has its own (the run's
+            timeout by default).
         """
         from os.path import isabs, join
 
@@ -460,36 +832,88 @@ class BenchmarkRun:
             run_env,
             # Add virtualenv's bin directory to PATH
             [join(self._virtualenv, "bin")] if self._virtualenv is not None else [],
+            placement,
+            next(
+                (t for t in (runnable.timeout, timeout, self.timeout) if t is not None),
+                None,
+            ),
+        )
+
+
+def get_sweep_preset_name(sweep: str, axes: "Dict[str, str]") -> str:
+    """Get the name of a sweep's preset from the values of its axes."""
+    return f"{sweep}@" + ",".join(f"{axis}={value}" for axis, value in axes.items())
+
+
+def parse_sweep_preset_name(name: str) -> "Optional[Tuple[str, Dict[str, str]]]":
+    """
+    Parse the name of a sweep's preset (see `get_sweep_preset_name`).
+
+    :returns: the sweep's name and the values of its axes, `None` if the preset is
+        not part of a sweep.
+    """
+    sweep, at, selector = name.partition("@")
+    if not at:
+        return None
+
+    return sweep, dict(value.partition("=")[::2] for value in selector.split(","))
+
+
+def substitute_axes(text: str, axes: "Dict[str, str]") -> str:
+    """Replace the `{axis}` placeholders in a string with the axes' values."""
+    from re import sub
+
+    return sub(r"\{(\w+)\}", lambda match: axes.get(match[1], match[0]), text)
+
+
+def substitute_commands(
+    commands: "Optional[List[CommandInfo]]", axes: "Dict[str, str]"
+) -> "Optional[List[CommandInfo]]":
+    """Replace the `{axis}` placeholders in commands with the axes' values."""
+    if commands is None:
+        return None
+
+    return [
+        CommandInfo(
+            [substitute_axes(arg, axes) for arg in command.command],
+            {k: substitute_axes(v, axes) for k, v in command.env.items()},
+            substitute_axes(command.workdir, axes)
+            if command.workdir is not None
+            else None,
+            command.inputs,
+            command.outputs,
+            command.timeout,
         )
+        for command in commands
+    ]
 
 
-def get_benchmarks(search_path: str) -> "Iterator[Benchmark]":
+def get_benchmarks(
+    search_path: str, catalog: "Optional[BenchmarkCatalog]" = None
+) -> "Iterator[Benchmark]":
     """
     Get all the benchmarks in the search path.
 
     :param search_path: colon separated list of directories in which to search for
         benchmarks.
+    :param catalog: the benchmark catalog to use (defaults to the on-disk one).
     """
-    from os import listdir
-    from os.path import exists, join
+    from openforbc_benchmark.catalog import BenchmarkCatalog
 
-    for path in [join(x, "benchmarks") for x in search_path.split(":")]:
-        try:
-            for dir in listdir(path):
-                if exists(join(path, dir, "benchmark.json")):
-                    yield Benchmark.from_definition_file(
-                        join(path, dir, "benchmark.json")
-                    )
-        except (FileNotFoundError, NotADirectoryError):
-            continue
+    return (catalog or BenchmarkCatalog.default()).benchmarks(search_path)
 
 
-def find_benchmark(id: str, search_path: str) -> "Optional[Benchmark]":
+def find_benchmark(
+    id: str, search_path: str, catalog: "Optional[BenchmarkCatalog]" = None
+) -> "Optional[Benchmark]":
     """
     Find a benchmark by ID in the search path.
 
     :param id: id of the benchmark (directory name)
     :param search_path: colon separated list of directories in which to search for
         benchmarks.
+    :param catalog: the benchmark catalog to use (defaults to the on-disk one).
     """
-    return next((x for x in get_benchmarks(search_path) if x.get_id() == id), None)
+    from openforbc_benchmark.catalog import BenchmarkCatalog
+
+    return (catalog or BenchmarkCatalog.default()).find(id, search_path)
@@ -0,0 +1,214 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`catalog` module implements a persistent index of the benchmark definitions."""
+
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import Benchmark
+from openforbc_benchmark.json import BenchmarkDefinition
+
+if TYPE_CHECKING:
+    from os import stat_result
+    from typing import Any, Dict, Iterator, List, Optional
+
+CATALOG_VERSION = 1
+
+
+class BenchmarkCatalog:
+    """
+    An on-disk index of benchmark definitions keyed by benchmark ID.
+
+    Each search path root has its own set of entries, every entry records the
+    definition file's mtime and size along with the definition itself: a lookup
+    only needs to `stat` the definition file, which is re-parsed only when it
+    changed since it was indexed.
+    """
+
+    def __init__(self, path: "Optional[str]" = None) -> None:
+        """
+        Create a BenchmarkCatalog, loading its index from `path` if it exists.
+
+        :param path: index file path, `None` to keep the index in memory only.
+        """
+        self.path = path
+        self._roots: "Dict[str, Dict[str, Dict[str, Any]]]" = {}
+        self._dirty = False
+
+        if path is not None:
+            self._load(path)
+
+    @classmethod
+    def default(self_class) -> "BenchmarkCatalog":
+        """Get the process-wide catalog, stored in the cache directory."""
+        global _default_catalog
+        from os.path import join
+        from openforbc_benchmark.utils import get_cache_dir
+
+        path = join(get_cache_dir(), "catalog.json")
+        if _default_catalog is None or _default_catalog.path != path:
+            _default_catalog = self_class(path)
+
+        return _default_catalog
+
+    def find(self, id: str, search_path: str) -> "Optional[Benchmark]":
+        """
+        Find a benchmark by ID in the search path.
+
+        :param id: id of the benchmark (directory name)
+        :param search_path: colon separated list of directories in which to search
+            for benchmarks.
+        """
+        from os.path import join
+        from os import sep
+
+        if not id or sep in id or id in (".", ".."):
+            return None
+
+        try:
+            for root in get_roots(search_path):
+                definition = self._lookup(root, id)
+                if definition is not None:
+                    return Benchmark.from_definition(definition, join(root, id))
+        finally:
+            self.save()
+
+        return None
+
+    def benchmarks(self, search_path: str) -> "Iterator[Benchmark]":
+        """
+        Get all the benchmarks in the search path.
+
+        Folders whose definition didn't change since they were indexed are not
+        re-parsed. Entries for removed folders are dropped from the index.
+        """
+        from os import listdir
+        from os.path import join
+
+        try:
+            for root in get_roots(search_path):
+                try:
+                    ids = listdir(root)
+                except (FileNotFoundError, NotADirectoryError):
+                    self._drop_root(root)
+                    continue
+
+                entries = self._roots.get(root, {})
+                for stale in set(entries).difference(ids):
+                    self._drop(root, stale)
+
+                for id in ids:
+                    definition = self._lookup(root, id)
+                    if definition is not None:
+                        yield Benchmark.from_definition(definition, join(root, id))
+        finally:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the index to disk (if it changed).
+
+        The index is a cache: failing to write it is not an error.
+        """
+        from json import dump
+        from os import makedirs, replace
+        from os.path import dirname
+        from tempfile import NamedTemporaryFile
+
+        if self.path is None or not self._dirty:
+            return
+
+        try:
+            makedirs(dirname(self.path), exist_ok=True)
+            with NamedTemporaryFile(
+                "w", dir=dirname(self.path), suffix=".tmp", delete=False
+            ) as file:
+                dump({"version": CATALOG_VERSION, "roots": self._roots}, file)
+            replace(file.name, self.path)
+        except OSError:
+            return
+
+        self._dirty = False
+
+    def _load(self, path: str) -> None:
+        """Load the index from a file, ignoring missing or incompatible indexes."""
+        from json import load
+        from json.decoder import JSONDecodeError
+
+        try:
+            with open(path, "r") as file:
+                index = load(file)
+        except (OSError, JSONDecodeError):
+            return
+
+        if isinstance(index, dict) and index.get("version") == CATALOG_VERSION:
+            self._roots = index["roots"]
+
+    def _lookup(self, root: str, id: str) -> "Optional[BenchmarkDefinition]":
+        """Get an up-to-date definition for a benchmark (re-indexing it if stale)."""
+        from os import stat
+        from os.path import join
+
+        try:
+            st = stat(join(root, id, "benchmark.json"))
+        except OSError:
+            self._drop(root, id)
+            return None
+
+        entry = self._roots.get(root, {}).get(id)
+        if entry is None or not _is_fresh(entry, st):
+            return self._index(root, id, st)
+
+        # Definitions are validated when indexed
+        try:
+            return BenchmarkDefinition.deserialize_valid(entry["definition"])
+        except (KeyError, TypeError, ValueError):
+            return self._index(root, id, st)
+
+    def _index(
+        self, root: str, id: str, st: "stat_result"
+    ) -> "Optional[BenchmarkDefinition]":
+        """Parse a benchmark definition and store it into the index."""
+        from json import load
+        from os.path import join
+
+        with open(join(root, id, "benchmark.json"), "r") as file:
+            json = load(file)
+
+        definition = BenchmarkDefinition.deserialize(json)
+
+        self._roots.setdefault(root, {})[id] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "definition": json,
+        }
+        self._dirty = True
+
+        return definition
+
+    def _drop(self, root: str, id: str) -> None:
+        """Remove a benchmark from the index."""
+        if id in self._roots.get(root, {}):
+            del self._roots[root][id]
+            self._dirty = True
+
+    def _drop_root(self, root: str) -> None:
+        """Remove a search path root from the index."""
+        if root in self._roots:
+            del self._roots[root]
+            self._dirty = True
+
+
+def get_roots(search_path: str) -> "List[str]":
+    """Get the benchmark folders' absolute paths for a search path."""
+    from os.path import abspath, join
+
+    return [abspath(join(x, "benchmarks")) for x in search_path.split(":")]
+
+
+def _is_fresh(entry: "Dict[str, Any]", st: "stat_result") -> bool:
+    """Check whether an index entry matches the definition file's current state."""
+    return bool(entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size)
+
+
+_default_catalog: "Optional[BenchmarkCatalog]" = None
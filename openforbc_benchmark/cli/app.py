@@ -5,6 +5,7 @@ from typer import Context, Option, Typer  # noqa: TC002
 
 from openforbc_benchmark.cli.benchmark import app as benchmark_app
 from openforbc_benchmark.cli.interactive import app as interactive_app
+from openforbc_benchmark.cli.results import app as results_app
 from openforbc_benchmark.cli.suite import app as suite_app
 from openforbc_benchmark.cli.state import state
 
@@ -13,9 +14,12 @@ app = Typer()
 
 @app.callback(invoke_without_command=True)
 def callback(
-    ctx: Context, search_path: str = Option(state["search_path"], envvar="O4BCB_PATH")
+    ctx: Context,
+    search_path: str = Option(state["search_path"], envvar="O4BCB_PATH"),
+    results_db: str = Option(state["results_db"], envvar="O4BCB_RESULTS_DB"),
 ) -> None:
     state["search_path"] = search_path
+    state["results_db"] = results_db
 
     if ctx.invoked_subcommand is None:
         ctx.invoke(interactive_app)
@@ -23,6 +27,7 @@ def callback(
 
 app.add_typer(benchmark_app, name="benchmark")
 app.add_typer(interactive_app, name="interactive")
+app.add_typer(results_app, name="results")
 app.add_typer(suite_app, name="suite")
 
 
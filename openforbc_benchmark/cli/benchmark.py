@@ -3,14 +3,15 @@
 
 from json import dumps
 from tabulate import tabulate
-from os.path import join
+from os.path import dirname, join
 from sys import stdout
-from typer import Context, echo, Exit, Typer, Option  # noqa: TC002
+from typer import BadParameter, Context, echo, Exit, Typer, Option  # noqa: TC002
 from typer.params import Argument
-from typing import List  # noqa: TC002
+from typing import List, Optional  # noqa: TC002
 from typing import TYPE_CHECKING
 from yaspin.core import Yaspin
 
+from openforbc_benchmark.analysis import RepetitionPolicy, summarize
 from openforbc_benchmark.benchmark import (
     BenchmarkPresetNotFound,
     BenchmarkStatsDecodeError,
@@ -19,16 +20,42 @@ from openforbc_benchmark.benchmark import (
     get_benchmarks,
 )
 from openforbc_benchmark.cli.state import state
-from openforbc_benchmark.json import CommandInfo
+from openforbc_benchmark.results import ResultStore, ResultStoreError
+from openforbc_benchmark.stats import SeriesCollector, STATS_FD_ENV
 from openforbc_benchmark.utils import argv_join
+from openforbc_benchmark.worker import (
+    BenchmarkWorker,
+    WorkerError,
+    WorkerRestart,
+    WorkerTask,
+    WorkerTimeout,
+)
 
 if TYPE_CHECKING:
-    from typing import Any, Dict, Tuple, Union
+    from typing import Any, Callable, Dict, Iterator, Tuple, Union
+    from openforbc_benchmark.analysis import StatSummary
     from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun, Preset
-    from openforbc_benchmark.json import StatMatchInfo
+    from openforbc_benchmark.journal import JournalEntry, SuiteJournal
+    from openforbc_benchmark.json import (
+        CommandInfo,
+        PlacementDefinition,
+        StatMatchInfo,
+    )
+    from openforbc_benchmark.placement import Placement
+    from openforbc_benchmark.sampler import ResourceSampler
     from openforbc_benchmark.utils import Runnable
 
 
+# Exit status of runs which timed out (as for coreutils' `timeout`)
+TIMEOUT_EXIT_CODE = 124
+
+# The status of a benchmark run
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMED_OUT = "timed-out"
+STATUS_STATS_ERROR = "stats-error"
+
+
 class BenchmarkRunException(Exception):
     pass
 
@@ -45,6 +72,12 @@ class BenchmarkTaskFailed(BenchmarkRunException):
     pass
 
 
+class BenchmarkTaskTimeout(BenchmarkRunException):
+    """The task didn't finish in time and has been killed."""
+
+    pass
+
+
 class BenchmarkRunStatsError(BenchmarkRunException):
     """Stats decode failed."""
 
@@ -55,63 +88,397 @@ class CliBenchmarkRun:
     """A benchmark run in the CLI interface."""
 
     def __init__(
-        self, benchmark_run: "BenchmarkRun", log_to_stderr: bool = not stdout.isatty()
+        self,
+        benchmark_run: "BenchmarkRun",
+        log_to_stderr: bool = not stdout.isatty(),
+        log_prefix: "Optional[str]" = None,
+        policy: "Optional[RepetitionPolicy]" = None,
+        results_db: "Optional[str]" = None,
+        mirror_output: bool = True,
+        sample_interval: "Optional[float]" = 0.5,
+        venv_cache: bool = False,
+        force_setup: bool = False,
+        worker: bool = False,
+        timeout: "Optional[float]" = None,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        journal: "Optional[SuiteJournal]" = None,
+        journal_run: int = 0,
     ) -> None:
+        """
+        Create a CliBenchmarkRun.
+
+        :param log_prefix: prefix for every logged line (used to tell apart the
+            output of concurrent runs).
+        :param policy: how many times each preset is run (once by default).
+        :param results_db: path of the results database each preset's stats are
+            stored into (`None` to not store them).
+        :param mirror_output: `False` to only write the commands' output into the
+            log files.
+        :param sample_interval: the interval between samples of the commands'
+            resource usage, in seconds (`None` or 0 to not sample it).
+        :param venv_cache: share the benchmark's virtualenv through the virtualenv
+            cache (unless the run already has a cache).
+        :param force_setup: run the setup commands even when they're up to date.
+        :param worker: run the presets in the benchmark's worker (if it has one).
+        :param timeout: the default time each command is given to finish, in seconds
+            (unless the run, its presets or its commands have their own timeout).
+        :param retries: the number of times a failed setup command is retried.
+        :param retry_delay: the time waited before the first retry, in seconds (the
+            delay is doubled after each retry).
+        :param journal: the journal the results of each completed preset are
+            recorded into: the presets already in it are not run again.
+        :param journal_run: the index of the run in the journal's suite.
+        """
         from datetime import datetime
-        from os import mkdir
-        from os.path import dirname, exists
+        from os import makedirs, mkdir
+
+        from openforbc_benchmark.venv_cache import VenvCache
+
+        if venv_cache and benchmark_run.venv_cache is None:
+            benchmark_run.venv_cache = VenvCache()
+        if force_setup:
+            benchmark_run.force_setup = True
+        if worker:
+            benchmark_run.worker = True
+        if benchmark_run.timeout is None:
+            benchmark_run.timeout = timeout
 
         self.benchmark_run = benchmark_run
         self.spinner = Yaspin()
-        self.log_dir = join(
+        self.policy = policy if policy is not None else RepetitionPolicy()
+        self.stats: "Dict[str, Dict[str, Union[int, float]]]" = {}
+        self.summaries: "Dict[str, Dict[str, StatSummary]]" = {}
+        # Presets whose stats were extracted from the output of a timed out command
+        self.partial: "List[str]" = []
+        self.timed_out = False
+        # One of the `STATUS_*` constants, along with the error which set it
+        self.status = STATUS_OK
+        self.error: "Optional[str]" = None
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.journal = journal
+        self.journal_run = journal_run
+        self._journaled: "Dict[str, JournalEntry]" = {}
+        self.results_db = results_db
+        self.mirror_output = mirror_output
+        self.sample_interval = sample_interval
+        self._log_to_stderr = log_to_stderr
+        self._log_prefix = log_prefix
+        self._worker: "Optional[BenchmarkWorker]" = None
+        self._worker_placement: "Any" = None
+        self._workers_started = 0
+
+        log_dir = join(
             get_benchmark_log_dir(benchmark_run.benchmark),
             datetime.now().strftime("%Y%m%d_%H%M%S"),
         )
-        self.stats: "Dict[str, Dict[str, Union[int, float]]]" = {}
-        self._log_to_stderr = log_to_stderr
+        makedirs(dirname(log_dir), exist_ok=True)
 
-        parent = dirname(self.log_dir)
-        if exists(self.log_dir):
-            i = 1
-            while exists(f"{self.log_dir}.{i}"):
+        # Concurrent runs may try to create the same directory: the first one
+        # to create it gets it
+        self.log_dir = log_dir
+        i = 0
+        while True:
+            try:
+                mkdir(self.log_dir)
+                break
+            except FileExistsError:
                 i += 1
-            self.log_dir = f"{self.log_dir}.{i}"
-        elif not exists(parent):
-            mkdir(parent)
-
-        mkdir(self.log_dir)
+                self.log_dir = f"{log_dir}.{i}"
 
     def print_stats(self, json: bool = False) -> None:
         """Print benchmark stats to output."""
+        if not self.policy.is_single():
+            print_summaries([self.summaries], json)
+            if not json:
+                print_sweep_tables(self.benchmark_run, get_means(self.summaries))
+            return
+
         if json:
             return echo(dumps(self.stats))
 
-        table: "List[Tuple[str, str, Union[int, float]]]" = []
-        for preset, preset_stats in self.stats.items():
-            table.extend((preset, stat, value) for stat, value in preset_stats.items())
-
-        echo(tabulate(table, ["Preset", "Stat", "Value"]))
+        echo(
+            tabulate(
+                get_stats_table(self.stats, self.partial), ["Preset", "Stat", "Value"]
+            )
+        )
+        print_sweep_tables(self.benchmark_run, self.stats)
 
     def start(self, test_only: bool = False) -> None:
         """Run the benchmark (interface method)."""
-        if self._log_to_stderr:
-            self._run_setup()
-            self._run_test() if test_only else self._run()
-        else:
-            with self.spinner:
+        if not test_only and self.journal is not None:
+            self._journaled = self._get_journaled()
+            # The setup is not needed if every preset is in the journal
+            if len(self._journaled) == len(self.benchmark_run.presets):
+                for preset in self.benchmark_run.presets:
+                    self._restore(preset, self._journaled[preset.name])
+                return
+
+        try:
+            if self._log_to_stderr:
                 self._run_setup()
                 self._run_test() if test_only else self._run()
+            else:
+                with self.spinner:
+                    self._run_setup()
+                    self._run_test() if test_only else self._run()
+        finally:
+            self._stop_worker()
 
     def _run(self) -> None:
         """Run the benchmark."""
         benchmark_id = self.benchmark_run.benchmark.get_id()
 
         for preset, tasks in self.benchmark_run.run():
+            if preset.name in self._journaled:
+                self._restore(preset, self._journaled[preset.name])
+                continue
+
             self._log(f'Running "{benchmark_id}" preset "{preset.name}"')
-            for i, task in enumerate(tasks):
-                from os import get_terminal_size
-                from textwrap import shorten
 
+            if self.policy.is_single():
+                sampler = self._get_sampler()
+                stats = self._run_trial(
+                    preset, tasks, f"run_{preset.name}", sampler=sampler
+                )
+                if stats is not None:
+                    # The benchmark's own stats take precedence
+                    if sampler is not None:
+                        stats = {**sampler.summarize(), **stats}
+                    self.stats[preset.name] = stats
+                    results = {name: [value] for name, value in stats.items()}
+                    self._store_results(preset, results)
+                    if not self.timed_out:
+                        self._checkpoint(preset, results)
+                if self.timed_out:
+                    self._stop(preset, Exit(TIMEOUT_EXIT_CODE))
+                continue
+
+            # Resource usage stats don't count towards the preset's stability
+            samples: "Dict[str, List[Union[int, float]]]" = {}
+            resources: "Dict[str, List[Union[int, float]]]" = {}
+            # The trials run before one which failed are still summarized
+            failure: "Optional[Exit]" = None
+            for n, (label, measured) in enumerate(self.policy.trials(samples)):
+                # No trial is run after one timed out
+                if self.timed_out:
+                    failure = Exit(TIMEOUT_EXIT_CODE)
+                    break
+
+                self._log(f'Running "{benchmark_id}" preset "{preset.name}" {label}')
+                sampler = self._get_sampler() if measured else None
+                try:
+                    stats = self._run_trial(
+                        preset,
+                        # Each trial needs a new iterator into the preset's tasks
+                        tasks if n == 0 else self.benchmark_run.run_preset(preset),
+                        f"run_{preset.name}.{label}",
+                        measured,
+                        sampler,
+                    )
+                except Exit as e:
+                    failure = e
+                    break
+                if stats is None:
+                    continue
+
+                for name, value in stats.items():
+                    samples.setdefault(name, []).append(value)
+                if sampler is not None:
+                    for name, value in sampler.summarize().items():
+                        if name not in stats:
+                            resources.setdefault(name, []).append(value)
+
+            if self.policy.is_adaptive():
+                runs = max((len(x) for x in samples.values()), default=0)
+                self._log(
+                    f'"{benchmark_id}" preset "{preset.name}" '
+                    + (
+                        f"is stable after {runs} runs"
+                        if self.policy.is_stable(samples)
+                        else f"did not reach target stability in {runs} runs"
+                    )
+                )
+
+            samples = {**resources, **samples}
+            self.summaries[preset.name] = summarize(samples)
+            self.stats[preset.name] = {
+                name: summary.mean
+                for name, summary in self.summaries[preset.name].items()
+            }
+            if samples:
+                self._store_results(preset, samples)
+            if failure is None and self.timed_out:
+                failure = Exit(TIMEOUT_EXIT_CODE)
+            if failure is not None:
+                self._stop(preset, failure)
+            if samples:
+                self._checkpoint(preset, samples)
+
+    def _get_journaled(self) -> "Dict[str, JournalEntry]":
+        """
+        Get the journal entries of the presets which already completed.
+
+        The entries of the presets whose definitions changed since they were
+        recorded are left out (see `get_preset_hash`).
+        """
+        from openforbc_benchmark.journal import get_preset_hash
+
+        if self.journal is None:
+            return {}
+
+        entries: "Dict[str, JournalEntry]" = {}
+        for preset in self.benchmark_run.presets:
+            entry = self.journal.get(self.journal_run, preset.name)
+            if entry is None:
+                continue
+            if entry.hash != get_preset_hash(self.benchmark_run, preset, self.policy):
+                self._log(
+                    f'WARNING: "{self.benchmark_run.benchmark.get_id()}" preset '
+                    f'"{preset.name}" changed since it was recorded into the '
+                    "journal, running it again",
+                    err=True,
+                )
+                continue
+            entries[preset.name] = entry
+
+        return entries
+
+    def _restore(self, preset: "Preset", entry: "JournalEntry") -> None:
+        """Restore the results of a preset from its journal entry."""
+        self._log(
+            f'Skipping "{self.benchmark_run.benchmark.get_id()}" preset '
+            f'"{preset.name}", its results are in the journal (logs in '
+            f'"{entry.log_dir}")'
+        )
+        self.stats[preset.name] = entry.stats
+        if not self.policy.is_single():
+            self.summaries[preset.name] = summarize(entry.samples)
+
+    def _checkpoint(
+        self, preset: "Preset", samples: "Dict[str, List[Union[int, float]]]"
+    ) -> None:
+        """Record the results of a completed preset into the journal (if any)."""
+        from openforbc_benchmark.journal import (
+            get_preset_hash,
+            JournalEntry,
+            JournalError,
+        )
+
+        if self.journal is None:
+            return
+
+        try:
+            self.journal.add(
+                JournalEntry(
+                    self.journal_run,
+                    preset.name,
+                    get_preset_hash(self.benchmark_run, preset, self.policy),
+                    self.log_dir,
+                    self.stats[preset.name],
+                    samples,
+                )
+            )
+        except (OSError, JournalError) as e:
+            self._log(
+                f'WARNING: Failed to record results into "{self.journal.path}": {e}',
+                err=True,
+            )
+
+    def _stop(self, preset: "Preset", exit: Exit) -> None:
+        """
+        Stop the run after a preset failed or timed out.
+
+        The stats the preset collected before are marked as partial.
+
+        :param exit: the exception terminating the run.
+        """
+        if self.stats.get(preset.name):
+            self.partial.append(preset.name)
+            self._log(
+                f'WARNING: The stats of "{self.benchmark_run.benchmark.get_id()}" '
+                f'preset "{preset.name}" are partial',
+                err=True,
+            )
+
+        raise exit
+
+    def _store_results(
+        self, preset: "Preset", samples: "Dict[str, List[Union[int, float]]]"
+    ) -> None:
+        """Store a preset's stats into the results database (if enabled)."""
+        from contextlib import suppress
+        from sqlite3 import Error
+
+        from openforbc_benchmark.placement import Placement, PlacementError
+
+        if self.results_db is None:
+            return
+
+        # The placement the preset's commands were executed with
+        metadata: "Dict[str, Any]" = {}
+        if self.status in (STATUS_FAILED, STATUS_TIMED_OUT):
+            metadata["partial"] = True
+        definition = self.benchmark_run.get_placement(preset)
+        if definition is not None:
+            with suppress(PlacementError):
+                metadata["placement"] = Placement.serialize(
+                    Placement.resolve(definition)
+                )
+
+        try:
+            with ResultStore(self.results_db) as store:
+                store.add_run(
+                    self.benchmark_run.benchmark.get_id(),
+                    preset,
+                    samples,
+                    self.log_dir,
+                    metadata=metadata,
+                )
+        except (Error, ResultStoreError) as e:
+            self._log(
+                f'WARNING: Failed to store results into "{self.results_db}": {e}',
+                err=True,
+            )
+
+    def _run_trial(
+        self,
+        preset: "Preset",
+        tasks: "Iterator[Runnable]",
+        log_name: str,
+        measured: bool = True,
+        sampler: "Optional[ResourceSampler]" = None,
+    ) -> "Optional[Dict[str, Union[int, float]]]":
+        """
+        Run a preset's tasks once.
+
+        :param log_name: log files name prefix (inside the run's log directory).
+        :param measured: `False` to skip stats extraction (for warm-up trials).
+        :param sampler: samples the tasks' resource usage (the samples are saved
+            into the log directory).
+        :returns: the trial's stats, `None` if stats couldn't be extracted. When the
+            last task times out the stats which matched in its output are returned
+            (and `timed_out` is set).
+        """
+        from os import get_terminal_size
+        from textwrap import shorten
+
+        benchmark_id = self.benchmark_run.benchmark.get_id()
+
+        # Stats are matched while the last task's output is being read
+        matcher = (
+            self.benchmark_run.get_stat_matcher(
+                lambda name, value: self._log(f'Stat "{name}": {value}')
+            )
+            if measured
+            else None
+        )
+        collector = SeriesCollector() if measured else None
+
+        task_list = list(tasks)
+        try:
+            for i, task in enumerate(task_list):
                 self.spinner.text = shorten(
                     f"{benchmark_id}(run:{preset.name}): {argv_join(task.args)}",
                     # spinner uses 2 chars
@@ -120,39 +487,105 @@ class CliBenchmarkRun:
                 )
                 self._run_task_or_err(
                     task,
-                    join(self.log_dir, f"run_{preset.name}.{i + 1}"),
+                    join(self.log_dir, f"{log_name}.{i + 1}"),
                     f'Benchmark "{benchmark_id}" preset "{preset.name}" command '
                     f'"{argv_join(task.args)}" failed',
+                    matcher.feed
+                    if matcher is not None and i == len(task_list) - 1
+                    else None,
+                    collector,
+                    sampler,
                 )
-                last_task_i = i
+        except Exit:
+            if not self.timed_out:
+                raise
 
-            out_filename = join(
-                self.log_dir, f"run_{preset.name}.{last_task_i + 1}.out.log"
-            )
+            # Stats can only be salvaged from the last task's output
+            if i != len(task_list) - 1:
+                collector = None
 
-            try:
-                if isinstance(self.benchmark_run.benchmark.stats, CommandInfo):
-                    self.stats[preset.name] = self.benchmark_run.get_stats(out_filename)
-                else:
-                    with open(out_filename, "r") as output:
-                        next(output)
-                        self.stats[preset.name] = self.benchmark_run.get_stats(output)
-            except BenchmarkStatsDecodeError as e:
-                self._log("ERROR: stats script output:", err=True)
-                self._log(e.output.rstrip(), err=True)
-                self._fail(
-                    BenchmarkRunStatsError(
-                        f'"{benchmark_id}" preset "{preset.name}" stats decode '
-                        f"failed: {e}"
-                    ),
-                )
-            except BenchmarkStatsMatchError as e:
-                self._fail(
-                    BenchmarkRunStatsError(
-                        f'"{benchmark_id}" preset "{preset.name}" stats match failed: '
-                        f"{e}"
-                    )
+        if sampler is not None:
+            self._save_samples(sampler, log_name)
+
+        if collector is None:
+            return None
+
+        out_filename = join(self.log_dir, f"{log_name}.{len(task_list)}.out.log")
+
+        try:
+            stats = (
+                matcher.get_stats(self.benchmark_run.benchmark.dir, self.timed_out)
+                if matcher is not None
+                else self.benchmark_run.get_stats(out_filename, self.timed_out)
+            )
+            return self._add_series(stats, collector, log_name)
+        except BenchmarkStatsDecodeError as e:
+            self._log("ERROR: stats script output:", err=True)
+            self._log(e.output.rstrip(), err=True)
+            self._fail(
+                BenchmarkRunStatsError(
+                    f'"{benchmark_id}" preset "{preset.name}" stats decode '
+                    f"failed: {e}"
+                ),
+            )
+        except BenchmarkStatsMatchError as e:
+            self._fail(
+                BenchmarkRunStatsError(
+                    f'"{benchmark_id}" preset "{preset.name}" stats match failed: '
+                    f"{e}"
                 )
+            )
+
+        return None
+
+    def _add_series(
+        self,
+        stats: "Dict[str, Union[int, float]]",
+        collector: "SeriesCollector",
+        log_name: str,
+    ) -> "Dict[str, Union[int, float]]":
+        """
+        Add the summaries of the stats channel's series to the stats.
+
+        The series are saved into the log directory as well.
+
+        :returns: the stats along with the series' summaries.
+        """
+        from openforbc_benchmark.analysis import Distribution, flatten_distributions
+
+        collector.close()
+        if collector.errors:
+            self._log(
+                f"WARNING: Skipped {collector.errors} invalid stats channel records",
+                err=True,
+            )
+
+        if not collector.distributions:
+            return stats
+
+        with open(join(self.log_dir, f"{log_name}.series.json"), "w") as file:
+            file.write(dumps(collector.distributions, default=Distribution.serialize))
+
+        all_stats: "Dict[str, Union[int, float]]" = {}
+        all_stats.update(flatten_distributions(collector.distributions))
+        all_stats.update(stats)
+        return all_stats
+
+    def _get_sampler(self) -> "Optional[ResourceSampler]":
+        """Get a sampler of the commands' resource usage (`None` if disabled)."""
+        from openforbc_benchmark.sampler import is_supported, ResourceSampler
+
+        if not self.sample_interval or not is_supported():
+            return None
+
+        return ResourceSampler(self.sample_interval)
+
+    def _save_samples(self, sampler: "ResourceSampler", log_name: str) -> None:
+        """Save the resource usage samples into the log directory."""
+        with open(join(self.log_dir, f"{log_name}.resources.json"), "w") as file:
+            file.write(
+                dumps({"interval": sampler.interval, "samples": sampler.samples})
+            )
 
     def _run_setup(self) -> None:
         """Run benchmark's setup tasks."""
@@ -166,6 +599,14 @@ class CliBenchmarkRun:
                 join(self.log_dir, f"setup.{i + 1}"),
                 f'Benchmark "{benchmark_id}" setup command "{argv_join(task.args)}" '
                 "failed",
+                retries=self.retries,
+            )
+
+        skipped = self.benchmark_run.skipped_setup
+        if skipped:
+            self._log(
+                f"Skipped {len(skipped)} up-to-date setup command(s) (use "
+                "--force-setup to run them anyway)"
             )
 
     def _run_test(self) -> None:
@@ -191,7 +632,20 @@ class CliBenchmarkRun:
         self.spinner.stop()
 
         echo(exception, err=True)
+        if self.status in (STATUS_OK, STATUS_STATS_ERROR):
+            self.error = str(exception)
+        if isinstance(exception, BenchmarkTaskTimeout):
+            self.timed_out = True
+            self.status = STATUS_TIMED_OUT
+            echo(
+                f'ERROR: Benchmark "{self.benchmark_run.benchmark.get_id()}" timed out',
+                err=True,
+            )
+            raise Exit(TIMEOUT_EXIT_CODE)
+
         if isinstance(exception, BenchmarkRunStatsError):
+            if self.status == STATUS_OK:
+                self.status = STATUS_STATS_ERROR
             echo(
                 f"WARNING: Stats decode for benchmark "
                 f'"{self.benchmark_run.benchmark.get_id()}" failed',
@@ -203,6 +657,7 @@ class CliBenchmarkRun:
             f'ERROR: Benchmark "{self.benchmark_run.benchmark.get_id()}" failed',
             err=True,
         )
+        self.status = STATUS_FAILED
         raise Exit(1)
 
     def _log(self, message: "Any", err: bool = True) -> None:
@@ -212,11 +667,23 @@ class CliBenchmarkRun:
         :param message: message to log.
         :param err: `True` to use stderr, `False` for stdout.
         """
+        if self._log_prefix is not None:
+            message = "\n".join(
+                f"{self._log_prefix}{line}" for line in str(message).split("\n")
+            )
+
         with self.spinner.hidden():
             echo(message, err=(self._log_to_stderr or err))
 
     def _run_task_or_err(
-        self, task: "Runnable", log_prefix: str, err_message: "Any"
+        self,
+        task: "Runnable",
+        log_prefix: str,
+        err_message: "Any",
+        stdout_consumer: "Optional[Callable[[bytes], Any]]" = None,
+        collector: "Optional[SeriesCollector]" = None,
+        sampler: "Optional[ResourceSampler]" = None,
+        retries: int = 0,
     ) -> None:
         """
         Run a task, eventually failing with an exception.
@@ -224,12 +691,51 @@ class CliBenchmarkRun:
         :param task: the task to run.
         :param log_prefix: output filename prefix.
         :param err_message: error message to be shown when the task fails.
+        :param stdout_consumer: called with each chunk of the task's stdout.
+        :param collector: collects the samples the task writes into the stats
+            channel (`None` to not open the channel).
+        :param sampler: samples the task's resource usage.
+        :param retries: the number of times the task is run again if it fails or
+            times out, waiting `retry_delay` seconds (doubled after each retry).
         """
-        try:
-            ret = self._run_task(task, log_prefix)
-        except Exception as e:
+        from os import replace
+        from time import sleep
+
+        delay = self.retry_delay
+        for attempt in range(retries + 1):
+            try:
+                ret = self._run_task(
+                    task, log_prefix, stdout_consumer, collector, sampler
+                )
+            except Exception as e:
+                self._log(err_message, err=True)
+                self._fail(
+                    BenchmarkTaskError(f"Task {task} did not start because of {e}")
+                )
+
+            if ret == 0 or attempt == retries:
+                break
+
+            self._log(
+                f"WARNING: Task {task} "
+                + ("timed out" if ret is None else f"failed with return code {ret}")
+                + f", retrying in {delay:g}s ({attempt + 1}/{retries})",
+                err=True,
+            )
+            # The logs of the failed attempts are kept
+            for stream in ("out", "err"):
+                replace(
+                    f"{log_prefix}.{stream}.log",
+                    f"{log_prefix}.attempt{attempt + 1}.{stream}.log",
+                )
+            sleep(delay)
+            delay *= 2
+
+        if ret is None:
             self._log(err_message, err=True)
-            self._fail(BenchmarkTaskError(f"Task {task} did not start because of {e}"))
+            self._fail(
+                BenchmarkTaskTimeout(f"Task {task} timed out after {task.timeout}s")
+            )
 
         if ret != 0:
             if ret == 1 and "venv" in task.args:
@@ -237,7 +743,7 @@ class CliBenchmarkRun:
                     if "Error: [Errno 2] No such file or directory:" in output.read():
                         self._log(
                             "WARNING: Possibly broken symbolic link in benchmark's "
-                            f"virtualenv ({self.benchmark_run.benchmark.dir}/.venv), "
+                            f"virtualenv ({join(task.cwd or '', task.args[-1])}), "
                             "delete it and try again",
                             err=True,
                         )
@@ -248,54 +754,354 @@ class CliBenchmarkRun:
                 BenchmarkTaskFailed(f"Task {task} failed with return code {ret}")
             )
 
-    def _run_task(self, task: "Runnable", log_prefix: str) -> int:
-        """Run the task."""
-        from selectors import DefaultSelector, EVENT_READ
+    def _run_task(
+        self,
+        task: "Runnable",
+        log_prefix: str,
+        stdout_consumer: "Optional[Callable[[bytes], Any]]" = None,
+        collector: "Optional[SeriesCollector]" = None,
+        sampler: "Optional[ResourceSampler]" = None,
+    ) -> "Optional[int]":
+        """
+        Run the task.
+
+        :returns: the task's return code, `None` if it timed out (its process group
+            is killed).
+        """
+        from contextlib import nullcontext
+        from os import close, environ, pipe
         from subprocess import PIPE, Popen
-        from time import sleep
-        from typing import cast, IO
+        from typing import Tuple
+
+        from openforbc_benchmark.process import OutputPump
 
         self._log(task)
+        if isinstance(task, WorkerTask):
+            return self._run_worker_task(task, log_prefix, stdout_consumer, collector)
+
+        # Placements are resolved before the harness is isolated
+        popen_args = task.into_popen_args()
+        placement = self._get_placement(task)
+
+        pass_fds: "Tuple[int, ...]" = ()
+        if collector is not None:
+            # The write end of the stats channel is inherited by the task
+            read_fd, write_fd = pipe()
+            env = dict(popen_args["env"] if popen_args["env"] is not None else environ)
+            env[STATS_FD_ENV] = str(write_fd)
+            popen_args["env"] = env
+            pass_fds = (write_fd,)
+
+        # The harness is moved off the task's CPUs (if isolated) until it's done
+        with placement.isolate_harness() if placement is not None else nullcontext():
+            try:
+                proc = Popen(**popen_args, stderr=PIPE, stdout=PIPE, pass_fds=pass_fds)
+            except Exception:
+                if collector is not None:
+                    close(read_fd)
+                raise
+            finally:
+                for fd in pass_fds:
+                    close(fd)
+
+            if sampler is not None:
+                sampler.start(proc.pid)
+
+            with open(f"{log_prefix}.err.log", "wb") as err_log, open(
+                f"{log_prefix}.out.log", "wb"
+            ) as out_log:
+                err_log.write(f"{task}\n".encode())
+                out_log.write(f"{task}\n".encode())
+
+                pump = OutputPump(
+                    out_log, err_log, mirror=self._log if self.mirror_output else None
+                )
+                if stdout_consumer is not None:
+                    pump.add_consumer(stdout_consumer)
+                if collector is not None:
+                    pump.add_stream("stats", read_fd)
+                    pump.add_consumer(collector.feed, "stats")
+                try:
+                    ret = pump.run(proc, task.timeout)
+                finally:
+                    if sampler is not None:
+                        sampler.stop()
+
+                if pump.timed_out:
+                    err_log.write(f"\n[Timed out after {task.timeout}s]\n".encode())
+                    return None
+                return ret
+
+    def _run_worker_task(
+        self,
+        task: "WorkerTask",
+        log_prefix: str,
+        stdout_consumer: "Optional[Callable[[bytes], Any]]" = None,
+        collector: "Optional[SeriesCollector]" = None,
+    ) -> "Optional[int]":
+        """
+        Run a task in the benchmark's worker, starting the worker if needed.
 
-        proc = Popen(**task.into_popen_args(), stderr=PIPE, stdout=PIPE)
-        assert proc.stdout is not None
-        assert proc.stderr is not None
+        The worker is restarted when the task's placement differs from its own, or
+        when it asks to be (e.g. the task needs process-wide settings it can't
+        change anymore), and a task requesting isolation gets a new worker of its
+        own (stopped once the task is done). The worker's output is in its own log
+        files, while the task's log only has the task's stdout.
+        """
+        from contextlib import nullcontext
 
-        # Selector to read from both stdout and stderr
-        outsel = DefaultSelector()
-        outsel.register(proc.stdout, EVENT_READ)
-        outsel.register(proc.stderr, EVENT_READ)
+        from openforbc_benchmark.json import PlacementDefinition
 
-        with outsel, open(f"{log_prefix}.err.log", "w") as err_log, open(
-            f"{log_prefix}.out.log", "w"
+        isolate = task.placement is not None and task.placement.isolate
+        placement_key = (
+            PlacementDefinition.serialize(task.placement)
+            if task.placement is not None
+            else None
+        )
+        if self._worker is not None and (
+            isolate
+            or placement_key != self._worker_placement
+            or not self._worker.is_running()
+        ):
+            self._stop_worker()
+
+        placement = self._get_placement(task)
+        with placement.isolate_harness() if placement is not None else nullcontext():
+            if self._worker is None:
+                self._start_worker(task.placement)
+            assert self._worker is not None
+
+            ret: "Optional[int]"
+            try:
+                ret, output = self._run_in_worker(task, collector)
+            except WorkerTimeout:
+                # The worker has been killed
+                self._stop_worker()
+                ret, output = None, b""
+            except WorkerError as e:
+                self._log(f"ERROR: {e}", err=True)
+                ret, output = self._stop_worker() or 1, b""
+            finally:
+                if isolate:
+                    self._stop_worker()
+
+        with open(f"{log_prefix}.err.log", "wb") as err_log, open(
+            f"{log_prefix}.out.log", "wb"
         ) as out_log:
-            err_log.write(f"{task}\n")
-            out_log.write(f"{task}\n")
-
-            reading = True
-            while reading:
-                for k, _ in outsel.select():
-                    # Try to read a line from either stdout or stderr
-                    line = cast(IO[bytes], k.fileobj).readline()
-                    if not line:
-                        # Unregister ended fileobj
-                        outsel.unregister(k.fileobj)
-                        if not outsel.get_map():  # No more output
-                            reading = False
-                        continue
-
-                    self._log(line.rstrip().decode())
-
-                    # Write line to err/out log file
-                    log_file = err_log if k.fileobj is proc.stderr else out_log
-                    log_file.write(
-                        line.decode() if line.endswith(b"\n") else line.decode() + "\n"
-                    )
+            err_log.write(f"{task}\n".encode())
+            out_log.write(f"{task}\n".encode())
+            out_log.write(output)
 
-        while proc.poll() is None:
-            sleep(0.05)
+        if stdout_consumer is not None:
+            stdout_consumer(output)
+
+        return ret
+
+    def _run_in_worker(
+        self, task: "WorkerTask", collector: "Optional[SeriesCollector]"
+    ) -> "Tuple[int, bytes]":
+        """Run a task in the benchmark's worker, in a fresh one if it asks to."""
+        assert self._worker is not None
+        try:
+            return self._worker.run(task, collector)
+        except WorkerRestart as e:
+            self._log(f"{e}, starting a new one")
+
+        # A fresh worker asking to be restarted again is an error
+        self._stop_worker()
+        self._start_worker(task.placement)
+        assert self._worker is not None
+        return self._worker.run(task, collector)
+
+    def _start_worker(self, placement: "Optional[PlacementDefinition]") -> None:
+        """Start the benchmark's worker."""
+        from openforbc_benchmark.json import PlacementDefinition
+
+        self._workers_started += 1
+        task = self.benchmark_run.get_worker_task(placement)
+        self._log(f"Starting worker: {task}")
+
+        worker = BenchmarkWorker(
+            task,
+            join(
+                self.log_dir,
+                "worker"
+                if self._workers_started == 1
+                else f"worker.{self._workers_started}",
+            ),
+            mirror=self._log if self.mirror_output else None,
+        )
+        worker.start()
+        self._worker = worker
+        self._worker_placement = (
+            PlacementDefinition.serialize(placement) if placement is not None else None
+        )
+
+    def _stop_worker(self) -> "Optional[int]":
+        """Stop the benchmark's worker (if it's running)."""
+        if self._worker is None:
+            return None
+
+        worker, self._worker = self._worker, None
+        ret = worker.stop()
+        if ret:
+            self._log(f"WARNING: The worker exited with return code {ret}", err=True)
+
+        return ret
+
+    def _get_placement(self, task: "Runnable") -> "Optional[Placement]":
+        """Resolve a task's placement, logging it."""
+        placement = task.get_placement()
+        if placement is not None:
+            self._log(f"Placement: {placement}")
+        if (
+            task.placement is not None
+            and task.placement.isolate
+            and (placement is None or placement.harness_cpus is None)
+        ):
+            self._log(
+                "WARNING: Can't isolate the task from the harness on a single CPU",
+                err=True,
+            )
 
-        return proc.returncode
+        return placement
+
+
+def get_stats_table(
+    stats: "Dict[str, Dict[str, Union[int, float]]]", partial: "List[str]" = []
+) -> "List[Tuple[str, str, Union[int, float]]]":
+    """
+    Get the rows of a run's stats table.
+
+    :param partial: the presets whose stats are partial (marked as such).
+    """
+    table: "List[Tuple[str, str, Union[int, float]]]" = []
+    for preset, preset_stats in stats.items():
+        name = f"{preset} (partial)" if preset in partial else preset
+        table.extend((name, stat, value) for stat, value in preset_stats.items())
+
+    return table
+
+
+def get_sweep_tables(
+    benchmark_run: "BenchmarkRun", stats: "Dict[str, Dict[str, Union[int, float]]]"
+) -> "List[Tuple[str, List[str], List[List[Any]]]]":
+    """
+    Get a table of the stats of each sweep run.
+
+    Each sweep's table has a column for each of its axes and for each of the
+    benchmark's stats (every stat if they're matched by a command) and a row for
+    each of its presets which has stats.
+
+    :param stats: the run's stats by preset name and stat name.
+    :returns: the name, headers and rows of each sweep's table.
+    """
+    benchmark_stats = benchmark_run.benchmark.stats
+    tables: "Dict[str, Tuple[List[str], List[str], List[Dict[str, Any]]]]" = {}
+    for preset in benchmark_run.presets:
+        if preset.sweep is None or preset.axes is None or preset.name not in stats:
+            continue
+
+        axes, columns, rows = tables.setdefault(
+            preset.sweep, (list(preset.axes), [], [])
+        )
+        preset_stats = stats[preset.name]
+        for stat in preset_stats:
+            if stat not in columns and (
+                not isinstance(benchmark_stats, dict) or stat in benchmark_stats
+            ):
+                columns.append(stat)
+        rows.append({**preset_stats, **preset.axes})
+
+    return [
+        (
+            sweep,
+            axes + columns,
+            [[row.get(column) for column in axes + columns] for row in rows],
+        )
+        for sweep, (axes, columns, rows) in tables.items()
+    ]
+
+
+def print_sweep_tables(
+    benchmark_run: "BenchmarkRun", stats: "Dict[str, Dict[str, Union[int, float]]]"
+) -> None:
+    """Print a table of the stats of each sweep run (see `get_sweep_tables`)."""
+    for sweep, headers, rows in get_sweep_tables(benchmark_run, stats):
+        echo()
+        echo(f'Sweep "{sweep}"')
+        echo(tabulate(rows, headers))
+
+
+def get_means(
+    summaries: "Dict[str, Dict[str, StatSummary]]",
+) -> "Dict[str, Dict[str, Union[int, float]]]":
+    """Get the mean of each stat summary, by preset name and stat name."""
+    return {
+        preset: {stat: summary.mean for stat, summary in preset_summaries.items()}
+        for preset, preset_summaries in summaries.items()
+    }
+
+
+def print_summaries(
+    summaries: "List[Dict[str, Dict[str, StatSummary]]]",
+    json: bool = False,
+    titles: "Optional[List[str]]" = None,
+) -> None:
+    """
+    Print the stats summaries of one or more benchmark runs.
+
+    :param summaries: each run's summaries by preset name and stat name.
+    :param json: print a JSON object (or a list of objects if there are titles).
+    :param titles: the runs' titles (printed before each run's table).
+    """
+    from openforbc_benchmark.analysis import StatSummary
+
+    if json:
+        return echo(
+            dumps(
+                summaries if titles is not None else summaries[0],
+                default=StatSummary.serialize,
+            )
+        )
+
+    for i, run_summaries in enumerate(summaries):
+        if titles is not None:
+            echo()
+            echo(titles[i])
+
+        echo(
+            tabulate(
+                [
+                    (
+                        preset,
+                        stat,
+                        summary.mean,
+                        summary.median,
+                        summary.stddev,
+                        summary.min,
+                        summary.max,
+                        "-"
+                        if summary.ci is None
+                        else f"[{summary.ci[0]:.6g}, {summary.ci[1]:.6g}]",
+                        len(summary.samples),
+                    )
+                    for preset, preset_summaries in run_summaries.items()
+                    for stat, summary in preset_summaries.items()
+                ],
+                [
+                    "Preset",
+                    "Stat",
+                    "Mean",
+                    "Median",
+                    "Stddev",
+                    "Min",
+                    "Max",
+                    "CI (95%)",
+                    "Samples",
+                ],
+            )
+        )
 
 
 def find_benchmark_or_fail(benchmark_id: str) -> "Benchmark":
@@ -324,25 +1130,34 @@ def get_preset_or_fail(benchmark: "Benchmark", preset_name: str) -> "Preset":
 def get_benchmark_log_dir(benchmark: "Benchmark") -> str:
     """Get log directory for a benchmark."""
     from os import getcwd, mkdir
-    from os.path import exists
 
     log_dir = join(getcwd(), "logs")
 
-    if not exists(log_dir):
+    try:
         mkdir(log_dir)
         echo(
             'WARNING: Log directory "logs" not found in current directory, creating it',
             err=True,
         )
+    except FileExistsError:
+        pass
 
     return join(getcwd(), "logs", benchmark.get_id())
 
 
-def pretty_commands(commands: List[CommandInfo]) -> str:
+def pretty_commands(commands: "List[CommandInfo]") -> str:
     """Prettify command representation."""
     return "\n".join(f"\t{command.into_runnable()}" for command in commands)
 
 
+def pretty_matrix(matrix: "Dict[str, List[Union[str, int, float]]]") -> str:
+    """Prettify a sweep's matrix (e.g. `size=20,200 device=gpu`)."""
+    return " ".join(
+        f"{axis}={','.join(str(value) for value in values)}"
+        for axis, values in matrix.items()
+    )
+
+
 def pretty_stats(stats: "Union[CommandInfo, Dict[str, StatMatchInfo]]") -> str:
     """Prettify benchmark stats data."""
     if isinstance(stats, dict):
@@ -354,8 +1169,85 @@ def pretty_stats(stats: "Union[CommandInfo, Dict[str, StatMatchInfo]]") -> str:
     return pretty_commands([stats])
 
 
+def check_positive(value: "Optional[float]") -> "Optional[float]":
+    """Check that an option's value (if given) is strictly positive."""
+    if value is not None and value <= 0:
+        raise BadParameter(f"{value} is not greater than 0.")
+
+    return value
+
+
 app = Typer(help="List, inspect and run benchmark and presets")
 
+UNTIL_STABLE_OPTION = Option(
+    None,
+    "--until-stable",
+    "-s",
+    callback=check_positive,
+    help="Repeat each preset until every stat's 95% confidence interval is within "
+    "this fraction of its mean (e.g. 0.01)",
+)
+MAX_RUNS_OPTION = Option(
+    None, "--max-runs", min=1, help="Maximum number of runs with --until-stable"
+)
+MAX_TIME_OPTION = Option(
+    None, "--max-time", min=0, help="Time budget for each preset, in seconds"
+)
+STORE_OPTION = Option(
+    True, "--store/--no-store", help="Store the results into the results database"
+)
+QUIET_OPTION = Option(
+    False,
+    "--quiet",
+    "-q",
+    help="Don't show the commands' output (it's still written into the logs)",
+)
+VENV_CACHE_OPTION = Option(
+    False,
+    "--venv-cache/--no-venv-cache",
+    help="Share the benchmarks' virtualenvs through a cache keyed by their "
+    "requirements and setup commands (setup is skipped when they're cached)",
+)
+WORKER_OPTION = Option(
+    False,
+    "--worker/--no-worker",
+    help="Run the presets in the benchmarks' long-lived workers (if they have one)",
+)
+RETRIES_OPTION = Option(
+    0,
+    "--retries",
+    min=0,
+    help="Number of times a failed setup command is retried (e.g. flaky downloads)",
+)
+RETRY_DELAY_OPTION = Option(
+    1.0,
+    "--retry-delay",
+    min=0,
+    help="Time waited before retrying a setup command, in seconds (doubled after "
+    "each retry)",
+)
+FORCE_SETUP_OPTION = Option(
+    False,
+    "--force-setup",
+    help="Run the setup commands even when they're up to date (building cached "
+    "virtualenvs again)",
+)
+TIMEOUT_OPTION = Option(
+    None,
+    "--timeout",
+    min=0,
+    envvar="O4BCB_TIMEOUT",
+    help="Default time each command is given to finish, in seconds (commands, "
+    "presets and suite runs may specify their own timeout)",
+)
+SAMPLE_INTERVAL_OPTION = Option(
+    0.5,
+    "--sample-interval",
+    min=0,
+    help="Interval between samples of the commands' resource usage, in seconds "
+    "(0 to disable sampling)",
+)
+
 
 @app.command("list")
 def list_benchmarks(table: bool = Option(False, "--table", "-t")) -> None:
@@ -398,10 +1290,14 @@ def list_presets(
     echo(
         tabulate(
             [
-                (preset.name, argv_join(preset.args) if preset.args else None)
+                (
+                    preset.name,
+                    argv_join(preset.args) if preset.args else None,
+                    pretty_matrix(preset.matrix) if preset.matrix else None,
+                )
                 for preset in presets
             ],
-            headers=["Name", "Args"],
+            headers=["Name", "Args", "Matrix"],
         )
         if table
         else "\n".join(preset.name for preset in presets)
@@ -434,7 +1330,8 @@ def preset_info(
             f"Post commands:\n{pretty_commands(preset.post_commands)}\n"
             if preset.post_commands
             else ""
-        ),
+        )
+        + (f"Matrix:\n\t{pretty_matrix(preset.matrix)}\n" if preset.matrix else ""),
         nl=False,
     )
 
@@ -465,6 +1362,11 @@ def benchmark_info(
             else ""
         )
         + f"Stats:\n{pretty_stats(benchmark.stats)}\n"
+        + (
+            f"Worker command:\n{pretty_commands([benchmark.worker_command])}\n"
+            if benchmark.worker_command is not None
+            else ""
+        )
         + f"Virtualenv: {'enabled' if benchmark.virtualenv else 'disabled'}"
     )
 
@@ -475,6 +1377,24 @@ def run_benchmark(
     preset_names: "List[str]" = Argument(None),  # noqa: TC201
     use_test_preset: bool = Option(False, "--test-preset", "-t"),
     json: bool = Option(False, "--json", "-j"),
+    repeat: int = Option(
+        1, "--repeat", "-r", min=1, help="Number of measured runs of each preset"
+    ),
+    warmup: int = Option(
+        0, "--warmup", "-w", min=0, help="Number of discarded warm-up runs"
+    ),
+    until_stable: "Optional[float]" = UNTIL_STABLE_OPTION,  # noqa: TC201
+    max_runs: "Optional[int]" = MAX_RUNS_OPTION,  # noqa: TC201
+    max_time: "Optional[float]" = MAX_TIME_OPTION,  # noqa: TC201
+    store: bool = STORE_OPTION,
+    quiet: bool = QUIET_OPTION,
+    sample_interval: float = SAMPLE_INTERVAL_OPTION,
+    venv_cache: bool = VENV_CACHE_OPTION,
+    force_setup: bool = FORCE_SETUP_OPTION,
+    worker: bool = WORKER_OPTION,
+    timeout: "Optional[float]" = TIMEOUT_OPTION,  # noqa: TC201
+    retries: int = RETRIES_OPTION,
+    retry_delay: float = RETRY_DELAY_OPTION,
 ) -> None:
     """Run specified benchmark with one or more presets."""
     # typer has a bug and arguments specified as lists get passed as tuples
@@ -508,8 +1428,27 @@ def run_benchmark(
 
     run = benchmark.run(presets)
 
-    cli_run = CliBenchmarkRun(run)
-    cli_run.start()
+    cli_run = CliBenchmarkRun(
+        run,
+        policy=RepetitionPolicy(repeat, warmup, until_stable, max_runs, max_time),
+        results_db=state["results_db"] if store else None,
+        mirror_output=not quiet,
+        sample_interval=sample_interval,
+        venv_cache=venv_cache,
+        force_setup=force_setup,
+        worker=worker,
+        timeout=timeout,
+        retries=retries,
+        retry_delay=retry_delay,
+    )
+    try:
+        cli_run.start()
+    except Exit:
+        # The stats collected before a failure are still shown
+        if cli_run.stats:
+            cli_run.print_stats(json)
+        raise
+
     cli_run.print_stats(json)
 
 
@@ -39,7 +39,7 @@ def interactive_prompt() -> None:
 
         suite = next(suite for suite in suites if suite.name == suite_name)
 
-        suite_run = CliBenchmarkSuiteRun(suite)
+        suite_run = CliBenchmarkSuiteRun(suite, results_db=state["results_db"])
         suite_run.start()
         suite_run.print_stats()
 
@@ -74,7 +74,7 @@ def interactive_prompt() -> None:
             raise Exit(1)
 
         run = benchmark.run([preset])
-        cli_run = CliBenchmarkRun(run)
+        cli_run = CliBenchmarkRun(run, results_db=state["results_db"])
         cli_run.start()
         cli_run.print_stats()
 
@@ -0,0 +1,250 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+from typing import TYPE_CHECKING, Optional  # noqa: TC002
+
+from typer import Argument, echo, Exit, Option, Typer
+
+from openforbc_benchmark.cli.state import state
+from openforbc_benchmark.results import ResultStore, ResultStoreError
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, List
+    from openforbc_benchmark.results import Comparison
+
+
+def open_store() -> "ResultStore":
+    """Open the results database, exiting if it can't be opened."""
+    from os.path import exists
+    from sqlite3 import Error
+
+    path = state["results_db"]
+    if not exists(path):
+        echo(f'ERROR: Results database "{path}" does not exist', err=True)
+        raise Exit(1)
+
+    try:
+        return ResultStore(path)
+    except (Error, ResultStoreError) as e:
+        echo(f'ERROR: Couldn\'t open results database "{path}": {e}', err=True)
+        raise Exit(1)
+
+
+def serialize_comparison(comparison: "Comparison") -> "Dict[str, Any]":
+    """Serialize a comparison into a JSON object."""
+    return {
+        "benchmark": comparison.run.benchmark,
+        "preset": comparison.run.preset,
+        "params_hash": comparison.run.params_hash,
+        "host": comparison.run.host,
+        "run_id": comparison.run.id,
+        "stat": comparison.stat,
+        "value": comparison.value,
+        "baseline": comparison.baseline,
+        "change": comparison.get_change(),
+        "p_value": comparison.p_value,
+        "higher_is_better": comparison.higher_is_better,
+        "status": comparison.get_status(),
+    }
+
+
+app = Typer(help="Query stored benchmark results and detect regressions")
+
+
+@app.command("list")
+def list_runs(
+    benchmark_id: "Optional[str]" = Argument(None),  # noqa: TC201
+    preset: "Optional[str]" = Option(None, "--preset", "-p"),  # noqa: TC201
+    limit: int = Option(20, "--limit", "-n", min=1),
+) -> None:
+    """List the latest stored runs."""
+    from datetime import datetime
+    from tabulate import tabulate
+
+    with open_store() as store:
+        runs = store.get_runs(benchmark_id, preset, limit=limit)
+
+    echo(
+        tabulate(
+            (
+                (
+                    run.id,
+                    datetime.fromtimestamp(run.timestamp).isoformat(" ", "seconds"),
+                    run.benchmark,
+                    run.preset,
+                    run.hostname,
+                    ", ".join(
+                        f"{stat}={mean:.6g}" for stat, mean in run.get_means().items()
+                    ),
+                )
+                for run in runs
+            ),
+            headers=["ID", "Date", "Benchmark", "Preset", "Host", "Stats"],
+            tablefmt="simple",
+        )
+    )
+
+
+@app.command("compare")
+def compare_runs(
+    benchmark_id: "Optional[str]" = Argument(None),  # noqa: TC201
+    preset: "Optional[str]" = Option(None, "--preset", "-p"),  # noqa: TC201
+    window: int = Option(
+        10, "--window", min=2, help="Number of previous runs in the baseline"
+    ),
+    alpha: float = Option(
+        0.01, "--alpha", min=0, max=1, help="Significance level of the test"
+    ),
+    higher_is_better: "Optional[str]" = Option(  # noqa: TC201
+        None,
+        "--higher-is-better",
+        help="Regex matching the stats for which higher values are better "
+        "(defaults to throughput-like names, e.g. fps, score, *_per_second)",
+    ),
+    all_hosts: bool = Option(
+        False, "--all-hosts", help="Compare the runs of every host, not just this one"
+    ),
+    json: bool = Option(False, "--json", "-j"),
+    check: bool = Option(
+        False, "--check", help="Exit with status 1 if any regression is found"
+    ),
+) -> None:
+    """Compare the latest run of each benchmark preset against the previous ones."""
+    from json import dumps
+    from tabulate import tabulate
+
+    from openforbc_benchmark.results import compare, get_host_fingerprint
+
+    with open_store() as store:
+        comparisons: "List[Comparison]" = list(
+            compare(
+                store,
+                window,
+                alpha,
+                higher_is_better,
+                benchmark_id,
+                preset,
+                None if all_hosts else get_host_fingerprint(),
+            )
+        )
+
+    if json:
+        echo(dumps(comparisons, default=serialize_comparison))
+    else:
+        echo(
+            tabulate(
+                (
+                    (
+                        c.run.benchmark,
+                        c.run.preset,
+                        c.stat,
+                        c.value,
+                        len(c.baseline),
+                        "-" if c.get_change() is None else f"{c.get_change():+.2%}",
+                        "-" if c.p_value is None else f"{c.p_value:.3g}",
+                        c.get_status(),
+                    )
+                    for c in comparisons
+                ),
+                headers=[
+                    "Benchmark",
+                    "Preset",
+                    "Stat",
+                    "Latest",
+                    "Baseline runs",
+                    "Change",
+                    "p-value",
+                    "Status",
+                ],
+                tablefmt="simple",
+            )
+        )
+
+    if check and any(c.is_regression() for c in comparisons):
+        raise Exit(1)
+
+
+@app.command("scaling")
+def scaling_curves(
+    benchmark_id: str,
+    sweep: str,
+    stat: str = Option(..., "--stat", "-s", help="Stat to fit (e.g. a run time)"),
+    axis: str = Option(
+        ..., "--axis", "-a", help="Axis of the sweep whose values are the problem sizes"
+    ),
+    flops: "Optional[str]" = Option(  # noqa: TC201
+        None,
+        "--flops",
+        help="Formula of the number of floating point operations, using the sweep's "
+        "axes as variables (e.g. '2 * size**3'): the achieved GFLOP/s are reported, "
+        "the stat being a time in seconds",
+    ),
+    all_hosts: bool = Option(
+        False, "--all-hosts", help="Use the runs of every host, not just this one"
+    ),
+    json: bool = Option(False, "--json", "-j"),
+) -> None:
+    """Fit how a stat scales with a sweep's problem size."""
+    from json import dumps
+    from tabulate import tabulate
+
+    from openforbc_benchmark.analysis import ScalingCurve
+    from openforbc_benchmark.results import get_host_fingerprint, get_scaling_curves
+
+    with open_store() as store:
+        try:
+            curves = get_scaling_curves(
+                store,
+                benchmark_id,
+                sweep,
+                stat,
+                axis,
+                flops,
+                None if all_hosts else get_host_fingerprint(),
+            )
+        except ValueError as e:
+            echo(f"ERROR: {e}", err=True)
+            raise Exit(1) from None
+
+    if not curves:
+        echo(
+            f'ERROR: No stored "{stat}" results for sweep "{sweep}" of benchmark '
+            f'"{benchmark_id}"',
+            err=True,
+        )
+        raise Exit(1)
+
+    if json:
+        return echo(dumps(curves, default=ScalingCurve.serialize))
+
+    for curve in curves:
+        gflops = curve.get_gflops()
+        echo()
+        echo(
+            ", ".join(f"{name}={value}" for name, value in curve.labels.items())
+            or sweep
+        )
+        echo(
+            tabulate(
+                (
+                    (size, value, "-" if exponent is None else f"{exponent:.3f}")
+                    + (
+                        ("-" if gflops[i] is None else f"{gflops[i]:.6g}",)
+                        if gflops is not None
+                        else ()
+                    )
+                    for i, (size, value, exponent) in enumerate(
+                        zip(curve.sizes, curve.values, curve.get_local_exponents())
+                    )
+                ),
+                headers=[axis, stat, "Local exponent"]
+                + (["GFLOP/s"] if gflops is not None else []),
+                tablefmt="simple",
+            )
+        )
+        echo(
+            f"Fit: {stat} = {curve.coefficient:.6g} * {axis}^{curve.exponent:.3f} "
+            f"(R² = {curve.r_squared:.4f})"
+            if curve.exponent is not None
+            else "Fit: not enough points"
+        )
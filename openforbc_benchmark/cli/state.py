@@ -5,4 +5,6 @@
 
 from os import getcwd
 
-state = {"search_path": getcwd()}
+from openforbc_benchmark.results import get_default_path
+
+state = {"search_path": getcwd(), "results_db": get_default_path()}
@@ -3,55 +3,410 @@
 
 from sys import stdout
 from typer import Context, echo, Exit, Typer, Option  # noqa: TC002
+from typing import Optional  # noqa: TC002
 from typing import TYPE_CHECKING
 
+from openforbc_benchmark.analysis import RepetitionPolicy
 from openforbc_benchmark.benchmark import BenchmarkSuite, get_benchmarks
 from openforbc_benchmark.json import BenchmarkRunDefinition, BenchmarkSuiteDefinition
-from openforbc_benchmark.cli.benchmark import CliBenchmarkRun
+from openforbc_benchmark.cli.benchmark import (
+    CliBenchmarkRun,
+    FORCE_SETUP_OPTION,
+    MAX_RUNS_OPTION,
+    MAX_TIME_OPTION,
+    QUIET_OPTION,
+    RETRIES_OPTION,
+    RETRY_DELAY_OPTION,
+    SAMPLE_INTERVAL_OPTION,
+    STATUS_FAILED,
+    STATUS_OK,
+    STATUS_TIMED_OUT,
+    STORE_OPTION,
+    TIMEOUT_EXIT_CODE,
+    TIMEOUT_OPTION,
+    UNTIL_STABLE_OPTION,
+    VENV_CACHE_OPTION,
+    WORKER_OPTION,
+    get_means,
+    get_stats_table,
+    print_summaries,
+    print_sweep_tables,
+)
 from openforbc_benchmark.cli.state import state
+from openforbc_benchmark.distributed import DEFAULT_PORT, MAX_ATTEMPTS
+from openforbc_benchmark.journal import JournalError, SuiteJournal
+from openforbc_benchmark.scheduler import ResourceScheduler
 
 if TYPE_CHECKING:
-    from typing import Dict, Iterator, List, Optional, Tuple, Union
-    from openforbc_benchmark.benchmark import Benchmark
+    from typing import Any, Dict, Iterator, List, Tuple, Union
+    from openforbc_benchmark.analysis import StatSummary
+    from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun
+    from openforbc_benchmark.distributed import WorkItem, WorkResult
+
+    RunResult = Tuple[
+        int,
+        Dict[str, Dict[str, Union[int, float]]],
+        Dict[str, Dict[str, StatSummary]],
+        List[str],
+        str,
+        Optional[str],
+    ]
 
 
 class CliBenchmarkSuiteRun:
     """A suite run in the CLI interface."""
 
     def __init__(
-        self, suite: BenchmarkSuite, log_to_stderr: bool = not stdout.isatty()
+        self,
+        suite: BenchmarkSuite,
+        log_to_stderr: bool = not stdout.isatty(),
+        policy: "Optional[RepetitionPolicy]" = None,
+        results_db: "Optional[str]" = None,
+        mirror_output: bool = True,
+        sample_interval: "Optional[float]" = 0.5,
+        venv_cache: bool = False,
+        force_setup: bool = False,
+        worker: bool = False,
+        timeout: "Optional[float]" = None,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        keep_going: bool = False,
+        journal: "Optional[SuiteJournal]" = None,
     ) -> None:
-        """Create a CliBenchmarkSuiteRun."""
+        """
+        Create a CliBenchmarkSuiteRun.
+
+        :param policy: how many times each preset is run (once by default).
+        :param results_db: path of the results database each preset's stats are
+            stored into (`None` to not store them).
+        :param mirror_output: `False` to only write the commands' output into the
+            log files.
+        :param sample_interval: the interval between samples of the commands'
+            resource usage, in seconds (`None` or 0 to not sample it).
+        :param venv_cache: share the benchmarks' virtualenvs through the virtualenv
+            cache.
+        :param force_setup: run the setup commands even when they're up to date.
+        :param worker: run the presets in the benchmarks' workers (if they have one).
+        :param timeout: the default time each command is given to finish, in seconds
+            (unless the suite, its runs, their presets or their commands have their
+            own timeout).
+        :param retries: the number of times a failed setup command is retried.
+        :param retry_delay: the time waited before the first retry, in seconds (the
+            delay is doubled after each retry).
+        :param keep_going: go on with the next run when a run fails.
+        :param journal: the journal the results of each completed preset are
+            recorded into: the presets already in it are not run again.
+        """
         self.suite = suite
+        self.policy = policy if policy is not None else RepetitionPolicy()
+        self.results_db = results_db
+        self.mirror_output = mirror_output
+        self.sample_interval = sample_interval
+        self.venv_cache = venv_cache
+        self.force_setup = force_setup
+        self.worker = worker
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.keep_going = keep_going
+        self.journal = journal
+        # The index in the suite of each run whose results are below
+        self.indexes: "List[int]" = []
         self.stats: "List[Dict[str, Dict[str, Union[int, float]]]]" = []
+        self.summaries: "List[Dict[str, Dict[str, StatSummary]]]" = []
+        # The presets with partial stats of each run
+        self.partial: "List[List[str]]" = []
+        # The status of each run (see `CliBenchmarkRun.status`) and its error
+        self.status: "List[str]" = []
+        self.errors: "List[Optional[str]]" = []
+        # The indexes of the runs which timed out and of the ones which failed
+        self.timed_out: "List[int]" = []
+        self.failed: "List[int]" = []
         self._log_to_stderr = log_to_stderr
 
     def print_stats(self, json: bool = False) -> None:
-        """Print benchmark suite's stats."""
+        """
+        Print benchmark suite's stats.
+
+        When the suite keeps going after failures, the JSON output is a list of
+        reports (see `get_reports`).
+        """
         from json import dumps
         from tabulate import tabulate
 
+        from openforbc_benchmark.analysis import StatSummary
+
+        if json and self.keep_going:
+            return echo(dumps(self.get_reports(), default=StatSummary.serialize))
+
+        titles = [
+            f"RUN#{i + 1} - {self.suite.benchmark_runs[i].benchmark.name}"
+            + ("" if self.status[n] == STATUS_OK else f" ({self.status[n]})")
+            for n, i in enumerate(self.indexes)
+        ]
+        if not self.policy.is_single():
+            print_summaries(self.summaries, json, titles)
+            if not json:
+                for n, i in enumerate(self.indexes):
+                    print_sweep_tables(
+                        self.suite.benchmark_runs[i], get_means(self.summaries[n])
+                    )
+            return
+
         if json:
             return echo(dumps(self.stats))
 
-        for i, run_stats in enumerate(self.stats):
-            table: "List[Tuple[str, str, Union[int, float]]]" = []
+        for n, run_stats in enumerate(self.stats):
             echo()
-            echo(f"RUN#{i + 1} - {self.suite.benchmark_runs[i].benchmark.name}")
-            for preset, preset_stats in run_stats.items():
-                table.extend(
-                    (preset, stat, value) for stat, value in preset_stats.items()
+            echo(titles[n])
+            echo(
+                tabulate(
+                    get_stats_table(run_stats, self.partial[n]),
+                    ["Preset", "Stat", "Value"],
                 )
+            )
+            print_sweep_tables(self.suite.benchmark_runs[self.indexes[n]], run_stats)
+
+    def get_reports(self) -> "List[Dict[str, Any]]":
+        """
+        Get the report of each run.
+
+        :returns: a list of objects with the run's number (`run`), benchmark ID
+            (`benchmark`), status (`status`, as `CliBenchmarkRun.status`), error
+            message (`error`), stats (`stats`, their summaries when repeating the
+            presets) and presets with partial stats (`partial`).
+        """
+        single = self.policy.is_single()
+        return [
+            {
+                "run": i + 1,
+                "benchmark": self.suite.benchmark_runs[i].benchmark.get_id(),
+                "status": self.status[n],
+                "error": self.errors[n],
+                "stats": self.stats[n] if single else self.summaries[n],
+                "partial": self.partial[n],
+            }
+            for n, i in enumerate(self.indexes)
+        ]
+
+    def start(self, jobs: int = 1) -> None:
+        """
+        Run this benchmark suite.
+
+        A run which times out doesn't stop the suite, which goes on with the next
+        run (see `timed_out`), as does a run which fails if `keep_going` (see
+        `failed`). The results of the runs done before a failure are kept.
+
+        :param jobs: maximum number of benchmark runs executed concurrently.
+        """
+        if jobs > 1:
+            return self._start_parallel(jobs)
 
-            echo(tabulate(table, ["Preset", "Stat", "Value"]))
-
-    def start(self) -> None:
-        """Run this benchmark suite."""
         for i, bench_run in enumerate(self.suite.benchmark_runs):
             echo(f"Running benchmark run #{i + 1}", err=self._log_to_stderr)
-            run = CliBenchmarkRun(bench_run, self._log_to_stderr)
-            run.start()
-            self.stats.append(run.stats)
+            run = CliBenchmarkRun(
+                bench_run,
+                self._log_to_stderr,
+                journal_run=i,
+                **self._get_run_options(),
+            )
+            exit_code = 0
+            try:
+                run.start()
+            except Exit as e:
+                exit_code = e.exit_code
+
+            self._add_result(
+                i,
+                (
+                    exit_code,
+                    run.stats,
+                    run.summaries,
+                    run.partial,
+                    run.status,
+                    run.error,
+                ),
+            )
+
+    def _start_parallel(self, jobs: int) -> None:
+        """
+        Run this benchmark suite's runs concurrently in a local process pool.
+
+        Runs are scheduled according to their resources (see
+        `BenchmarkRun.get_resources`).
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        runs = self.suite.benchmark_runs
+        results: "List[Optional[RunResult]]" = [None for _ in runs]
+
+        echo(f"Running {len(runs)} benchmark runs ({jobs} jobs)", err=True)
+        try:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for i, result in ResourceScheduler(jobs).run(
+                    executor,
+                    _run_in_worker,
+                    [
+                        ((i, run, self._get_run_options()), run.get_resources())
+                        for i, run in enumerate(runs)
+                    ],
+                ):
+                    results[i] = result
+                    if result[0] == 0:
+                        echo(f"Benchmark run #{i + 1} completed", err=True)
+                    elif result[0] != TIMEOUT_EXIT_CODE:
+                        echo(f"ERROR: Benchmark run #{i + 1} failed", err=True)
+                        if not self.keep_going:
+                            raise Exit(result[0])
+        finally:
+            # The results are kept in the suite's order
+            for i, run_result in enumerate(results):
+                if run_result is not None:
+                    self._add_result(i, run_result, raise_failure=False)
+
+    def _add_result(
+        self, i: int, result: "RunResult", raise_failure: bool = True
+    ) -> None:
+        """
+        Add the result of the suite's `i`-th run.
+
+        A run which timed out is recorded into `timed_out`, while one which failed
+        stops the suite (unless `keep_going`, recording it into `failed`).
+
+        :param raise_failure: `False` if failures are already handled.
+        """
+        exit_code, stats, summaries, partial, status, error = result
+
+        self.indexes.append(i)
+        self.stats.append(stats)
+        self.summaries.append(summaries)
+        self.partial.append(partial)
+        self.status.append(status)
+        self.errors.append(error)
+
+        if exit_code == 0:
+            return
+
+        if exit_code == TIMEOUT_EXIT_CODE:
+            self.timed_out.append(i)
+            echo(
+                f"WARNING: Benchmark run #{i + 1} timed out, going on with the next "
+                "run",
+                err=True,
+            )
+            return
+
+        # An exit code is needed to stop the suite
+        if status == STATUS_OK:
+            self.status[-1] = STATUS_FAILED
+        self.failed.append(i)
+        if not self.keep_going:
+            if raise_failure:
+                raise Exit(exit_code)
+            return
+
+        echo(
+            f"WARNING: Benchmark run #{i + 1} failed, going on with the next run",
+            err=True,
+        )
+
+    def _get_run_options(self) -> "Dict[str, Any]":
+        """Get the options for this suite's `CliBenchmarkRun`s."""
+        return {
+            "policy": self.policy,
+            "results_db": self.results_db,
+            "mirror_output": self.mirror_output,
+            "sample_interval": self.sample_interval,
+            "venv_cache": self.venv_cache,
+            "force_setup": self.force_setup,
+            "worker": self.worker,
+            "timeout": self.timeout,
+            "retries": self.retries,
+            "retry_delay": self.retry_delay,
+            "journal": self.journal,
+        }
+
+
+def _run_in_worker(args: "Tuple[int, BenchmarkRun, Dict[str, Any]]") -> "RunResult":
+    """
+    Run a benchmark run in a worker process.
+
+    :param args: the index of the run in the suite, the run itself and the
+        `CliBenchmarkRun` options.
+    :returns: the run exit code, its stats, its stats summaries, its presets with
+        partial stats, its status and its error (`typer.Exit` can't be pickled).
+    """
+    i, bench_run, options = args
+
+    run = CliBenchmarkRun(
+        bench_run,
+        log_to_stderr=True,
+        log_prefix=f"[#{i + 1}] ",
+        journal_run=i,
+        **options,
+    )
+    exit_code = 0
+    try:
+        run.start()
+    except Exit as e:
+        exit_code = e.exit_code
+
+    return exit_code, run.stats, run.summaries, run.partial, run.status, run.error
+
+
+def run_work_item(
+    item: "WorkItem", search_path: str, options: "Dict[str, Any]"
+) -> "WorkResult":
+    """
+    Run a work item handed out by a suite coordinator.
+
+    :param search_path: the benchmarks search path.
+    :param options: the `CliBenchmarkRun` options (the repetition policy is the
+        item's one).
+    """
+    from openforbc_benchmark.analysis import StatSummary
+    from openforbc_benchmark.benchmark import BenchmarkRun
+    from openforbc_benchmark.distributed import WorkResult
+
+    run: "Optional[CliBenchmarkRun]" = None
+    try:
+        bench_run = BenchmarkRun.from_definition(item.definition, search_path)
+        run = CliBenchmarkRun(
+            bench_run, log_to_stderr=True, policy=item.policy, **options
+        )
+        run.start()
+    except Exit:
+        assert run is not None
+        if run.status == STATUS_OK:
+            run.status = STATUS_FAILED
+    except Exception as e:
+        # Any error is the item's result, the agent keeps running items
+        echo(f"ERROR: {e}", err=True)
+        return WorkResult(
+            item,
+            STATUS_FAILED,
+            str(e),
+            {},
+            {},
+            [],
+            run.log_dir if run is not None else None,
+        )
+
+    return WorkResult(
+        item,
+        run.status,
+        run.error,
+        run.stats,
+        {
+            preset: {
+                stat: StatSummary.serialize(summary)
+                for stat, summary in summaries.items()
+            }
+            for preset, summaries in run.summaries.items()
+        },
+        run.partial,
+        run.log_dir,
+    )
 
 
 def get_suites(search_path: str) -> "Iterator[BenchmarkSuite]":
@@ -215,16 +570,265 @@ def create_suite() -> None:
 
 
 @app.command("run")
-def run_suite(suite_name: str, json: bool = Option(False, "--json", "-j")) -> None:
+def run_suite(
+    suite_name: str,
+    json: bool = Option(False, "--json", "-j"),
+    jobs: int = Option(
+        1, "--jobs", "-J", min=1, help="Number of benchmark runs to run concurrently"
+    ),
+    repeat: int = Option(
+        1, "--repeat", "-r", min=1, help="Number of measured runs of each preset"
+    ),
+    warmup: int = Option(
+        0, "--warmup", "-w", min=0, help="Number of discarded warm-up runs"
+    ),
+    until_stable: "Optional[float]" = UNTIL_STABLE_OPTION,  # noqa: TC201
+    max_runs: "Optional[int]" = MAX_RUNS_OPTION,  # noqa: TC201
+    max_time: "Optional[float]" = MAX_TIME_OPTION,  # noqa: TC201
+    store: bool = STORE_OPTION,
+    quiet: bool = QUIET_OPTION,
+    sample_interval: float = SAMPLE_INTERVAL_OPTION,
+    venv_cache: bool = VENV_CACHE_OPTION,
+    force_setup: bool = FORCE_SETUP_OPTION,
+    worker: bool = WORKER_OPTION,
+    timeout: "Optional[float]" = TIMEOUT_OPTION,  # noqa: TC201
+    retries: int = RETRIES_OPTION,
+    retry_delay: float = RETRY_DELAY_OPTION,
+    keep_going: bool = Option(
+        False,
+        "--keep-going",
+        "-k",
+        help="Go on with the next benchmark run when a run fails (the JSON output "
+        "reports the status of each run)",
+    ),
+    journal_path: "Optional[str]" = Option(  # noqa: TC201
+        None,
+        "--journal",
+        help="Journal the results of each completed preset are recorded into "
+        "(logs/journals/<suite>_<date>.jsonl by default)",
+    ),
+    resume: "Optional[str]" = Option(  # noqa: TC201
+        None,
+        "--resume",
+        help="Resume the suite run recorded into this journal, skipping the "
+        "presets which completed (unless their definitions changed)",
+    ),
+) -> None:
     """Run the specified suite."""
+    from openforbc_benchmark.journal import get_default_path
+
     suite = find_suite(suite_name, state["search_path"])
     if suite is None:
         echo(f'ERROR: Suite "{suite_name}" not found in search path')
         raise Exit(1)
 
-    run = CliBenchmarkSuiteRun(suite)
-    run.start()
+    if journal_path is not None and resume is not None:
+        echo("ERROR: --journal and --resume can't be used together", err=True)
+        raise Exit(1)
+
+    try:
+        journal = (
+            SuiteJournal(resume, suite.name, resume=True)
+            if resume is not None
+            else SuiteJournal(journal_path or get_default_path(suite.name), suite.name)
+        )
+    except JournalError as e:
+        echo(f"ERROR: {e}", err=True)
+        raise Exit(1) from None
+    echo(f'Journal: "{journal.path}" (use --resume to resume the run)', err=True)
+
+    run = CliBenchmarkSuiteRun(
+        suite,
+        policy=RepetitionPolicy(repeat, warmup, until_stable, max_runs, max_time),
+        results_db=state["results_db"] if store else None,
+        mirror_output=not quiet,
+        sample_interval=sample_interval,
+        venv_cache=venv_cache,
+        force_setup=force_setup,
+        worker=worker,
+        timeout=timeout,
+        retries=retries,
+        retry_delay=retry_delay,
+        keep_going=keep_going,
+        journal=journal,
+    )
+    try:
+        run.start(jobs)
+    except Exit:
+        # The stats of the runs done before the failure are still shown
+        if run.stats:
+            run.print_stats(json)
+        raise
+
     run.print_stats(json)
+    if run.failed:
+        raise Exit(1)
+    if run.timed_out:
+        raise Exit(TIMEOUT_EXIT_CODE)
+
+
+@app.command("serve")
+def serve_suite(
+    suite_name: str,
+    json: bool = Option(False, "--json", "-j"),
+    host: str = Option(
+        "127.0.0.1",
+        "--host",
+        help="Address to listen on for agents (0.0.0.0 for every interface)",
+    ),
+    port: int = Option(DEFAULT_PORT, "--port", "-p", min=0, max=65535),
+    repeat: int = Option(
+        1, "--repeat", "-r", min=1, help="Number of measured runs of each preset"
+    ),
+    warmup: int = Option(
+        0, "--warmup", "-w", min=0, help="Number of discarded warm-up runs"
+    ),
+    until_stable: "Optional[float]" = UNTIL_STABLE_OPTION,  # noqa: TC201
+    max_runs: "Optional[int]" = MAX_RUNS_OPTION,  # noqa: TC201
+    max_time: "Optional[float]" = MAX_TIME_OPTION,  # noqa: TC201
+    timeout: "Optional[float]" = TIMEOUT_OPTION,  # noqa: TC201
+    max_attempts: int = Option(
+        MAX_ATTEMPTS,
+        "--max-attempts",
+        min=1,
+        help="Number of times a preset is handed out, when agents leave while "
+        "running it",
+    ),
+) -> None:
+    """Hand out the suite's presets to agents (see `suite agent`)."""
+    from json import dumps
+    from os.path import join
+    from tabulate import tabulate
+
+    from openforbc_benchmark.distributed import Coordinator, WorkResult
+    from openforbc_benchmark.utils import get_new_log_path
+
+    suite = find_suite(suite_name, state["search_path"])
+    if suite is None:
+        echo(f'ERROR: Suite "{suite_name}" not found in search path')
+        raise Exit(1)
+
+    for bench_run in suite.benchmark_runs:
+        if bench_run.timeout is None:
+            bench_run.timeout = timeout
+
+    coordinator = Coordinator(
+        suite,
+        get_new_log_path("distributed", suite.name),
+        RepetitionPolicy(repeat, warmup, until_stable, max_runs, max_time),
+        (host, port),
+        log=lambda message: echo(message, err=True),
+        max_attempts=max_attempts,
+    )
+    try:
+        coordinator.start()
+    except OSError as e:
+        echo(f"ERROR: Can't listen on {host}:{port}: {e}", err=True)
+        raise Exit(1) from None
+
+    echo(
+        f"Listening on {coordinator.address[0]}:{coordinator.address[1]}, "
+        f"{len(coordinator.items)} presets to run (logs in "
+        f'"{coordinator.result_dir}")',
+        err=True,
+    )
+    try:
+        results = coordinator.wait()
+    finally:
+        coordinator.stop()
+
+    with open(join(coordinator.result_dir, "results.json"), "w") as file:
+        file.write(dumps(results, default=WorkResult.serialize))
+
+    if json:
+        echo(dumps(results, default=WorkResult.serialize))
+    else:
+        echo(
+            tabulate(
+                [
+                    (
+                        f"RUN#{result.item.run + 1}",
+                        result.item.definition.benchmark_folder,
+                        preset,
+                        result.agent,
+                        stat,
+                        value,
+                    )
+                    for result in results
+                    for preset, stats in result.stats.items()
+                    for stat, value in stats.items()
+                ],
+                ["Run", "Benchmark", "Preset", "Agent", "Stat", "Value"],
+            )
+        )
+
+    for result in results:
+        if result.status not in (STATUS_OK, STATUS_TIMED_OUT):
+            echo(
+                f"WARNING: Run #{result.item.run + 1} preset "
+                f'"{result.item.get_preset()}" {result.status}: {result.error}',
+                err=True,
+            )
+    if any(result.status == STATUS_FAILED for result in results):
+        raise Exit(1)
+    if any(result.status == STATUS_TIMED_OUT for result in results):
+        raise Exit(TIMEOUT_EXIT_CODE)
+
+
+@app.command("agent")
+def run_agent(
+    address: str,
+    name: "Optional[str]" = Option(  # noqa: TC201
+        None, "--name", help="Name of the agent (hostname:PID by default)"
+    ),
+    connect_timeout: float = Option(
+        60,
+        "--connect-timeout",
+        min=0,
+        help="Time the coordinator is given to start listening, in seconds",
+    ),
+    store: bool = STORE_OPTION,
+    quiet: bool = QUIET_OPTION,
+    sample_interval: float = SAMPLE_INTERVAL_OPTION,
+    venv_cache: bool = VENV_CACHE_OPTION,
+    force_setup: bool = FORCE_SETUP_OPTION,
+    worker: bool = WORKER_OPTION,
+    retries: int = RETRIES_OPTION,
+    retry_delay: float = RETRY_DELAY_OPTION,
+) -> None:
+    """Run the presets handed out by a suite coordinator (HOST[:PORT])."""
+    from openforbc_benchmark.distributed import Agent, DistributedError, parse_address
+
+    try:
+        coordinator = parse_address(address)
+    except ValueError:
+        echo(f'ERROR: Invalid coordinator address "{address}"', err=True)
+        raise Exit(1) from None
+
+    options = {
+        "results_db": state["results_db"] if store else None,
+        "mirror_output": not quiet,
+        "sample_interval": sample_interval,
+        "venv_cache": venv_cache,
+        "force_setup": force_setup,
+        "worker": worker,
+        "retries": retries,
+        "retry_delay": retry_delay,
+    }
+    search_path = state["search_path"]
+    agent = Agent(
+        coordinator,
+        lambda item: run_work_item(item, search_path, options),
+        name,
+        log=lambda message: echo(message, err=True),
+    )
+    try:
+        done = agent.run(connect_timeout)
+    except DistributedError as e:
+        echo(f"ERROR: {e}", err=True)
+        raise Exit(1) from None
+
+    echo(f"Done, {done} presets run", err=True)
 
 
 @app.callback(invoke_without_command=True)
@@ -0,0 +1,544 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`distributed` module runs suites across hosts, with a coordinator and agents."""
+
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.analysis import RepetitionPolicy
+from openforbc_benchmark.json import BenchmarkRunDefinition
+
+if TYPE_CHECKING:
+    from io import BufferedIOBase
+    from threading import Thread
+    from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+    from openforbc_benchmark.benchmark import BenchmarkSuite
+
+DEFAULT_PORT = 7733
+
+# The time agents wait before asking for work again when there's none available
+WAIT_DELAY = 1.0
+
+# The default number of times an item is handed out, when agents leave while
+# running it
+MAX_ATTEMPTS = 3
+
+# The status of the items no agent could run (see `CliBenchmarkRun.status`)
+STATUS_FAILED = "failed"
+
+
+class CoordinatorServer(ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class DistributedError(Exception):
+    """The coordinator or an agent broke the protocol or disconnected."""
+
+    pass
+
+
+class WorkItem:
+    """A preset of a suite's run, handed out to an agent."""
+
+    def __init__(
+        self,
+        id: int,
+        run: int,
+        definition: BenchmarkRunDefinition,
+        policy: RepetitionPolicy,
+    ) -> None:
+        """
+        Create a WorkItem.
+
+        :param run: the index of the run in the suite.
+        :param definition: the run's definition, with the item's preset only.
+        :param policy: how many times the preset is run.
+        """
+        self.id = id
+        self.run = run
+        self.definition = definition
+        self.policy = policy
+
+    def get_preset(self) -> str:
+        """Get the name of the item's preset."""
+        return self.definition.presets[0]
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a work item into a JSON object."""
+        return {
+            "id": obj.id,
+            "run": obj.run,
+            "definition": obj.definition,
+            "policy": obj.policy.__dict__,
+        }
+
+    @classmethod
+    def deserialize(self_class, json: "Any") -> "WorkItem":
+        """Deserialize a work item from a JSON object."""
+        return self_class(
+            int(json["id"]),
+            int(json["run"]),
+            BenchmarkRunDefinition.deserialize(json["definition"]),
+            RepetitionPolicy(**json["policy"]),
+        )
+
+
+class WorkResult:
+    """The results of a work item."""
+
+    def __init__(
+        self,
+        item: WorkItem,
+        status: str,
+        error: "Optional[str]",
+        stats: "Dict[str, Dict[str, Union[int, float]]]",
+        summaries: "Dict[str, Dict[str, Any]]",
+        partial: "List[str]",
+        log_dir: "Optional[str]" = None,
+        agent: "Optional[str]" = None,
+    ) -> None:
+        """
+        Create a WorkResult.
+
+        :param status: the status of the item's run (see `CliBenchmarkRun.status`).
+        :param error: the error which stopped the run.
+        :param stats: the stats of the item's preset.
+        :param summaries: the (serialized) stats summaries of the item's preset,
+            when repeating it.
+        :param partial: the presets with partial stats.
+        :param log_dir: the directory containing the run's logs.
+        :param agent: the name of the agent which ran the item.
+        """
+        self.item = item
+        self.status = status
+        self.error = error
+        self.stats = stats
+        self.summaries = summaries
+        self.partial = partial
+        self.log_dir = log_dir
+        self.agent = agent
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a result into a JSON object."""
+        return {
+            "run": obj.item.run + 1,
+            "benchmark": obj.item.definition.benchmark_folder,
+            "preset": obj.item.get_preset(),
+            "agent": obj.agent,
+            "status": obj.status,
+            "error": obj.error,
+            "stats": obj.stats,
+            "summaries": obj.summaries,
+            "partial": obj.partial,
+            "log_dir": obj.log_dir,
+        }
+
+
+class Coordinator:
+    """
+    Hands out the presets of a suite's runs to agents over TCP, collecting results.
+
+    Agents connect and exchange newline-delimited JSON messages: after a
+    `{"type": "hello", "agent": "<name>"}` message they send
+    `{"type": "request"}` messages, answered with a work item
+    (`{"type": "work", "item": {...}}`, see `WorkItem`), with `{"type": "wait"}`
+    while the remaining items are being run by other agents or with
+    `{"type": "done"}` once every item has a result. The agent replies to a work
+    item with its results (`{"type": "result", ...}`) and the logs of its run (as
+    base64 strings by file name), which are saved into the result directory.
+
+    The items of an agent which disconnects without sending their results are
+    handed out again, up to `max_attempts` times in all: then they fail.
+    """
+
+    def __init__(
+        self,
+        suite: "BenchmarkSuite",
+        result_dir: str,
+        policy: "Optional[RepetitionPolicy]" = None,
+        address: "Tuple[str, int]" = ("127.0.0.1", DEFAULT_PORT),
+        log: "Optional[Callable[[str], Any]]" = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        """
+        Create a Coordinator.
+
+        :param result_dir: the directory the logs of each item are saved into.
+        :param policy: how many times each preset is run (once by default).
+        :param address: the address the coordinator listens on (port 0 for any
+            free port).
+        :param log: called with the coordinator's log messages.
+        :param max_attempts: the number of times an item is handed out.
+        """
+        from collections import deque
+        from threading import Condition
+
+        policy = policy if policy is not None else RepetitionPolicy()
+        self.items: "List[WorkItem]" = []
+        for i, run in enumerate(suite.benchmark_runs):
+            for preset in run.presets:
+                definition = run.into_definition()
+                definition.presets = [preset.name]
+                self.items.append(WorkItem(len(self.items), i, definition, policy))
+
+        self.result_dir = result_dir
+        self.address = address
+        self.results: "Dict[int, WorkResult]" = {}
+        self.max_attempts = max_attempts
+        self._log = log
+        self._pending = deque(self.items)
+        self._attempts = dict.fromkeys((item.id for item in self.items), 0)
+        self._agents = 0
+        self._condition = Condition()
+        self._server: "Optional[CoordinatorServer]" = None
+        self._thread: "Optional[Thread]" = None
+
+    def start(self) -> None:
+        """Start listening for agents (`address` is updated with the actual one)."""
+        from threading import Thread
+
+        coordinator = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self) -> None:
+                coordinator._serve(self.rfile, self.wfile, self.client_address)
+
+        self._server = CoordinatorServer(self.address, Handler)
+        host, port = self._server.server_address[:2]
+        self.address = (str(host), port)
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: "Optional[float]" = None) -> "List[WorkResult]":
+        """
+        Wait for the results of every item.
+
+        :param timeout: the maximum time to wait, in seconds.
+        :returns: the results, in the items' order.
+        :raises DistributedError: if the results are not ready within the timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: len(self.results) == len(self.items), timeout
+            ):
+                raise DistributedError(
+                    f"Only {len(self.results)} of {len(self.items)} items are done"
+                )
+
+            return [self.results[item.id] for item in self.items]
+
+    def stop(self, grace_period: float = 10.0) -> None:
+        """
+        Stop the coordinator, waiting for the connected agents to leave.
+
+        :param grace_period: the time the agents are given to leave, in seconds.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._agents == 0, grace_period)
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _serve(
+        self,
+        rfile: "BufferedIOBase",
+        wfile: "BufferedIOBase",
+        client: "Tuple[str, int]",
+    ) -> None:
+        """Serve an agent until it disconnects."""
+        hello = receive(rfile)
+        if hello is None or hello.get("type") != "hello":
+            return
+
+        agent = f"{hello.get('agent')} ({client[0]})"
+        self.log(f"Agent {agent} connected")
+        item: "Optional[WorkItem]" = None
+        with self._condition:
+            self._agents += 1
+
+        try:
+            while True:
+                message = receive(rfile)
+                if message is None:
+                    break
+
+                if message.get("type") == "request" and item is None:
+                    item, reply = self._next_item()
+                    if item is not None:
+                        self.log(
+                            f"Agent {agent} is running run #{item.run + 1} "
+                            f'"{item.definition.benchmark_folder}" preset '
+                            f'"{item.get_preset()}"'
+                        )
+                    send(wfile, reply)
+                elif (
+                    message.get("type") == "result"
+                    and item is not None
+                    and message.get("id") == item.id
+                ):
+                    self._add_result(self._save_result(item, agent, message))
+                    item = None
+                else:
+                    raise DistributedError(f"Unexpected message: {message}")
+        except (OSError, ValueError, DistributedError) as e:
+            self.log(f"WARNING: Agent {agent}: {e}")
+        finally:
+            self.log(f"Agent {agent} disconnected")
+            with self._condition:
+                if item is not None and self._attempts[item.id] < self.max_attempts:
+                    self.log(
+                        f"WARNING: Agent {agent} left while running run "
+                        f"#{item.run + 1}, handing it out again"
+                    )
+                    self._pending.appendleft(item)
+                elif item is not None:
+                    error = (
+                        f"Handed out {self._attempts[item.id]} times, every agent "
+                        "left while running it"
+                    )
+                    self.log(f"ERROR: Run #{item.run + 1}: {error}")
+                    self._add_result(WorkResult(item, STATUS_FAILED, error, {}, {}, []))
+                self._agents -= 1
+                self._condition.notify_all()
+
+    def _next_item(self) -> "Tuple[Optional[WorkItem], Dict[str, Any]]":
+        """Get the next item to be handed out, along with the reply to the agent."""
+        with self._condition:
+            if self._pending:
+                item = self._pending.popleft()
+                self._attempts[item.id] += 1
+                return item, {"type": "work", "item": item}
+            if len(self.results) == len(self.items):
+                return None, {"type": "done"}
+
+            return None, {"type": "wait", "delay": WAIT_DELAY}
+
+    def _save_result(
+        self, item: WorkItem, agent: str, message: "Dict[str, Any]"
+    ) -> WorkResult:
+        """
+        Save the logs of an item's run, getting its results.
+
+        :raises DistributedError: if the result message is not valid.
+        """
+        from base64 import b64decode
+        from os import makedirs
+        from os.path import basename, join
+
+        try:
+            status = message["status"]
+            if not isinstance(status, str):
+                raise TypeError(f"Invalid status: {status}")
+
+            logs = {
+                basename(name): b64decode(content)
+                for name, content in dict(message.get("logs", {})).items()
+            }
+            stats = dict(message.get("stats", {}))
+            summaries = dict(message.get("summaries", {}))
+            partial = list(message.get("partial", []))
+        except (KeyError, TypeError, ValueError) as e:
+            raise DistributedError(f"Invalid result ({e!r}): {message}") from None
+
+        log_dir = join(
+            self.result_dir,
+            f"run{item.run + 1}_{item.definition.benchmark_folder}_"
+            f"{item.get_preset()}",
+        )
+        makedirs(log_dir, exist_ok=True)
+        for name, content in logs.items():
+            with open(join(log_dir, name), "wb") as file:
+                file.write(content)
+
+        return WorkResult(
+            item,
+            status,
+            message.get("error"),
+            stats,
+            summaries,
+            partial,
+            log_dir,
+            agent,
+        )
+
+    def _add_result(self, result: WorkResult) -> None:
+        """Add the result of an item, waking up the waiters if it's the last one."""
+        self.log(
+            f'Run #{result.item.run + 1} preset "{result.item.get_preset()}" is '
+            f"done ({result.status}), {len(self.results) + 1}/{len(self.items)}"
+        )
+        with self._condition:
+            self.results[result.item.id] = result
+            self._condition.notify_all()
+
+    def log(self, message: str) -> None:
+        """Log a message (if there's a logger)."""
+        if self._log is not None:
+            self._log(message)
+
+
+class Agent:
+    """
+    Runs the work items handed out by a coordinator until there are none left.
+
+    See `Coordinator` for the protocol.
+    """
+
+    def __init__(
+        self,
+        address: "Tuple[str, int]",
+        execute: "Callable[[WorkItem], WorkResult]",
+        name: "Optional[str]" = None,
+        log: "Optional[Callable[[str], Any]]" = None,
+    ) -> None:
+        """
+        Create an Agent.
+
+        :param address: the coordinator's address.
+        :param execute: runs a work item, returning its result (whose `log_dir`
+            has the logs sent to the coordinator).
+        :param name: the agent's name (defaults to the hostname and the PID).
+        :param log: called with the agent's log messages.
+        """
+        from os import getpid
+        from socket import gethostname
+
+        self.address = address
+        self.execute = execute
+        self.name = name if name is not None else f"{gethostname()}:{getpid()}"
+        self._log = log
+
+    def run(self, connect_timeout: float = 60.0) -> int:
+        """
+        Connect to the coordinator and run work items until they're all done.
+
+        :param connect_timeout: the time the coordinator is given to start
+            listening, in seconds.
+        :returns: the number of items the agent ran.
+        :raises DistributedError: if the coordinator can't be reached or it
+            disconnected.
+        """
+        from time import sleep
+
+        connection = self._connect(connect_timeout)
+        done = 0
+        with connection, connection.makefile("rwb") as file:
+            send(file, {"type": "hello", "agent": self.name})
+            while True:
+                send(file, {"type": "request"})
+                reply = receive(file)
+                if reply is None:
+                    raise DistributedError("The coordinator closed the connection")
+
+                if reply.get("type") == "done":
+                    return done
+                if reply.get("type") == "wait":
+                    sleep(float(reply.get("delay", WAIT_DELAY)))
+                    continue
+                if reply.get("type") != "work":
+                    raise DistributedError(f"Unexpected message: {reply}")
+
+                item = WorkItem.deserialize(reply["item"])
+                self.log(
+                    f"Running run #{item.run + 1} "
+                    f'"{item.definition.benchmark_folder}" preset '
+                    f'"{item.get_preset()}"'
+                )
+                send(file, self._get_result_message(self.execute(item)))
+                done += 1
+
+    def _connect(self, timeout: float) -> "Any":
+        """Connect to the coordinator, retrying until it listens."""
+        from socket import create_connection
+        from time import monotonic, sleep
+
+        deadline = monotonic() + timeout
+        while True:
+            try:
+                return create_connection(self.address)
+            except OSError as e:
+                if monotonic() >= deadline:
+                    raise DistributedError(
+                        f"Can't connect to {self.address[0]}:{self.address[1]}: {e}"
+                    ) from None
+                sleep(0.5)
+
+    def _get_result_message(self, result: WorkResult) -> "Dict[str, Any]":
+        """Get the message with an item's results and the logs of its run."""
+        from base64 import b64encode
+        from os import listdir
+        from os.path import isfile, join
+
+        logs: "Dict[str, str]" = {}
+        if result.log_dir is not None:
+            for name in sorted(listdir(result.log_dir)):
+                path = join(result.log_dir, name)
+                if isfile(path):
+                    with open(path, "rb") as file:
+                        logs[name] = b64encode(file.read()).decode()
+
+        return {
+            "type": "result",
+            "id": result.item.id,
+            "status": result.status,
+            "error": result.error,
+            "stats": result.stats,
+            "summaries": result.summaries,
+            "partial": result.partial,
+            "logs": logs,
+        }
+
+    def log(self, message: str) -> None:
+        """Log a message (if there's a logger)."""
+        if self._log is not None:
+            self._log(message)
+
+
+def send(file: "BufferedIOBase", message: "Dict[str, Any]") -> None:
+    """Send a message (a JSON object, which may contain serializable objects)."""
+    from json import dumps
+
+    file.write(f"{dumps(message, default=lambda obj: obj.serialize(obj))}\n".encode())
+    file.flush()
+
+
+def receive(file: "BufferedIOBase") -> "Optional[Dict[str, Any]]":
+    """
+    Receive a message (a JSON object).
+
+    :returns: `None` if the connection was closed.
+    :raises DistributedError: if the message is not a JSON object.
+    """
+    from json import loads
+
+    line = file.readline()
+    if not line:
+        return None
+
+    try:
+        message = loads(line)
+    except ValueError:
+        message = None
+    if not isinstance(message, dict):
+        raise DistributedError(f"Invalid message: {line.decode().strip()}")
+
+    return message
+
+
+def parse_address(address: str) -> "Tuple[str, int]":
+    """
+    Parse a `host[:port]` address (the port defaults to `DEFAULT_PORT`).
+
+    :raises ValueError: if the port is not valid.
+    """
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        return address, DEFAULT_PORT
+
+    return host.strip("[]"), int(port)
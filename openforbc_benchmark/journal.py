@@ -0,0 +1,223 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`journal` module checkpoints the results of suite runs, allowing to resume them."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional, Union
+    from openforbc_benchmark.analysis import RepetitionPolicy
+    from openforbc_benchmark.benchmark import BenchmarkRun, Preset
+
+JOURNAL_VERSION = 1
+
+
+class JournalError(Exception):
+    pass
+
+
+class JournalEntry:
+    """The results of a suite run's preset recorded into the journal."""
+
+    def __init__(
+        self,
+        run: int,
+        preset: str,
+        hash: str,
+        log_dir: str,
+        stats: "Dict[str, Union[int, float]]",
+        samples: "Dict[str, List[Union[int, float]]]",
+    ) -> None:
+        """
+        Create a JournalEntry.
+
+        :param run: the index of the run in the suite.
+        :param hash: the hash of the preset's definitions (see `get_preset_hash`).
+        :param log_dir: the log directory of the run which produced the results.
+        :param stats: the preset's stats (the means of the samples when repeating).
+        :param samples: each stat's samples.
+        """
+        self.run = run
+        self.preset = preset
+        self.hash = hash
+        self.log_dir = log_dir
+        self.stats = stats
+        self.samples = samples
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize an entry into a JSON object."""
+        return obj.__dict__
+
+    @classmethod
+    def deserialize(self_class, json: "Any") -> "JournalEntry":
+        """
+        Deserialize an entry from a JSON object.
+
+        :raises JournalError: if the object is not a valid entry.
+        """
+        try:
+            return self_class(
+                int(json["run"]),
+                str(json["preset"]),
+                str(json["hash"]),
+                str(json["log_dir"]),
+                dict(json["stats"]),
+                dict(json["samples"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            raise JournalError(f"Invalid journal entry: {json}") from None
+
+
+class SuiteJournal:
+    """
+    The journal of a suite run, which records the results of each completed preset.
+
+    The journal is a newline-delimited JSON file: a header with the suite's name is
+    followed by an entry for each (run, preset) which completed (see
+    `JournalEntry`). Entries are appended as soon as a preset completes, possibly
+    by concurrent processes, so the journal survives the suite run dying midway.
+    """
+
+    def __init__(self, path: str, suite: str, resume: bool = False) -> None:
+        """
+        Create a new journal or load an existing one.
+
+        :param path: the journal file path.
+        :param suite: the name of the suite.
+        :param resume: `True` to load the journal (which must exist), appending
+            to it.
+        :raises JournalError: if the journal can't be created or loaded, or if it
+            belongs to another suite.
+        """
+        from json import dumps
+        from os import makedirs
+        from os.path import dirname
+
+        self.path = path
+        self.suite = suite
+        self._entries: "Dict[Any, JournalEntry]" = {}
+
+        if resume:
+            self._load()
+            return
+
+        try:
+            makedirs(dirname(path) or ".", exist_ok=True)
+            with open(path, "x") as file:
+                file.write(dumps({"version": JOURNAL_VERSION, "suite": suite}) + "\n")
+        except OSError as e:
+            raise JournalError(f'Failed to create journal "{path}": {e}') from None
+
+    def get(self, run: int, preset: str) -> "Optional[JournalEntry]":
+        """Get the entry of a run's preset (`None` if it's not in the journal)."""
+        return self._entries.get((run, preset))
+
+    def add(self, entry: JournalEntry) -> None:
+        """Append an entry to the journal."""
+        from json import dumps
+        from os import fsync
+
+        # Entries are written at once (unbuffered), concurrent writers don't mix
+        # their lines
+        with open(self.path, "ab", buffering=0) as file:
+            file.write((dumps(entry, default=entry.serialize) + "\n").encode())
+            fsync(file.fileno())
+
+        self._entries[entry.run, entry.preset] = entry
+
+    def _load(self) -> None:
+        """Load the journal's entries (the latest ones win)."""
+        from json import loads
+
+        try:
+            with open(self.path, "r") as file:
+                lines = file.read().splitlines()
+        except OSError as e:
+            raise JournalError(f'Failed to read journal "{self.path}": {e}') from None
+
+        try:
+            header = loads(lines[0]) if lines else None
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get("version") != JOURNAL_VERSION:
+            raise JournalError(f'"{self.path}" is not a suite journal')
+        if header.get("suite") != self.suite:
+            raise JournalError(
+                f'Journal "{self.path}" belongs to suite "{header.get("suite")}"'
+            )
+
+        for n, line in enumerate(lines[1:]):
+            try:
+                entry = JournalEntry.deserialize(loads(line))
+            except (JournalError, ValueError):
+                # The last line may have been cut short by the suite dying
+                if n == len(lines) - 2:
+                    break
+                raise JournalError(
+                    f'Invalid entry at line {n + 2} of journal "{self.path}"'
+                ) from None
+
+            self._entries[entry.run, entry.preset] = entry
+
+
+def get_default_path(suite: str) -> str:
+    """
+    Get the default journal path of a suite run.
+
+    Journals are created into the `logs/journals` directory of the current
+    directory, named after the suite and the current date and time.
+    """
+    from openforbc_benchmark.utils import get_new_log_path
+
+    return get_new_log_path("journals", suite, ".jsonl")
+
+
+def get_preset_hash(
+    benchmark_run: "BenchmarkRun", preset: "Preset", policy: "RepetitionPolicy"
+) -> str:
+    """
+    Get the hash of the definitions a suite run's preset results depend on.
+
+    The hash covers the benchmark's and the preset's definitions, the files in the
+    benchmark's run and worker commands (e.g. its scripts, including the ones in
+    the preset's arguments), the preset's placement and the repetition policy:
+    results are only resumed if none of them changed.
+    """
+    from hashlib import sha256
+    from json import dumps
+    from os.path import isfile, join
+
+    from openforbc_benchmark.json import Serializable
+    from openforbc_benchmark.utils import hash_file
+
+    benchmark = benchmark_run.benchmark
+    # The preset's arguments are added to the last run command
+    commands = benchmark.run_commands[:-1] + [
+        benchmark.run_commands[-1].extend(preset.args)
+    ]
+    if benchmark.worker_command is not None:
+        commands.append(benchmark.worker_command)
+
+    files: "Dict[str, str]" = {}
+    for command in commands:
+        cwd = join(benchmark.dir, command.workdir or "")
+        for arg in command.command:
+            path = join(cwd, arg)
+            if isfile(path):
+                files[arg] = hash_file(path)
+
+    return sha256(
+        dumps(
+            {
+                "benchmark": benchmark.into_definition(),
+                "preset": preset.into_definition(),
+                "files": files,
+                "placement": benchmark_run.get_placement(preset),
+                "policy": policy.__dict__,
+            },
+            default=Serializable.serialize,
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
@@ -7,16 +7,77 @@ from typing import TYPE_CHECKING, Generic, TypeVar
 
 if TYPE_CHECKING:
     from typing import Any, Dict, List, Optional, Union
+    from jsonschema.protocols import Validator
+    from openforbc_benchmark.analysis import Distribution
 
 from abc import ABC as AbstractClass, abstractmethod
+from functools import lru_cache
 from os.path import dirname, join
-from jsonschema import validate
 from json import load
 from openforbc_benchmark.utils import Runnable
 
 T = TypeVar("T", bound="Serializable")
 
 
+@lru_cache(maxsize=None)
+def get_schemas() -> "Dict[str, Any]":
+    """
+    Get the jsonschemas in the `jsonschema` folder, by file name.
+
+    The schemas are loaded only once per process.
+    """
+    from os import listdir
+
+    schemas_dir = join(dirname(__file__), "jsonschema")
+    schemas = {}
+    for schema_name in listdir(schemas_dir):
+        if schema_name.endswith(".schema.json"):
+            with open(join(schemas_dir, schema_name)) as file:
+                schemas[schema_name] = load(file)
+
+    return schemas
+
+
+@lru_cache(maxsize=None)
+def get_validator(schema_name: str) -> "Validator":
+    """
+    Get the validator for one of the jsonschemas in the `jsonschema` folder.
+
+    The schema is checked, and its validator built, only once per process.
+    References to the other schemas in the folder (by `$id`) are resolved locally.
+
+    :param schema_name: schema file name (e.g. `benchmark.schema.json`).
+    """
+    from jsonschema import FormatChecker, RefResolver
+    from jsonschema.validators import validator_for
+
+    schemas = get_schemas()
+    schema = schemas[schema_name]
+    store = {other["$id"]: other for other in schemas.values()}
+
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(
+        schema,
+        resolver=RefResolver.from_schema(schema, store=store),
+        format_checker=FormatChecker(),
+    )
+
+
+def validate(json: "Any", schema_name: str) -> None:
+    """
+    Validate a json object against one of the jsonschemas in the `jsonschema` folder.
+
+    :raises jsonschema.ValidationError: if the object is not valid (the error is
+        the same `jsonschema.validate` would raise).
+    """
+    from jsonschema.exceptions import best_match
+
+    error = best_match(get_validator(schema_name).iter_errors(json))
+    if error is not None:
+        raise error
+
+
 class Serializable(AbstractClass, Generic[T]):
     """
     A Serializable instance can be serialized/deserialized into/from a JSON document.
@@ -78,8 +139,14 @@ class BenchmarkDefinition(Serializable["BenchmarkDefinition"]):
         test_commands: "List[CommandInfo]",
         stats: "Union[CommandInfo, Dict[str, StatMatchInfo]]",
         virtualenv: bool,
+        worker_command: "Optional[CommandInfo]" = None,
     ) -> None:
-        """Create a BenchmarkDefinition object."""
+        """
+        Create a BenchmarkDefinition object.
+
+        :param worker_command: the command starting the benchmark's worker, which
+            runs the presets in a single long-lived process.
+        """
         self.name = name
         self.description = description
         self.default_preset = default_preset
@@ -90,11 +157,17 @@ class BenchmarkDefinition(Serializable["BenchmarkDefinition"]):
         self.test_commands = test_commands
         self.stats = stats
         self.virtualenv = virtualenv
+        self.worker_command = worker_command
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "BenchmarkDefinition":
         self_class.validate(json)
 
+        return self_class.deserialize_valid(json)
+
+    @classmethod
+    def deserialize_valid(self_class, json: "Any") -> "BenchmarkDefinition":
+        """Deserialize a definition from a JSON object which was already validated."""
         return self_class(
             json["name"],
             json["description"],
@@ -120,16 +193,16 @@ class BenchmarkDefinition(Serializable["BenchmarkDefinition"]):
             },
             # virtualenv
             json.get("virtualenv", False),
+            # worker_command
+            CommandInfo.deserialize(json["worker_command"])
+            if "worker_command" in json
+            else None,
         )
 
     @classmethod
     def validate(self_class, json: "Any") -> None:
         """Validate a benchmark definition json object."""
-        with open(
-            join(dirname(__file__), "jsonschema", "benchmark.schema.json")
-        ) as file:
-            schema = load(file)
-            validate(json, schema)
+        validate(json, "benchmark.schema.json")
 
 
 class PresetDefinition(Serializable["PresetDefinition"]):
@@ -149,8 +222,19 @@ class PresetDefinition(Serializable["PresetDefinition"]):
         init_commands: "Optional[List[CommandInfo]]" = None,
         env: "Dict[str, str]" = {},
         post_commands: "Optional[List[CommandInfo]]" = None,
+        resources: "Optional[ResourcesDefinition]" = None,
+        placement: "Optional[PlacementDefinition]" = None,
+        timeout: "Optional[float]" = None,
+        matrix: "Optional[Dict[str, List[Union[str, int, float]]]]" = None,
     ) -> None:
-        """Create a benchmark Preset object."""
+        """
+        Create a benchmark Preset object.
+
+        :param timeout: the time each of the preset's commands is given to finish,
+            in seconds (`None` for the run's timeout).
+        :param matrix: the values of each axis of a parameter sweep (`None` if the
+            preset is not a sweep, see `Preset.expand`).
+        """
         from shlex import split
 
         self.args = None
@@ -163,6 +247,10 @@ class PresetDefinition(Serializable["PresetDefinition"]):
 
         self.init_commands = init_commands
         self.post_commands = post_commands
+        self.resources = resources
+        self.placement = placement
+        self.timeout = timeout
+        self.matrix = matrix
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "PresetDefinition":
@@ -184,17 +272,24 @@ class PresetDefinition(Serializable["PresetDefinition"]):
         )
 
         return self_class(
-            json.get("args", None), init_commands, json.get("env", {}), post_commands
+            json.get("args", None),
+            init_commands,
+            json.get("env", {}),
+            post_commands,
+            ResourcesDefinition.deserialize(json["resources"])
+            if "resources" in json
+            else None,
+            PlacementDefinition.deserialize(json["placement"])
+            if "placement" in json
+            else None,
+            json.get("timeout"),
+            json.get("matrix"),
         )
 
     @classmethod
     def validate(self_class, json: "Any") -> None:
         """Validate a preset definition json object."""
-        with open(
-            join(dirname(__file__), "jsonschema", "benchmark_preset.schema.json")
-        ) as file:
-            schema = load(file)
-            validate(json, schema)
+        validate(json, "benchmark_preset.schema.json")
 
 
 class BenchmarkSuiteDefinition(Serializable["BenchmarkSuiteDefinition"]):
@@ -213,10 +308,25 @@ class BenchmarkSuiteDefinition(Serializable["BenchmarkSuiteDefinition"]):
         name: str,
         description: str,
         benchmark_runs: "List[BenchmarkRunDefinition]",
+        timeout: "Optional[float]" = None,
     ) -> None:
+        """
+        Create a BenchmarkSuiteDefinition object.
+
+        :param timeout: the time each command of the suite's runs is given to
+            finish, in seconds (unless the run, its preset or the command itself
+            specify another timeout).
+        """
         self.name = name
         self.description = description
         self.benchmark_runs = benchmark_runs
+        self.timeout = timeout
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        return {
+            k: v for k, v in obj.__dict__.items() if v is not None or k != "timeout"
+        }
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "BenchmarkSuiteDefinition":
@@ -229,16 +339,14 @@ class BenchmarkSuiteDefinition(Serializable["BenchmarkSuiteDefinition"]):
             BenchmarkRunDefinition.deserialize(run) for run in json["benchmark_runs"]
         ]
 
-        return self_class(json["name"], json["description"], benchmark_runs)
+        return self_class(
+            json["name"], json["description"], benchmark_runs, json.get("timeout")
+        )
 
     @classmethod
     def validate(self_class, json: "Any") -> None:
         """Validate a benchmark suite definition json object."""
-        with open(
-            join(dirname(__file__), "jsonschema", "benchmark_suite.schema.json")
-        ) as file:
-            schema = load(file)
-            validate(json, schema)
+        validate(json, "benchmark_suite.schema.json")
 
 
 class CommandInfo(Serializable["CommandInfo"]):
@@ -253,8 +361,21 @@ class CommandInfo(Serializable["CommandInfo"]):
         command: "Union[List[str], str]",
         env: "Dict[str, str]" = {},
         workdir: "Optional[str]" = None,
+        inputs: "Optional[List[str]]" = None,
+        outputs: "Optional[List[str]]" = None,
+        timeout: "Optional[float]" = None,
     ) -> None:
-        """Create a new command object."""
+        """
+        Create a new command object.
+
+        :param inputs: files (or directories) the command reads, relative to its
+            workdir: setup commands are run again when they change.
+        :param outputs: files (or directories) the command produces, relative to
+            its workdir: setup commands are run again when they are missing or
+            changed.
+        :param timeout: the time the command is given to finish, in seconds (`None`
+            for the preset's or the run's timeout).
+        """
         from shlex import split
 
         if not isinstance(command, list):
@@ -264,6 +385,9 @@ class CommandInfo(Serializable["CommandInfo"]):
 
         self.env = env
         self.workdir = workdir
+        self.inputs = inputs
+        self.outputs = outputs
+        self.timeout = timeout
 
     def extend(
         self,
@@ -280,11 +404,22 @@ class CommandInfo(Serializable["CommandInfo"]):
             self.command + args if args is not None else self.command,
             new_env,
             workdir if workdir is not None else self.workdir,
+            self.inputs,
+            self.outputs,
+            self.timeout,
         )
 
     def into_runnable(self) -> Runnable:
         """Create a Runnable object from this CommandInfo."""
-        return Runnable(self.command, self.workdir, self.env)
+        return Runnable(self.command, self.workdir, self.env, timeout=self.timeout)
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        return {
+            k: v
+            for k, v in obj.__dict__.items()
+            if v is not None or k not in ("inputs", "outputs", "timeout")
+        }
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "CommandInfo":
@@ -309,10 +444,22 @@ class StatMatchInfo(Serializable["StatMatchInfo"]):
     Contains information about a single stat row.
     """
 
-    def __init__(self, regex: str, file: "Optional[str]" = None) -> None:
-        """Create a StatMatchInfo object."""
+    def __init__(
+        self, regex: str, file: "Optional[str]" = None, lines: "Optional[int]" = None
+    ) -> None:
+        """
+        Create a StatMatchInfo object.
+
+        :param lines: number of lines the regex is matched against (the last ones
+            read), for regexes spanning multiple lines.
+        """
         self.regex = regex
         self.file = file
+        self.lines = lines
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        return {k: v for k, v in obj.__dict__.items() if v is not None}
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "StatMatchInfo":
@@ -324,38 +471,85 @@ class BenchmarkStats(Serializable["BenchmarkStats"]):
     Benchmark statistical data.
 
     This class represents JSON benchmark stats data, according to the defined
-    jsonschema.
+    jsonschema: every stat is either a number or a distribution of samples.
     """
 
-    def __init__(self, stats: "Dict[str, Union[int, float]]") -> None:
+    def __init__(
+        self,
+        stats: "Dict[str, Union[int, float]]",
+        distributions: "Optional[Dict[str, Distribution]]" = None,
+    ) -> None:
         """Create a BenchmarkStats object."""
         self.stats = stats
+        self.distributions = distributions if distributions is not None else {}
+
+    def get_all_stats(self) -> "Dict[str, Union[int, float]]":
+        """
+        Get the scalar stats along with the distributions' summaries.
+
+        Distributions are summarized into `<stat>_<key>` stats (see
+        `flatten_distributions`), which never replace a scalar stat.
+        """
+        from openforbc_benchmark.analysis import flatten_distributions
+
+        stats: "Dict[str, Union[int, float]]" = {}
+        stats.update(flatten_distributions(self.distributions))
+        stats.update(self.stats)
+        return stats
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        from openforbc_benchmark.analysis import Distribution
+
+        json: "Dict[str, Any]" = dict(obj.stats)
+        json.update(
+            {
+                name: {
+                    k: v
+                    for k, v in Distribution.serialize(distribution).items()
+                    if k in ("samples", "timestamps", "counts")
+                }
+                for name, distribution in obj.distributions.items()
+            }
+        )
+        return json
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "BenchmarkStats":
+        from jsonschema import ValidationError
+
+        from openforbc_benchmark.analysis import Distribution
+
         self_class.validate(json)
 
-        if isinstance(json, dict):
-            return self_class(
-                {
-                    str(k): v
-                    for k, v in filter(
-                        lambda i: isinstance(i[1], (int, float)),
-                        json.items(),
+        if not isinstance(json, dict):
+            return self_class({})
+
+        distributions: "Dict[str, Distribution]" = {}
+        for k, v in json.items():
+            if isinstance(v, dict):
+                try:
+                    distributions[str(k)] = Distribution(
+                        v["samples"], v.get("timestamps"), v.get("counts")
                     )
-                }
-            )
+                except ValueError as e:
+                    raise ValidationError(f'Invalid distribution "{k}": {e}') from None
 
-        return self_class({})
+        return self_class(
+            {
+                str(k): v
+                for k, v in filter(
+                    lambda i: isinstance(i[1], (int, float)),
+                    json.items(),
+                )
+            },
+            distributions,
+        )
 
     @classmethod
     def validate(self_class, json: "Any") -> None:
         """Validate a benchmark stats output json object."""
-        with open(
-            join(dirname(__file__), "jsonschema", "benchmark_stats.schema.json")
-        ) as file:
-            schema = load(file)
-            validate(json, schema)
+        validate(json, "benchmark_stats.schema.json")
 
 
 class BenchmarkRunDefinition(Serializable["BenchmarkRunDefinition"]):
@@ -366,10 +560,30 @@ class BenchmarkRunDefinition(Serializable["BenchmarkRunDefinition"]):
     selected presets for the benchmark.
     """
 
-    def __init__(self, benchmark_id: str, presets: "List[str]") -> None:
-        """Create a BenchmarkRunDefinition object."""
+    def __init__(
+        self,
+        benchmark_id: str,
+        presets: "List[str]",
+        resources: "Optional[ResourcesDefinition]" = None,
+        placement: "Optional[PlacementDefinition]" = None,
+        timeout: "Optional[float]" = None,
+    ) -> None:
+        """
+        Create a BenchmarkRunDefinition object.
+
+        :param timeout: the time each of the run's commands is given to finish, in
+            seconds (`None` for the suite's timeout).
+        """
         self.benchmark_folder = benchmark_id
         self.presets = presets
+        self.resources = resources
+        self.placement = placement
+        self.timeout = timeout
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        # Omit unset optional fields (`null` is not valid according to the schema)
+        return {k: v for k, v in obj.__dict__.items() if v is not None}
 
     @classmethod
     def deserialize(self_class, json: "Any") -> "BenchmarkRunDefinition":
@@ -379,4 +593,73 @@ class BenchmarkRunDefinition(Serializable["BenchmarkRunDefinition"]):
         else:
             presets = [json["presets"]]
 
-        return self_class(json["benchmark_folder"], presets)
+        return self_class(
+            json["benchmark_folder"],
+            presets,
+            ResourcesDefinition.deserialize(json["resources"])
+            if "resources" in json
+            else None,
+            PlacementDefinition.deserialize(json["placement"])
+            if "placement" in json
+            else None,
+            json.get("timeout"),
+        )
+
+
+class ResourcesDefinition(Serializable["ResourcesDefinition"]):
+    """
+    Resources needed by a benchmark run.
+
+    Used by the suite scheduler to decide which benchmark runs can be executed
+    concurrently: `cores` is the number of CPU cores the run keeps busy, while
+    `exclusive` runs are never executed alongside other runs.
+    """
+
+    def __init__(self, cores: "Optional[int]" = None, exclusive: bool = False) -> None:
+        """Create a ResourcesDefinition object."""
+        self.cores = cores
+        self.exclusive = exclusive
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        return {k: v for k, v in obj.__dict__.items() if v is not None}
+
+    @classmethod
+    def deserialize(self_class, json: "Any") -> "ResourcesDefinition":
+        return self_class(json.get("cores"), json.get("exclusive", False))
+
+
+class PlacementDefinition(Serializable["PlacementDefinition"]):
+    """
+    Where a benchmark's run commands are executed.
+
+    `cpus` is the set of CPUs the commands may run on, `numa_node` the NUMA node
+    their CPUs and memory are bound to, while `isolate` keeps the harness itself
+    off the commands' CPUs.
+    """
+
+    def __init__(
+        self,
+        cpus: "Optional[List[int]]" = None,
+        numa_node: "Optional[int]" = None,
+        isolate: bool = False,
+    ) -> None:
+        """Create a PlacementDefinition object."""
+        self.cpus = cpus
+        self.numa_node = numa_node
+        self.isolate = isolate
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        return {k: v for k, v in obj.__dict__.items() if v is not None}
+
+    @classmethod
+    def deserialize(self_class, json: "Any") -> "PlacementDefinition":
+        from openforbc_benchmark.placement import parse_cpu_list
+
+        cpus = json.get("cpus")
+        return self_class(
+            parse_cpu_list(cpus) if isinstance(cpus, str) else cpus,
+            json.get("numa_node"),
+            json.get("isolate", False),
+        )
@@ -0,0 +1,208 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`placement` module binds benchmark processes to CPUs and NUMA nodes."""
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Iterable, Iterator, List, Optional
+    from openforbc_benchmark.json import PlacementDefinition
+
+NODE_DIR = "/sys/devices/system/node"
+
+
+class PlacementError(Exception):
+    """The placement can't be applied on this host."""
+
+    pass
+
+
+def parse_cpu_list(cpus: str) -> "List[int]":
+    """
+    Parse a Linux CPU list (e.g. "0-3,8").
+
+    :raises ValueError: if the CPU list is not valid.
+    """
+    result: "List[int]" = []
+    for part in cpus.split(","):
+        first, _, last = part.strip().partition("-")
+        start = int(first)
+        end = int(last) if last else start
+        if start > end:
+            raise ValueError(f'Invalid CPU range "{part.strip()}"')
+        result.extend(cpu for cpu in range(start, end + 1) if cpu not in result)
+
+    return sorted(result)
+
+
+def format_cpu_list(cpus: "Iterable[int]") -> str:
+    """Format CPUs as a Linux CPU list (e.g. "0-3,8")."""
+    ranges: "List[List[int]]" = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}" for start, end in ranges
+    )
+
+
+def get_available_cpus() -> "List[int]":
+    """
+    Get the CPUs this process may run on.
+
+    :raises PlacementError: if CPU affinity is not supported on this platform.
+    """
+    try:
+        from os import sched_getaffinity
+    except ImportError:
+        raise PlacementError("CPU affinity is not supported on this platform") from None
+
+    return sorted(sched_getaffinity(0))
+
+
+def get_node_cpus(node: int) -> "List[int]":
+    """
+    Get the CPUs of a NUMA node.
+
+    :raises PlacementError: if the node doesn't exist.
+    """
+    from os.path import join
+
+    try:
+        with open(join(NODE_DIR, f"node{node}", "cpulist"), "r") as file:
+            return parse_cpu_list(file.read())
+    except (OSError, ValueError):
+        raise PlacementError(f"NUMA node {node} not found") from None
+
+
+class Placement:
+    """
+    A placement resolved against the host it's applied on.
+
+    Created from a `PlacementDefinition` when a command is spawned: `cpus` are the
+    CPUs the command is bound to (`None` for any), `membind` tells whether its
+    memory is bound to `numa_node` as well (which requires `numactl`) and
+    `harness_cpus` are the CPUs the harness is moved to while the command runs
+    (`None` if it's not isolated).
+    """
+
+    def __init__(
+        self,
+        cpus: "Optional[List[int]]" = None,
+        numa_node: "Optional[int]" = None,
+        membind: bool = False,
+        harness_cpus: "Optional[List[int]]" = None,
+    ) -> None:
+        """Create a Placement."""
+        self.cpus = cpus
+        self.numa_node = numa_node
+        self.membind = membind
+        self.harness_cpus = harness_cpus
+
+    @classmethod
+    def resolve(self_class, definition: "PlacementDefinition") -> "Placement":
+        """
+        Resolve a placement definition on this host.
+
+        The requested CPUs are restricted to the NUMA node's ones and to the ones
+        this process may run on. To isolate the command, the harness is moved to
+        the other available CPUs or, if there are none, to the first requested CPU
+        (which the command is not bound to anymore). Isolation is skipped when
+        there is only a single CPU.
+
+        :raises PlacementError: if none of the requested CPUs is available or the
+            NUMA node doesn't exist.
+        """
+        from shutil import which
+
+        available = get_available_cpus()
+
+        cpus = definition.cpus
+        if definition.numa_node is not None:
+            node_cpus = get_node_cpus(definition.numa_node)
+            cpus = [cpu for cpu in (cpus or node_cpus) if cpu in node_cpus]
+
+        if cpus is not None:
+            cpus = [cpu for cpu in available if cpu in cpus]
+            if not cpus:
+                raise PlacementError(
+                    f"None of the requested CPUs is available (available CPUs: "
+                    f"{format_cpu_list(available)})"
+                )
+
+        harness_cpus = None
+        if definition.isolate:
+            pool = cpus if cpus is not None else available
+            harness_cpus = [cpu for cpu in available if cpu not in pool]
+            if not harness_cpus and len(pool) > 1:
+                harness_cpus, cpus = pool[:1], pool[1:]
+
+        return self_class(
+            cpus,
+            definition.numa_node,
+            definition.numa_node is not None and which("numactl") is not None,
+            harness_cpus or None,
+        )
+
+    @classmethod
+    def serialize(self_class, obj: "Any") -> "Any":
+        """Serialize a placement into a JSON object (CPUs as CPU lists)."""
+        return {
+            "cpus": format_cpu_list(obj.cpus) if obj.cpus is not None else None,
+            "numa_node": obj.numa_node,
+            "membind": obj.membind,
+            "harness_cpus": format_cpu_list(obj.harness_cpus)
+            if obj.harness_cpus is not None
+            else None,
+        }
+
+    def get_command(self, args: "List[str]") -> "List[str]":
+        """Get the arguments of a command running with this placement."""
+        if not self.membind:
+            return args
+
+        return ["numactl", f"--membind={self.numa_node}", "--"] + args
+
+    def get_preexec_fn(self) -> "Optional[Callable[[], Any]]":
+        """Get the function binding a spawned process to this placement's CPUs."""
+        from functools import partial
+        from os import sched_setaffinity
+
+        if self.cpus is None:
+            return None
+
+        return partial(sched_setaffinity, 0, self.cpus)
+
+    @contextmanager
+    def isolate_harness(self) -> "Iterator[None]":
+        """Move the calling thread (and the ones it starts) to the harness' CPUs."""
+        from os import sched_getaffinity, sched_setaffinity
+
+        if self.harness_cpus is None:
+            yield
+            return
+
+        previous = sched_getaffinity(0)
+        sched_setaffinity(0, self.harness_cpus)
+        try:
+            yield
+        finally:
+            sched_setaffinity(0, previous)
+
+    def __repr__(self) -> str:
+        parts = [
+            f"CPUs {format_cpu_list(self.cpus)}" if self.cpus is not None else None,
+            f"NUMA node {self.numa_node}"
+            + (" (memory bound with numactl)" if self.membind else "")
+            if self.numa_node is not None
+            else None,
+            f"harness on CPUs {format_cpu_list(self.harness_cpus)}"
+            if self.harness_cpus is not None
+            else None,
+        ]
+        return ", ".join(part for part in parts if part is not None) or "any CPU"
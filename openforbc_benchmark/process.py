@@ -0,0 +1,286 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`process` module pumps the output of benchmark processes into their logs."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from subprocess import Popen
+    from typing import Any, BinaryIO, Callable, Dict, List, Optional, Union
+    from asyncio.subprocess import Process
+
+CHUNK_SIZE = 64 * 1024
+
+# Time the output of a killed process is still pumped for, in seconds
+KILL_GRACE_PERIOD = 1.0
+
+
+def kill_process_group(proc: "Union[Popen[bytes], Process]") -> None:
+    """
+    Kill a process along with the processes it spawned.
+
+    The whole process group is killed if the process leads one (i.e. it was started
+    in a new session), otherwise only the process itself is.
+    """
+    from contextlib import suppress
+    from os import getpgid, killpg
+    from signal import SIGKILL
+
+    with suppress(ProcessLookupError):
+        if getpgid(proc.pid) == proc.pid:
+            killpg(proc.pid, SIGKILL)
+        else:
+            proc.kill()
+
+
+class LineMirror:
+    """
+    Mirrors a byte stream to the console, a batch of lines at a time.
+
+    Chunks are buffered and split into lines, which are passed to the callback at
+    most once every `interval` seconds. Carriage-return progress updates are
+    collapsed into their last state and no more than `max_lines` lines are mirrored
+    for each batch (the logs always have the full output).
+    """
+
+    def __init__(
+        self,
+        callback: "Callable[[str], Any]",
+        interval: float = 0.1,
+        max_lines: int = 100,
+    ) -> None:
+        """
+        Create a LineMirror.
+
+        :param callback: called with a batch of (newline separated) lines.
+        :param interval: minimum interval between batches, in seconds.
+        :param max_lines: maximum number of lines in a batch.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.max_lines = max_lines
+        self._buffer = bytearray()
+        self._omitted = 0
+        self._last_flush = 0.0
+
+    def feed(self, chunk: bytes) -> None:
+        """Add a chunk of output."""
+        self._buffer += chunk
+
+        # Only keep what may end up in the next batch
+        if len(self._buffer) > CHUNK_SIZE * 4:
+            start = self._buffer.find(b"\n", len(self._buffer) - CHUNK_SIZE * 4)
+            if start != -1:
+                self._omitted += self._buffer.count(b"\n", 0, start + 1)
+                del self._buffer[: start + 1]
+
+    def get_timeout(self) -> "Optional[float]":
+        """Get the time left until the next batch is due (`None` if none is)."""
+        from time import monotonic
+
+        if b"\n" not in self._buffer:
+            return None
+
+        return max(self._last_flush + self.interval - monotonic(), 0.0)
+
+    def flush(self, final: bool = False) -> None:
+        """
+        Mirror the buffered lines if a batch is due.
+
+        :param final: mirror every buffered line (even an incomplete one) now.
+        """
+        from time import monotonic
+
+        now = monotonic()
+        if not final and now < self._last_flush + self.interval:
+            return
+
+        end = len(self._buffer) if final else self._buffer.rfind(b"\n") + 1
+        if end == 0:
+            return
+
+        # Only decode the lines which are going to be mirrored
+        start = end - 1 if self._buffer[end - 1 : end] == b"\n" else end
+        for _ in range(self.max_lines):
+            start = self._buffer.rfind(b"\n", 0, start)
+            if start == -1:
+                break
+        omitted = self._omitted + self._buffer.count(b"\n", 0, start + 1)
+
+        text = self._buffer[start + 1 : end].decode(errors="replace")
+        del self._buffer[:end]
+        self._omitted = 0
+        self._last_flush = now
+
+        # Only the last state of each progress line (updated with "\r") is shown
+        lines = [
+            line.rstrip("\r").rsplit("\r", 1)[-1]
+            for line in (text[:-1] if text.endswith("\n") else text).split("\n")
+        ]
+        if omitted:
+            lines.insert(0, f"[{omitted} lines omitted, see logs]")
+
+        self.callback("\n".join(lines))
+
+
+class OutputPump:
+    """
+    Pumps a process' stdout and stderr into log files.
+
+    The output is read in chunks from non-blocking pipes and written as-is to the
+    logs, while optionally being mirrored to the console and passed to consumers.
+    """
+
+    def __init__(
+        self,
+        out_log: "BinaryIO",
+        err_log: "BinaryIO",
+        mirror: "Optional[Callable[[str], Any]]" = None,
+        mirror_interval: float = 0.1,
+        coalesce_interval: float = 0.01,
+    ) -> None:
+        """
+        Create an OutputPump.
+
+        :param out_log: the file stdout is written to.
+        :param err_log: the file stderr is written to.
+        :param mirror: called with batches of output lines to be shown on the
+            console (`None` to not mirror the output).
+        :param mirror_interval: minimum interval between mirrored batches.
+        :param coalesce_interval: time waited after reading less than a full chunk,
+            in seconds.
+        """
+        self.coalesce_interval = coalesce_interval
+        self.logs: "Dict[str, Optional[BinaryIO]]" = {
+            "stdout": out_log,
+            "stderr": err_log,
+        }
+        self.consumers: "Dict[str, List[Callable[[bytes], Any]]]" = {
+            "stdout": [],
+            "stderr": [],
+        }
+        self._fds: "Dict[str, int]" = {}
+        self.timed_out = False
+        self.mirrors: "Dict[str, LineMirror]" = (
+            {
+                "stdout": LineMirror(mirror, mirror_interval),
+                "stderr": LineMirror(mirror, mirror_interval),
+            }
+            if mirror is not None
+            else {}
+        )
+
+    def add_consumer(
+        self, consumer: "Callable[[bytes], Any]", stream: str = "stdout"
+    ) -> None:
+        """
+        Pass each output chunk of a stream to a consumer.
+
+        :param stream: "stdout", "stderr" or an additional stream's name.
+        """
+        self.consumers[stream].append(consumer)
+
+    def add_stream(self, name: str, fd: int, log: "Optional[BinaryIO]" = None) -> None:
+        """
+        Pump an additional stream (which is never mirrored).
+
+        :param fd: the read end of a pipe, closed when the pump is done.
+        :param log: the file the stream is written to.
+        """
+        self.logs[name] = log
+        self.consumers[name] = []
+        self._fds[name] = fd
+
+    def run(self, proc: "Popen[bytes]", timeout: "Optional[float]" = None) -> int:
+        """
+        Pump a process' output until both its pipes are closed.
+
+        :param proc: a process with piped stdout and stderr.
+        :param timeout: the time the process is given to finish, in seconds: then its
+            process group is killed (see `kill_process_group`) and `timed_out` is
+            set. The pipes are only pumped for a little longer, in case they're
+            shared with processes out of the group.
+        :returns: the process' return code.
+        """
+        from os import close, read, set_blocking
+        from selectors import DefaultSelector, EVENT_READ
+        from time import monotonic, sleep
+
+        assert proc.stdout is not None
+        assert proc.stderr is not None
+
+        fds = {"stdout": proc.stdout.fileno(), "stderr": proc.stderr.fileno()}
+        fds.update(self._fds)
+        deadline = monotonic() + timeout if timeout is not None else None
+
+        try:
+            with DefaultSelector() as selector:
+                for stream, fd in fds.items():
+                    set_blocking(fd, False)
+                    selector.register(fd, EVENT_READ, stream)
+
+                while selector.get_map():
+                    if deadline is not None and monotonic() >= deadline:
+                        if self.timed_out:
+                            break
+
+                        self.timed_out = True
+                        kill_process_group(proc)
+                        deadline = monotonic() + KILL_GRACE_PERIOD
+
+                    timeouts = [
+                        t
+                        for t in (m.get_timeout() for m in self.mirrors.values())
+                        if t is not None
+                    ]
+                    if deadline is not None:
+                        timeouts.append(max(deadline - monotonic(), 0.0))
+                    full = False
+                    for key, _ in selector.select(min(timeouts, default=None)):
+                        try:
+                            chunk = read(key.fd, CHUNK_SIZE)
+                        except BlockingIOError:
+                            continue
+
+                        if not chunk:
+                            selector.unregister(key.fd)
+                            continue
+
+                        self._dispatch(key.data, chunk)
+                        full = full or len(chunk) == CHUNK_SIZE
+
+                    for mirror in self.mirrors.values():
+                        mirror.flush()
+
+                    # Let processes which write a line at a time fill the pipes a bit,
+                    # instead of waking up for every line
+                    if not full and self.coalesce_interval:
+                        sleep(self.coalesce_interval)
+        except KeyboardInterrupt:
+            # Processes started in a new session don't get the terminal's interrupt
+            if timeout is not None:
+                kill_process_group(proc)
+            raise
+
+        for mirror in self.mirrors.values():
+            mirror.flush(final=True)
+
+        proc.stdout.close()
+        proc.stderr.close()
+        for fd in self._fds.values():
+            close(fd)
+
+        return proc.wait()
+
+    def _dispatch(self, stream: str, chunk: bytes) -> None:
+        """Write a chunk to a stream's log, consumers and mirror."""
+        log = self.logs[stream]
+        if log is not None:
+            log.write(chunk)
+
+        for consumer in self.consumers[stream]:
+            consumer(chunk)
+
+        if stream in self.mirrors:
+            self.mirrors[stream].feed(chunk)
@@ -0,0 +1,542 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`results` module implements the local database of benchmark results."""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlite3 import Connection
+    from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+    from openforbc_benchmark.analysis import ScalingCurve
+    from openforbc_benchmark.benchmark import Preset
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    benchmark TEXT NOT NULL,
+    preset TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    host TEXT NOT NULL,
+    hostname TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    log_dir TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS runs_series
+    ON runs (benchmark, preset, params_hash, host, timestamp);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    stat TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, stat, trial)
+) WITHOUT ROWID;
+"""
+
+
+class ResultStoreError(Exception):
+    pass
+
+
+class StoredRun:
+    """A benchmark preset run stored in the results database."""
+
+    def __init__(
+        self,
+        id: int,
+        benchmark: str,
+        preset: str,
+        params_hash: str,
+        host: str,
+        hostname: str,
+        timestamp: float,
+        log_dir: "Optional[str]",
+        metadata: "Dict[str, Any]",
+        samples: "Dict[str, List[float]]",
+    ) -> None:
+        """Create a StoredRun."""
+        self.id = id
+        self.benchmark = benchmark
+        self.preset = preset
+        self.params_hash = params_hash
+        self.host = host
+        self.hostname = hostname
+        self.timestamp = timestamp
+        self.log_dir = log_dir
+        self.metadata = metadata
+        self.samples = samples
+
+    def get_means(self) -> "Dict[str, float]":
+        """Get the mean of each stat's samples."""
+        from statistics import fmean
+
+        return {stat: fmean(values) for stat, values in self.samples.items()}
+
+
+class ResultStore:
+    """
+    A local SQLite database of benchmark results.
+
+    Every preset run is stored along with its benchmark ID, the hash of the preset's
+    parameters (args and env), a fingerprint of the host and a timestamp: runs
+    sharing all of these (but the timestamp) form a series which can be compared
+    over time. The stats' samples are stored in a separate table.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (eventually creating) a results database.
+
+        :param path: the database file path.
+        """
+        from os import makedirs
+        from os.path import abspath, dirname
+        from sqlite3 import connect
+
+        self.path = path
+        makedirs(dirname(abspath(path)), exist_ok=True)
+
+        # Concurrent suite runs may write at the same time
+        self._db: "Connection" = connect(path, timeout=30)
+        self._db.execute("PRAGMA foreign_keys = ON")
+
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version > SCHEMA_VERSION:
+            self._db.close()
+            raise ResultStoreError(
+                f'Results database "{path}" was created by a newer version '
+                f"(schema version {version})"
+            )
+        if version < SCHEMA_VERSION:
+            with self._db:
+                self._db.executescript(SCHEMA)
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *_: "Any") -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+    def add_run(
+        self,
+        benchmark: str,
+        preset: "Preset",
+        samples: "Dict[str, List[Union[int, float]]]",
+        log_dir: "Optional[str]" = None,
+        timestamp: "Optional[float]" = None,
+        metadata: "Optional[Dict[str, Any]]" = None,
+    ) -> int:
+        """
+        Store the stats of a preset run.
+
+        :param benchmark: the benchmark ID.
+        :param preset: the preset which was run.
+        :param samples: the samples collected for each stat (one for each trial).
+        :param log_dir: the run's log directory.
+        :param timestamp: the run's UNIX timestamp (defaults to now).
+        :param metadata: additional information about the run.
+        :returns: the stored run's ID.
+        """
+        from json import dumps
+        from socket import gethostname
+        from time import time
+
+        run_metadata = {"args": preset.args, "env": preset.env}
+        run_metadata.update(metadata or {})
+
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO runs (benchmark, preset, params_hash, host, hostname, "
+                "timestamp, log_dir, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    benchmark,
+                    preset.name,
+                    get_params_hash(preset),
+                    get_host_fingerprint(),
+                    gethostname(),
+                    timestamp if timestamp is not None else time(),
+                    log_dir,
+                    dumps(run_metadata),
+                ),
+            )
+            run_id = cursor.lastrowid
+            assert run_id is not None
+            self._db.executemany(
+                "INSERT INTO samples (run_id, stat, trial, value) VALUES (?, ?, ?, ?)",
+                (
+                    (run_id, stat, trial, value)
+                    for stat, values in samples.items()
+                    for trial, value in enumerate(values)
+                ),
+            )
+
+        return run_id
+
+    def get_series(
+        self,
+        benchmark: "Optional[str]" = None,
+        preset: "Optional[str]" = None,
+        host: "Optional[str]" = None,
+    ) -> "List[Tuple[str, str, str, str]]":
+        """
+        Get the stored series, optionally filtered.
+
+        :returns: a list of (benchmark, preset, params hash, host) tuples.
+        """
+        where, params = _filters(benchmark=benchmark, preset=preset, host=host)
+        return self._db.execute(
+            "SELECT DISTINCT benchmark, preset, params_hash, host FROM runs"
+            f"{where} ORDER BY benchmark, preset, params_hash, host",
+            params,
+        ).fetchall()
+
+    def get_runs(
+        self,
+        benchmark: "Optional[str]" = None,
+        preset: "Optional[str]" = None,
+        params_hash: "Optional[str]" = None,
+        host: "Optional[str]" = None,
+        limit: "Optional[int]" = None,
+        before: "Optional[float]" = None,
+    ) -> "List[StoredRun]":
+        """
+        Get stored runs (with their samples), newest first.
+
+        :param limit: maximum number of runs.
+        :param before: only get runs older than this UNIX timestamp.
+        """
+        where, params = _filters(
+            benchmark=benchmark, preset=preset, params_hash=params_hash, host=host
+        )
+        if before is not None:
+            where += (" AND" if where else " WHERE") + " timestamp < ?"
+            params.append(before)
+
+        rows = self._db.execute(
+            "SELECT id, benchmark, preset, params_hash, host, hostname, timestamp, "
+            f"log_dir, metadata FROM runs{where} ORDER BY timestamp DESC, id DESC"
+            + (" LIMIT ?" if limit is not None else ""),
+            params + ([limit] if limit is not None else []),
+        ).fetchall()
+
+        return self._with_samples(rows)
+
+    def get_latest_runs(
+        self,
+        benchmark: "Optional[str]" = None,
+        preset_prefix: "Optional[str]" = None,
+        host: "Optional[str]" = None,
+    ) -> "List[StoredRun]":
+        """
+        Get the newest stored run (with its samples) of each preset.
+
+        :param preset_prefix: only get the runs of presets whose name starts with
+            this prefix.
+        """
+        where, params = _filters(benchmark=benchmark, host=host)
+        if preset_prefix is not None:
+            where += (" AND" if where else " WHERE") + " preset LIKE ? ESCAPE '\\'"
+            params.append(
+                "".join(f"\\{c}" if c in "\\%_" else c for c in preset_prefix) + "%"
+            )
+
+        # SQLite takes the bare columns from the row with the maximum timestamp
+        rows = self._db.execute(
+            "SELECT id, benchmark, preset, params_hash, host, hostname, "
+            f"MAX(timestamp), log_dir, metadata FROM runs{where} GROUP BY preset "
+            "ORDER BY preset",
+            params,
+        ).fetchall()
+
+        return self._with_samples(rows)
+
+    def get_run(self, id: int) -> "Optional[StoredRun]":
+        """Get a stored run by its ID."""
+        rows = self._db.execute(
+            "SELECT id, benchmark, preset, params_hash, host, hostname, timestamp, "
+            "log_dir, metadata FROM runs WHERE id = ?",
+            (id,),
+        ).fetchall()
+
+        runs = self._with_samples(rows)
+        return runs[0] if runs else None
+
+    def _with_samples(self, rows: "List[Tuple[Any, ...]]") -> "List[StoredRun]":
+        """Create StoredRuns from `runs` rows, fetching their samples."""
+        from json import loads
+
+        samples: "Dict[int, Dict[str, List[float]]]" = {row[0]: {} for row in rows}
+        ids = list(samples)
+        # Stay below SQLite's maximum number of host parameters
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            for run_id, stat, value in self._db.execute(
+                "SELECT run_id, stat, value FROM samples WHERE run_id IN "
+                f"({', '.join('?' for _ in chunk)}) ORDER BY run_id, stat, trial",
+                chunk,
+            ):
+                samples[run_id].setdefault(stat, []).append(value)
+
+        return [
+            StoredRun(*row[:8], loads(row[8]), samples[row[0]])  # type: ignore
+            for row in rows
+        ]
+
+
+class Comparison:
+    """The comparison between a run's stat and the same stat in a baseline window."""
+
+    def __init__(
+        self,
+        run: StoredRun,
+        stat: str,
+        baseline: "List[float]",
+        alpha: float,
+        higher_is_better: bool,
+    ) -> None:
+        """
+        Compare a run's stat against the stat's mean in each baseline run.
+
+        :param baseline: the stat's mean in each of the baseline runs.
+        :param alpha: significance level.
+        """
+        from statistics import fmean
+
+        from openforbc_benchmark.analysis import prediction_test
+
+        self.run = run
+        self.stat = stat
+        self.value = fmean(run.samples[stat])
+        self.baseline = baseline
+        self.higher_is_better = higher_is_better
+        self.p_value: "Optional[float]" = None
+        self.significant = False
+
+        if len(baseline) >= 2:
+            self.p_value = prediction_test(baseline, self.value)
+            self.significant = self.p_value < alpha
+
+    def get_change(self) -> "Optional[float]":
+        """Get the relative change from the baseline mean."""
+        from statistics import fmean
+
+        if not self.baseline or fmean(self.baseline) == 0:
+            return None
+
+        return self.value / fmean(self.baseline) - 1
+
+    def is_regression(self) -> bool:
+        """Check whether the change is a significant regression."""
+        from statistics import fmean
+
+        if not self.significant:
+            return False
+
+        increased = self.value > fmean(self.baseline)
+        return increased != self.higher_is_better
+
+    def get_status(self) -> str:
+        """Get a short description of the comparison result."""
+        if self.p_value is None:
+            return "insufficient data"
+        if not self.significant:
+            return "ok"
+        return "REGRESSION" if self.is_regression() else "improvement"
+
+
+def compare(
+    store: ResultStore,
+    window: int = 10,
+    alpha: float = 0.01,
+    higher_is_better: "Optional[str]" = None,
+    benchmark: "Optional[str]" = None,
+    preset: "Optional[str]" = None,
+    host: "Optional[str]" = None,
+) -> "Iterator[Comparison]":
+    """
+    Compare the latest run of each series against the previous runs.
+
+    :param window: number of previous runs in the baseline.
+    :param alpha: significance level.
+    :param higher_is_better: regex matching the names of the stats for which an
+        increase is an improvement (for the others a decrease is).
+    """
+    from re import compile, IGNORECASE
+
+    higher_regex = compile(
+        higher_is_better if higher_is_better is not None else HIGHER_IS_BETTER,
+        IGNORECASE,
+    )
+
+    for series in store.get_series(benchmark, preset, host):
+        runs = store.get_runs(*series, limit=window + 1)
+        if not runs:
+            continue
+
+        latest, baseline = runs[0], runs[1:]
+        baseline_means = [run.get_means() for run in baseline]
+        for stat in sorted(latest.samples):
+            yield Comparison(
+                latest,
+                stat,
+                [means[stat] for means in baseline_means if stat in means],
+                alpha,
+                higher_regex.search(stat) is not None,
+            )
+
+
+def get_scaling_curves(
+    store: ResultStore,
+    benchmark: str,
+    sweep: str,
+    stat: str,
+    axis: str,
+    flops: "Optional[str]" = None,
+    host: "Optional[str]" = None,
+) -> "List[ScalingCurve]":
+    """
+    Get the scaling curves of a stat from the latest runs of a sweep's presets.
+
+    The presets are grouped by the values of the sweep's other axes, each group
+    making a curve of the stat's mean against the axis' values.
+
+    :param axis: the axis whose values are the problem sizes.
+    :param flops: a formula of the number of floating point operations of each
+        preset, using the axes as variables (e.g. `2 * size**3`, see
+        `evaluate_formula`).
+    :raises ValueError: if the sweep has no such (numeric) axis or the formula is
+        not valid.
+    """
+    from contextlib import suppress
+
+    from openforbc_benchmark.analysis import evaluate_formula, ScalingCurve
+    from openforbc_benchmark.benchmark import parse_sweep_preset_name
+
+    points: "Dict[Tuple[Tuple[str, str], ...], List[Tuple[float, float, float]]]" = {}
+    # Only the latest run of each preset counts
+    for run in store.get_latest_runs(benchmark, f"{sweep}@", host):
+        parsed = parse_sweep_preset_name(run.preset)
+        if parsed is None or parsed[0] != sweep:
+            continue
+
+        axes = parsed[1]
+        means = run.get_means()
+        if stat not in means:
+            continue
+        if axis not in axes:
+            raise ValueError(f'Sweep "{sweep}" has no "{axis}" axis')
+
+        variables = {}
+        for name, value in axes.items():
+            with suppress(ValueError):
+                variables[name] = float(value)
+        if axis not in variables:
+            raise ValueError(f'Value "{axes[axis]}" of axis "{axis}" is not a number')
+
+        labels = tuple((name, value) for name, value in axes.items() if name != axis)
+        points.setdefault(labels, []).append(
+            (
+                variables[axis],
+                means[stat],
+                evaluate_formula(flops, variables) if flops is not None else 0.0,
+            )
+        )
+
+    return [
+        ScalingCurve(
+            stat,
+            axis,
+            [size for size, _, _ in curve],
+            [value for _, value, _ in curve],
+            [count for _, _, count in curve] if flops is not None else None,
+            dict(labels),
+        )
+        for labels, curve in sorted(points.items())
+    ]
+
+
+def get_default_path() -> str:
+    """
+    Get the default results database path.
+
+    Defaults to `logs/results.db` in the current directory and can be overridden by
+    setting the `O4BCB_RESULTS_DB` environment variable.
+    """
+    from os import environ, getcwd
+    from os.path import join
+
+    return environ.get("O4BCB_RESULTS_DB", join(getcwd(), "logs", "results.db"))
+
+
+def get_params_hash(preset: "Preset") -> str:
+    """Get the hash of a preset's parameters (its args and env)."""
+    from hashlib import sha256
+    from json import dumps
+
+    return sha256(
+        dumps({"args": preset.args, "env": preset.env}, sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+
+@lru_cache(maxsize=None)
+def get_host_fingerprint() -> str:
+    """
+    Get a fingerprint of the current host.
+
+    The fingerprint is derived from the hostname, the machine type, the CPU model,
+    the number of CPUs and the total memory.
+    """
+    from hashlib import sha256
+    from os import cpu_count
+    from platform import machine, processor
+    from socket import gethostname
+
+    cpu_model = processor()
+    mem_total = ""
+    try:
+        with open("/proc/cpuinfo", "r") as cpuinfo:
+            cpu_model = next(
+                (
+                    line.split(":", 1)[1].strip()
+                    for line in cpuinfo
+                    if line.startswith("model name")
+                ),
+                cpu_model,
+            )
+        with open("/proc/meminfo", "r") as meminfo:
+            mem_total = next(
+                (line.split()[1] for line in meminfo if line.startswith("MemTotal")),
+                "",
+            )
+    except OSError:
+        pass
+
+    return sha256(
+        "\n".join(
+            [gethostname(), machine(), cpu_model, str(cpu_count()), mem_total]
+        ).encode()
+    ).hexdigest()[:16]
+
+
+HIGHER_IS_BETTER = r"fps|score|throughput|per_s(ec(ond)?)?($|_)|per_minute|flops"
+
+
+def _filters(**filters: "Any") -> "Tuple[str, List[Any]]":
+    """Build a WHERE clause matching the (not `None`) columns values."""
+    columns = [(k, v) for k, v in filters.items() if v is not None]
+    if not columns:
+        return "", []
+
+    return " WHERE " + " AND ".join(f"{k} = ?" for k, _ in columns), [
+        v for _, v in columns
+    ]
@@ -0,0 +1,569 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`runner` module runs benchmark runs' tasks with asyncio."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from asyncio import Semaphore
+    from asyncio.subprocess import Process
+    from concurrent.futures import Executor
+    from typing import (
+        Any,
+        AsyncIterator,
+        Callable,
+        Dict,
+        Iterable,
+        Iterator,
+        List,
+        Optional,
+        Union,
+    )
+    from openforbc_benchmark.benchmark import BenchmarkRun, Preset
+    from openforbc_benchmark.utils import PopenArgs, Runnable
+
+# Size of the chunks the tasks' output is read in
+READ_SIZE = 64 * 1024
+
+
+class TaskFailed(Exception):
+    """A task exited with a non-zero status or timed out."""
+
+    def __init__(
+        self, task: "Runnable", returncode: "Optional[int]", timed_out: bool = False
+    ) -> None:
+        super().__init__(
+            f"Task {task} timed out"
+            if timed_out
+            else f"Task {task} failed with return code {returncode}"
+        )
+        self.task = task
+        self.returncode = returncode
+        self.timed_out = timed_out
+
+
+class RunnerEvent:
+    """
+    An event of a benchmark run executed by an `AsyncBenchmarkRunner`.
+
+    Every event carries the run it belongs to, the run's phase (`setup`, `run`,
+    `test` or `cleanup`) and the preset being run (only in the `run` phase).
+    """
+
+    kind = "event"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]" = None,
+    ) -> None:
+        self.run = run
+        self.phase = phase
+        self.preset = preset
+
+    def serialize(self) -> "Dict[str, Any]":
+        """Serialize into a JSON-compatible dict (e.g. to be sent to a dashboard)."""
+        return {
+            "kind": self.kind,
+            "benchmark": self.run.benchmark.get_id(),
+            "phase": self.phase,
+            "preset": self.preset.name if self.preset is not None else None,
+        }
+
+
+class TaskEvent(RunnerEvent):
+    """An event of a single task."""
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]",
+        task: "Runnable",
+    ) -> None:
+        super().__init__(run, phase, preset)
+        self.task = task
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {**super().serialize(), "task": self.task.args}
+
+
+class TaskStarted(TaskEvent):
+    """A task's process has been started."""
+
+    kind = "task_started"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]",
+        task: "Runnable",
+        pid: int,
+    ) -> None:
+        super().__init__(run, phase, preset, task)
+        self.pid = pid
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {**super().serialize(), "pid": self.pid}
+
+
+class TaskOutput(TaskEvent):
+    """A task wrote a line of output (without its line terminator)."""
+
+    kind = "task_output"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]",
+        task: "Runnable",
+        stream: str,
+        line: str,
+    ) -> None:
+        """
+        Create a TaskOutput event.
+
+        :param stream: `stdout` or `stderr`.
+        """
+        super().__init__(run, phase, preset, task)
+        self.stream = stream
+        self.line = line
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {**super().serialize(), "stream": self.stream, "line": self.line}
+
+
+class StatFound(TaskEvent):
+    """A stat has been matched in a preset's output."""
+
+    kind = "stat_found"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]",
+        task: "Runnable",
+        name: str,
+        value: "Union[int, float]",
+    ) -> None:
+        super().__init__(run, phase, preset, task)
+        self.name = name
+        self.value = value
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {**super().serialize(), "name": self.name, "value": self.value}
+
+
+class TaskFinished(TaskEvent):
+    """A task's process exited, timed out or was cancelled."""
+
+    kind = "task_finished"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        preset: "Optional[Preset]",
+        task: "Runnable",
+        returncode: "Optional[int]",
+        duration: float,
+        timed_out: bool = False,
+        cancelled: bool = False,
+    ) -> None:
+        """
+        Create a TaskFinished event.
+
+        :param returncode: the task's exit status (negative if killed by a signal).
+        :param duration: the task's wall-clock time, in seconds.
+        """
+        super().__init__(run, phase, preset, task)
+        self.returncode = returncode
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {
+            **super().serialize(),
+            "returncode": self.returncode,
+            "duration": self.duration,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+        }
+
+
+class RunFinished(RunnerEvent):
+    """A benchmark run has finished, successfully or not."""
+
+    kind = "run_finished"
+
+    def __init__(
+        self,
+        run: "BenchmarkRun",
+        stats: "Dict[str, Dict[str, Union[int, float]]]",
+        error: "Optional[BaseException]" = None,
+    ) -> None:
+        """
+        Create a RunFinished event.
+
+        :param stats: the stats of the presets which were run, by preset name.
+        :param error: why the run failed (`None` if it succeeded).
+        """
+        super().__init__(run, "cleanup")
+        self.stats = stats
+        self.error = error
+
+    def serialize(self) -> "Dict[str, Any]":
+        return {
+            **super().serialize(),
+            "stats": self.stats,
+            "error": str(self.error) if self.error is not None else None,
+        }
+
+
+class Subscription:
+    """
+    An async iterator into the events published by an `AsyncBenchmarkRunner`.
+
+    Events are queued from the moment the subscription is created until the runner
+    is closed, which ends the iteration.
+    """
+
+    def __init__(self, runner: "AsyncBenchmarkRunner") -> None:
+        from asyncio import Queue
+
+        self.runner = runner
+        self.queue: "Queue[Optional[RunnerEvent]]" = Queue()
+
+    def __aiter__(self) -> "AsyncIterator[RunnerEvent]":
+        return self
+
+    async def __anext__(self) -> RunnerEvent:
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def close(self) -> None:
+        """Stop receiving events."""
+        self.runner.unsubscribe(self)
+
+
+class AsyncBenchmarkRunner:
+    """
+    Executes the tasks of benchmark runs as asyncio subprocesses.
+
+    The runner consumes the same task iterators as the CLI (`BenchmarkRun.setup()`,
+    `run()`, `test()` and `cleanup()`), publishing the progress of each task as
+    `RunnerEvent`s to its subscribers: independent runs can be executed
+    concurrently in the same event loop.
+
+    Worker tasks are run as ordinary commands and the stats channel is not opened,
+    nor are the presets repeated: the runner runs each preset once.
+    """
+
+    def __init__(
+        self,
+        task_timeout: "Optional[float]" = None,
+        jobs: "Optional[int]" = None,
+    ) -> None:
+        """
+        Create an AsyncBenchmarkRunner.
+
+        :param task_timeout: the time each task is given to finish, in seconds, unless
+            the task has its own timeout (`None` for no limit).
+        :param jobs: the maximum number of runs executed at the same time by
+            `run_all()` (`None` for no limit).
+        """
+        self.task_timeout = task_timeout
+        self.jobs = jobs
+        self._subscriptions: "List[Subscription]" = []
+
+    def subscribe(self) -> Subscription:
+        """Subscribe to the events published from now on."""
+        subscription = Subscription(self)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop publishing events to a subscription, ending its iteration."""
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            subscription.queue.put_nowait(None)
+
+    def close(self) -> None:
+        """End the iteration of every subscription."""
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+
+    def publish(self, event: RunnerEvent) -> None:
+        """Publish an event to every subscription."""
+        for subscription in self._subscriptions:
+            subscription.queue.put_nowait(event)
+
+    async def run_all(
+        self, runs: "Iterable[BenchmarkRun]", test_only: bool = False
+    ) -> "List[Union[Dict[str, Dict[str, Union[int, float]]], BaseException]]":
+        """
+        Execute independent benchmark runs concurrently.
+
+        :param test_only: `True` to run the test commands instead of the presets.
+        :returns: each run's stats (see `run()`), or the exception it failed with.
+        """
+        from asyncio import gather, Semaphore
+
+        semaphore = Semaphore(self.jobs) if self.jobs is not None else None
+        return await gather(
+            *(self._run_with(semaphore, run, test_only) for run in runs),
+            return_exceptions=True,
+        )
+
+    async def run(
+        self, run: "BenchmarkRun", test_only: bool = False
+    ) -> "Dict[str, Dict[str, Union[int, float]]]":
+        """
+        Execute a benchmark run: its setup, its presets (or test) and its cleanup.
+
+        The cleanup commands are run even if a task failed, but not if the run is
+        cancelled.
+
+        :param test_only: `True` to run the test commands instead of the presets.
+        :returns: the stats of each preset, by preset name.
+        :raises TaskFailed: if a task failed or timed out.
+        :raises BenchmarkStatsError: if a preset's stats couldn't be extracted.
+        """
+        from asyncio import CancelledError
+        from concurrent.futures import ThreadPoolExecutor
+
+        stats: "Dict[str, Dict[str, Union[int, float]]]" = {}
+        error: "Optional[BaseException]" = None
+        # Setup tasks may block (e.g. on a `VenvCache` lock held by a concurrent
+        # run), they're advanced by the run's own thread
+        executor = ThreadPoolExecutor(1)
+        try:
+            # Setup tasks are only resumed once the previous one succeeded
+            await self._run_tasks(run, "setup", run.setup(), executor=executor)
+            if test_only:
+                await self._run_tasks(run, "test", run.test())
+            else:
+                for preset, tasks in run.run():
+                    stats[preset.name] = await self._run_preset(run, preset, tasks)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # Doesn't wait for a setup task blocked when the run is cancelled
+            executor.shutdown(wait=False)
+            try:
+                if not isinstance(error, CancelledError):
+                    await self._run_tasks(run, "cleanup", run.cleanup())
+            finally:
+                self.publish(RunFinished(run, stats, error))
+
+        return stats
+
+    async def run_task(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        task: "Runnable",
+        preset: "Optional[Preset]" = None,
+        stdout_consumer: "Optional[Callable[[bytes], Any]]" = None,
+        timeout: "Optional[float]" = None,
+    ) -> "Optional[int]":
+        """
+        Run a single task, publishing its events.
+
+        The task's process is killed if it times out or if the run is cancelled.
+
+        :param stdout_consumer: called with each chunk of the task's stdout.
+        :param timeout: the time the task is given to finish, in seconds (the task's
+            own timeout or else the runner's task timeout by default).
+        :returns: the task's exit status, `None` if it timed out.
+        """
+        from asyncio import CancelledError, gather, TimeoutError, wait_for
+        from asyncio.subprocess import PIPE
+        from time import monotonic
+
+        from openforbc_benchmark.process import kill_process_group
+
+        if timeout is None:
+            timeout = task.timeout if task.timeout is not None else self.task_timeout
+
+        popen_args = task.into_popen_args()
+        # The task's process group is killed if it times out or is cancelled
+        popen_args["start_new_session"] = True
+        start = monotonic()
+        proc = await create_subprocess(popen_args, stdout=PIPE, stderr=PIPE)
+        self.publish(TaskStarted(run, phase, preset, task, proc.pid))
+
+        async def pump(
+            stream: str, consumer: "Optional[Callable[[bytes], Any]]"
+        ) -> None:
+            reader = proc.stdout if stream == "stdout" else proc.stderr
+            assert reader is not None
+            async for line in read_lines(reader, consumer):
+                self.publish(TaskOutput(run, phase, preset, task, stream, line))
+
+        timed_out = cancelled = False
+        try:
+            await wait_for(
+                gather(
+                    pump("stdout", stdout_consumer), pump("stderr", None), proc.wait()
+                ),
+                timeout,
+            )
+        except TimeoutError:
+            timed_out = True
+        except CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if timed_out or cancelled or proc.returncode is None:
+                kill_process_group(proc)
+                await proc.wait()
+            self.publish(
+                TaskFinished(
+                    run,
+                    phase,
+                    preset,
+                    task,
+                    None if timed_out else proc.returncode,
+                    monotonic() - start,
+                    timed_out,
+                    cancelled,
+                )
+            )
+
+        return None if timed_out else proc.returncode
+
+    async def _run_with(
+        self, semaphore: "Optional[Semaphore]", run: "BenchmarkRun", test_only: bool
+    ) -> "Dict[str, Dict[str, Union[int, float]]]":
+        """Execute a benchmark run once the semaphore (if any) is acquired."""
+        if semaphore is None:
+            return await self.run(run, test_only)
+
+        async with semaphore:
+            return await self.run(run, test_only)
+
+    async def _run_tasks(
+        self,
+        run: "BenchmarkRun",
+        phase: str,
+        tasks: "Iterator[Runnable]",
+        preset: "Optional[Preset]" = None,
+        executor: "Optional[Executor]" = None,
+    ) -> None:
+        """
+        Run a phase's tasks one after another, stopping at the first failure.
+
+        :param executor: the executor advancing the tasks iterator, when it may
+            block (in the event loop if `None`).
+        """
+        from asyncio import get_running_loop
+
+        loop = get_running_loop()
+        while True:
+            task = (
+                next(tasks, None)
+                if executor is None
+                else await loop.run_in_executor(executor, next, tasks, None)
+            )
+            if task is None:
+                break
+
+            returncode = await self.run_task(run, phase, task, preset)
+            if returncode != 0:
+                raise TaskFailed(task, returncode, returncode is None)
+
+    async def _run_preset(
+        self, run: "BenchmarkRun", preset: "Preset", tasks: "Iterator[Runnable]"
+    ) -> "Dict[str, Union[int, float]]":
+        """Run a preset's tasks, extracting the stats from the last one's output."""
+        from asyncio import get_running_loop
+        from tempfile import NamedTemporaryFile
+
+        task_list = list(tasks)
+        last = task_list[-1]
+        await self._run_tasks(run, "run", iter(task_list[:-1]), preset)
+
+        # Stats are matched while the last task's output is being read
+        matcher = run.get_stat_matcher(
+            lambda name, value: self.publish(
+                StatFound(run, "run", preset, last, name, value)
+            )
+        )
+        if matcher is not None:
+            returncode = await self.run_task(run, "run", last, preset, matcher.feed)
+            if returncode != 0:
+                raise TaskFailed(last, returncode, returncode is None)
+            return matcher.get_stats(run.benchmark.dir)
+
+        # The stats script reads the output from a file
+        with NamedTemporaryFile("w+b", suffix=".out.log") as output:
+            returncode = await self.run_task(run, "run", last, preset, output.write)
+            if returncode != 0:
+                raise TaskFailed(last, returncode, returncode is None)
+            output.flush()
+
+            stats = await get_running_loop().run_in_executor(
+                None, run.get_stats, output.name
+            )
+
+        for name, value in stats.items():
+            self.publish(StatFound(run, "run", preset, last, name, value))
+        return stats
+
+
+async def create_subprocess(popen_args: "PopenArgs", **kwargs: "Any") -> "Process":
+    """Start a task's process from its `subprocess.Popen` args."""
+    from asyncio import create_subprocess_exec
+
+    args = popen_args["args"]
+    return await create_subprocess_exec(
+        args[0],
+        *args[1:],
+        cwd=popen_args["cwd"],
+        env=popen_args["env"],
+        preexec_fn=popen_args["preexec_fn"],
+        start_new_session=popen_args["start_new_session"],
+        **kwargs,
+    )
+
+
+async def read_lines(
+    reader: "Any", consumer: "Optional[Callable[[bytes], Any]]" = None
+) -> "AsyncIterator[str]":
+    """
+    Read (UTF-8) lines out of a stream until its end.
+
+    Lines are yielded without their terminator, whatever their length.
+
+    :param reader: an `asyncio.StreamReader`.
+    :param consumer: called with each chunk of the stream.
+    """
+    from codecs import getincrementaldecoder
+
+    decoder = getincrementaldecoder("utf-8")(errors="replace")
+    partial = ""
+    while True:
+        chunk = await reader.read(READ_SIZE)
+        if consumer is not None and chunk:
+            consumer(chunk)
+
+        lines = (partial + decoder.decode(chunk, final=not chunk)).split("\n")
+        partial = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+
+        if not chunk:
+            break
+
+    if partial:
+        yield partial
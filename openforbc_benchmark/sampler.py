@@ -0,0 +1,327 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`sampler` module samples the resource usage of benchmark processes."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from resource import struct_rusage
+    from threading import Event, Thread
+    from typing import Any, Dict, List, Optional, Set, Tuple
+
+PROC = "/proc"
+
+# Cumulative per-process counters
+COUNTERS = (
+    "cpu_time",
+    "minor_faults",
+    "major_faults",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+    "read_bytes",
+    "write_bytes",
+)
+
+
+def is_supported() -> bool:
+    """Check whether processes can be sampled (Linux `/proc` is available)."""
+    from os import getpid
+    from os.path import exists, join
+
+    return exists(join(PROC, str(getpid()), "stat"))
+
+
+def read_process(pid: int) -> "Optional[Dict[str, float]]":
+    """
+    Read a process' resource usage from `/proc`.
+
+    :returns: the process' RSS and peak RSS (in bytes) and cumulative counters
+        (CPU time in seconds), `None` if the process is gone. Counters which can't
+        be read (e.g. I/O of processes owned by other users) are missing.
+    """
+    from contextlib import suppress
+    from os import sysconf
+    from os.path import join
+
+    try:
+        with open(join(PROC, str(pid), "stat"), "r") as file:
+            stat = file.read()
+    except OSError:
+        return None
+
+    # The process name may contain spaces and parentheses
+    fields = stat[stat.rindex(")") + 2 :].split()
+    usage = {
+        "ppid": float(fields[1]),
+        "minor_faults": float(fields[7]),
+        "major_faults": float(fields[9]),
+        "cpu_time": (int(fields[11]) + int(fields[12])) / sysconf("SC_CLK_TCK"),
+        "threads": float(fields[17]),
+        "rss": float(int(fields[21]) * sysconf("SC_PAGE_SIZE")),
+    }
+
+    keys = {
+        "voluntary_ctxt_switches": "voluntary_ctx_switches",
+        "nonvoluntary_ctxt_switches": "involuntary_ctx_switches",
+        "read_bytes": "read_bytes",
+        "write_bytes": "write_bytes",
+    }
+    for name in ("status", "io"):
+        with suppress(OSError), open(join(PROC, str(pid), name), "r") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    usage[keys[key]] = float(value.split()[0])
+                elif key == "VmHWM":
+                    # In KiB
+                    usage["peak_rss"] = float(value.split()[0]) * 1024
+
+    return usage
+
+
+def get_children(pid: int) -> "List[int]":
+    """Get the children of a process (empty if it's gone)."""
+    from contextlib import suppress
+    from os import listdir
+    from os.path import join
+
+    children: "List[int]" = []
+    try:
+        tasks = listdir(join(PROC, str(pid), "task"))
+    except OSError:
+        return children
+
+    for tid in tasks:
+        path = join(PROC, str(pid), "task", tid, "children")
+        with suppress(OSError), open(path, "r") as file:
+            children.extend(int(child) for child in file.read().split())
+
+    return children
+
+
+def read_cpu_frequency() -> "Optional[float]":
+    """Get the mean current frequency of the host's CPUs, in MHz."""
+    from contextlib import suppress
+    from glob import glob
+
+    frequencies: "List[float]" = []
+    for path in glob("/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"):
+        with suppress(OSError, ValueError), open(path, "r") as file:
+            frequencies.append(int(file.read()) / 1000)
+
+    if not frequencies:
+        with suppress(OSError, ValueError), open(f"{PROC}/cpuinfo", "r") as file:
+            frequencies = [
+                float(line.split(":")[1]) for line in file if line.startswith("cpu MHz")
+            ]
+
+    return sum(frequencies) / len(frequencies) if frequencies else None
+
+
+class ResourceSampler:
+    """
+    Samples the resource usage of process trees in a background thread.
+
+    Every `interval` seconds the `/proc` entries of the watched process and of all
+    its descendants are read: the samples record the tree's CPU utilization, RSS,
+    the largest peak RSS of its processes, page faults, context switches and I/O,
+    and the host's CPU frequency. The counters of processes which exited keep
+    their last sampled value.
+
+    The summary totals come from `getrusage(RUSAGE_CHILDREN)` instead, which also
+    accounts for processes too short-lived to be sampled: the watched process must
+    be waited for before sampling is stopped, and no other child process of this
+    process may be waited for meanwhile.
+
+    A sampler can watch several processes, one after another (e.g. the commands of
+    a preset run): their samples make up a single time series.
+    """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        """
+        Create a ResourceSampler.
+
+        :param interval: the time between samples, in seconds.
+        """
+        from time import monotonic
+
+        self.interval = interval
+        self.samples: "List[Dict[str, Any]]" = []
+        self.totals = dict.fromkeys(COUNTERS, 0.0)
+        self.usage = {
+            "cpu_time": 0.0,
+            "minor_faults": 0.0,
+            "major_faults": 0.0,
+            "ctx_switches": 0.0,
+            "read_bytes": 0.0,
+            "write_bytes": 0.0,
+            "peak_rss": 0.0,
+            "wall_time": 0.0,
+        }
+        self._start = monotonic()
+        self._task = 0
+        self._thread: "Optional[Thread]" = None
+        self._stop: "Optional[Event]" = None
+        self._task_start: "Optional[Tuple[float, struct_rusage]]" = None
+
+    def start(self, pid: int) -> None:
+        """Start sampling a process tree (stopping sampling the previous one)."""
+        from resource import getrusage, RUSAGE_CHILDREN
+        from threading import Event, Thread
+        from time import monotonic
+
+        self.stop()
+
+        self._task += 1
+        self._task_start = (monotonic(), getrusage(RUSAGE_CHILDREN))
+        self._stop = Event()
+        self._thread = Thread(
+            target=self._sample_tree, args=(pid, self._stop), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling, waiting for the last sample."""
+        from resource import getrusage, RUSAGE_CHILDREN
+        from time import monotonic
+
+        if self._thread is None or self._stop is None or self._task_start is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        start, before = self._task_start
+        after = getrusage(RUSAGE_CHILDREN)
+        self.usage["wall_time"] += monotonic() - start
+        self.usage["cpu_time"] += (after.ru_utime + after.ru_stime) - (
+            before.ru_utime + before.ru_stime
+        )
+        self.usage["minor_faults"] += after.ru_minflt - before.ru_minflt
+        self.usage["major_faults"] += after.ru_majflt - before.ru_majflt
+        self.usage["ctx_switches"] += (after.ru_nvcsw + after.ru_nivcsw) - (
+            before.ru_nvcsw + before.ru_nivcsw
+        )
+        # Blocks are 512 bytes long
+        self.usage["read_bytes"] += (after.ru_inblock - before.ru_inblock) * 512
+        self.usage["write_bytes"] += (after.ru_oublock - before.ru_oublock) * 512
+        # The maximum RSS (in KiB) of any child so far: only meaningful if it grew,
+        # the processes' own peak RSS is sampled otherwise
+        if after.ru_maxrss > before.ru_maxrss:
+            self.usage["peak_rss"] = max(
+                self.usage["peak_rss"], after.ru_maxrss * 1024.0
+            )
+        self._task_start = None
+
+    def summarize(self) -> "Dict[str, float]":
+        """
+        Summarize the resource usage into stats.
+
+        :returns: the CPU time (in seconds), the mean CPU utilization (in percent of
+            a CPU), the page faults, context switches and I/O bytes, the peak RSS
+            (in MiB, the sum over the process tree or the largest process' peak,
+            whichever is bigger) if known, and, if there are samples, the maximum
+            sampled CPU utilization and the mean CPU frequency (in MHz).
+        """
+        from statistics import fmean
+
+        if not self.usage["wall_time"]:
+            return {}
+
+        summary = {
+            "proc_cpu_time": self.usage["cpu_time"],
+            "proc_cpu_percent_mean": 100
+            * self.usage["cpu_time"]
+            / self.usage["wall_time"],
+            "proc_minor_faults": self.usage["minor_faults"],
+            "proc_major_faults": self.usage["major_faults"],
+            "proc_ctx_switches": self.usage["ctx_switches"],
+            "proc_read_bytes": self.usage["read_bytes"],
+            "proc_write_bytes": self.usage["write_bytes"],
+        }
+
+        peak_rss = max(
+            [self.usage["peak_rss"]]
+            + [max(s["rss"], s["peak_rss"]) for s in self.samples]
+        )
+        if peak_rss:
+            summary["proc_peak_rss_mb"] = peak_rss / 1024**2
+
+        if self.samples:
+            summary["proc_cpu_percent_max"] = max(
+                s["cpu_percent"] for s in self.samples
+            )
+
+        frequencies = [s["cpu_mhz"] for s in self.samples if s["cpu_mhz"] is not None]
+        if frequencies:
+            summary["host_cpu_mhz_mean"] = fmean(frequencies)
+
+        return summary
+
+    def _sample_tree(self, pid: int, stop: "Event") -> None:
+        """Sample a process tree until it's gone or sampling is stopped."""
+        from time import monotonic
+
+        last: "Dict[int, Dict[str, float]]" = {}
+        totals = dict(self.totals)
+        previous_time = monotonic()
+        previous_cpu_time = totals["cpu_time"]
+
+        while True:
+            stopping = stop.wait(self.interval)
+
+            pids: "Set[int]" = set()
+            pending = [pid]
+            rss = 0.0
+            while pending:
+                current = pending.pop()
+                usage = read_process(current) if current not in pids else None
+                if usage is None:
+                    continue
+
+                pids.add(current)
+                # Exited processes (not yet waited for) have no peak RSS anymore
+                if current in last:
+                    usage["peak_rss"] = max(
+                        usage.get("peak_rss", 0.0), last[current].get("peak_rss", 0.0)
+                    )
+                last[current] = usage
+                rss += usage["rss"]
+                pending.extend(get_children(current))
+
+            if not pids:
+                return
+
+            # Exited processes count with their last sampled counters
+            counters = {
+                counter: totals[counter]
+                + sum(usage.get(counter, 0.0) for usage in last.values())
+                for counter in COUNTERS
+            }
+
+            now = monotonic()
+            self.samples.append(
+                {
+                    "time": now - self._start,
+                    "task": self._task,
+                    "elapsed": now - previous_time,
+                    "processes": len(pids),
+                    "rss": rss,
+                    "peak_rss": max(
+                        usage.get("peak_rss", usage["rss"]) for usage in last.values()
+                    ),
+                    "cpu_percent": 100
+                    * (counters["cpu_time"] - previous_cpu_time)
+                    / max(now - previous_time, 1e-9),
+                    "cpu_mhz": read_cpu_frequency(),
+                    **counters,
+                }
+            )
+            self.totals = counters
+            previous_time = now
+            previous_cpu_time = counters["cpu_time"]
+
+            if stopping:
+                return
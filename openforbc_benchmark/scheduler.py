@@ -0,0 +1,108 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`scheduler` module runs jobs concurrently according to their resource needs."""
+
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+    from typing import Callable, Dict, Iterator, List, Optional, Tuple
+    from openforbc_benchmark.json import ResourcesDefinition
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def get_available_cores() -> int:
+    """Get the number of CPU cores this process is allowed to run on."""
+    from os import cpu_count
+
+    try:
+        from os import sched_getaffinity
+
+        return len(sched_getaffinity(0))
+    except ImportError:
+        return cpu_count() or 1
+
+
+class ResourceScheduler:
+    """
+    A first-come first-served scheduler for jobs with resource requirements.
+
+    Jobs are started in order as soon as there are enough free cores and a free job
+    slot: a job never overtakes the ones before it. Exclusive jobs wait for all the
+    running jobs to finish and no other job is started until they are done.
+    """
+
+    def __init__(self, jobs: int, cores: "Optional[int]" = None) -> None:
+        """
+        Create a ResourceScheduler.
+
+        :param jobs: maximum number of jobs running at the same time.
+        :param cores: number of CPU cores available to the jobs (defaults to the
+            cores available to this process).
+        """
+        self.jobs = max(jobs, 1)
+        self.cores = cores if cores is not None else get_available_cores()
+
+    def run(
+        self,
+        executor: "Executor",
+        function: "Callable[[T], R]",
+        jobs: "List[Tuple[T, ResourcesDefinition]]",
+    ) -> "Iterator[Tuple[int, R]]":
+        """
+        Run jobs on an executor.
+
+        :param executor: the executor used to run the jobs.
+        :param function: the function called (in the executor) for each job.
+        :param jobs: a list of job arguments with their resource requirements.
+        :returns: an iterator into tuples containing a job's index and its result, in
+            completion order.
+        :raises Exception: the first exception raised by a job. Jobs which were already
+            running are waited for, while pending ones are never started.
+        """
+        from collections import deque
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        pending = deque(enumerate(jobs))
+        running: "Dict[Future[R], Tuple[int, int, bool]]" = {}
+        free = self.cores
+        error: "Optional[BaseException]" = None
+
+        while pending or running:
+            while pending and error is None and len(running) < self.jobs:
+                index, (arg, resources) = pending[0]
+                cores = self.cores if resources.exclusive else self._cores(resources)
+                exclusive_running = any(x for _, _, x in running.values())
+                if exclusive_running or cores > free:
+                    break
+
+                pending.popleft()
+                running[executor.submit(function, arg)] = (
+                    index,
+                    cores,
+                    resources.exclusive,
+                )
+                free -= cores
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, cores, _ = running.pop(future)
+                free += cores
+
+                if future.exception() is not None:
+                    error = error or future.exception()
+                elif error is None:
+                    yield index, future.result()
+
+        if error is not None:
+            raise error
+
+    def _cores(self, resources: "ResourcesDefinition") -> int:
+        """Get the number of cores a job uses (no more than the available cores)."""
+        return min(resources.cores or 1, self.cores)
@@ -0,0 +1,144 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`setup_stamps` module memoizes benchmark setup commands."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, List, Optional
+    from openforbc_benchmark.utils import Runnable
+
+SETUP_STAMPS_VERSION = 1
+
+# Name of the stamps file, in the benchmark's directory
+STAMPS_FILE = ".setup-stamps.json"
+
+
+class SetupStamps:
+    """
+    The stamps of a benchmark's setup commands, which tell whether they're up to date.
+
+    The stamp of each command (identified by its position in the setup) records
+    the command itself and the hashes of its inputs (the declared ones and the
+    files in its arguments, e.g. its script) and outputs. A command is up to date
+    while its stamp is valid: the command, its inputs and its outputs are unchanged
+    and the commands before it are up to date as well.
+    """
+
+    def __init__(self, dir: str, reset: bool = False) -> None:
+        """
+        Load the setup stamps of a benchmark.
+
+        :param dir: the benchmark's directory.
+        :param reset: `True` to discard the stamps (running the whole setup again).
+        """
+        from os.path import join
+
+        self.dir = dir
+        self.path = join(dir, STAMPS_FILE)
+        self._stamps: "List[Dict[str, Any]]" = [] if reset else self._load()
+
+    def is_valid(
+        self,
+        step: int,
+        task: "Runnable",
+        inputs: "Optional[List[str]]" = None,
+        outputs: "Optional[List[str]]" = None,
+    ) -> bool:
+        """
+        Check whether a setup command is up to date.
+
+        :param step: the position of the command in the setup.
+        :param inputs: the declared inputs of the command, relative to its cwd.
+        :param outputs: the declared outputs of the command, relative to its cwd.
+        """
+        if step >= len(self._stamps):
+            return False
+
+        stamp = self._get_stamp(task, inputs, outputs)
+        return None not in stamp["outputs"].values() and stamp == self._stamps[step]
+
+    def invalidate(self, step: int) -> None:
+        """Invalidate the stamps of a setup command and of the ones after it."""
+        if step < len(self._stamps):
+            del self._stamps[step:]
+            self._save()
+
+    def record(
+        self,
+        step: int,
+        task: "Runnable",
+        inputs: "Optional[List[str]]" = None,
+        outputs: "Optional[List[str]]" = None,
+    ) -> None:
+        """Record the stamp of a setup command which has just been run."""
+        del self._stamps[step:]
+        if step == len(self._stamps):
+            self._stamps.append(self._get_stamp(task, inputs, outputs))
+            self._save()
+
+    def _get_stamp(
+        self,
+        task: "Runnable",
+        inputs: "Optional[List[str]]",
+        outputs: "Optional[List[str]]",
+    ) -> "Dict[str, Any]":
+        """Get the current stamp of a setup command."""
+        from hashlib import sha256
+        from json import dumps
+        from os.path import isfile, join, relpath
+
+        from openforbc_benchmark.utils import hash_path
+
+        cwd = join(self.dir, task.cwd or "")
+
+        def hash_paths(paths: "List[str]") -> "Dict[str, Optional[str]]":
+            return {
+                relpath(join(cwd, path), self.dir): hash_path(join(cwd, path))
+                for path in paths
+            }
+
+        command = {
+            "args": task.args,
+            "env": task.env,
+            "cwd": relpath(cwd, self.dir),
+            "path": task.path,
+        }
+        return {
+            "command": sha256(dumps(command, sort_keys=True).encode()).hexdigest(),
+            "inputs": hash_paths(
+                [arg for arg in task.args if isfile(join(cwd, arg))] + (inputs or [])
+            ),
+            "outputs": hash_paths(outputs or []),
+        }
+
+    def _load(self) -> "List[Dict[str, Any]]":
+        """Load the stamps from the stamps file (none if it's missing or invalid)."""
+        from json import load
+
+        try:
+            with open(self.path, "r") as file:
+                json = load(file)
+        except (OSError, ValueError):
+            return []
+
+        if not isinstance(json, dict) or json.get("version") != SETUP_STAMPS_VERSION:
+            return []
+
+        stamps = json.get("stamps")
+        return stamps if isinstance(stamps, list) else []
+
+    def _save(self) -> None:
+        """Save the stamps into the stamps file."""
+        from json import dumps
+        from os import replace
+        from tempfile import NamedTemporaryFile
+
+        # Concurrent setups of the benchmark (e.g. parallel suite jobs) each write
+        # their own temporary file
+        with NamedTemporaryFile(
+            "w", dir=self.dir, prefix=STAMPS_FILE, suffix=".tmp", delete=False
+        ) as file:
+            file.write(dumps({"version": SETUP_STAMPS_VERSION, "stamps": self._stamps}))
+        replace(file.name, self.path)
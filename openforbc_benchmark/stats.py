@@ -0,0 +1,231 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`stats` module extracts benchmark stats from their output while it's produced."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from re import Pattern
+    from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+    from openforbc_benchmark.analysis import Distribution
+    from openforbc_benchmark.json import StatMatchInfo
+
+# Longer (incomplete) lines are truncated, keeping their end
+MAX_LINE_LENGTH = 1024 * 1024
+
+# Environment variable holding the stats channel's file descriptor
+STATS_FD_ENV = "O4BCB_STATS_FD"
+
+
+class StatMatcher:
+    """
+    Matches stats regexes against a stream of output, a line at a time.
+
+    Each stat's regex is compiled once and searched in every new line (or in the
+    window made of the last `lines` lines, for multiline stats) until it matches:
+    the first match is the stat's value. Only a fixed number of lines is kept in
+    memory, whatever the output size.
+    """
+
+    def __init__(
+        self,
+        matches: "Dict[str, StatMatchInfo]",
+        on_match: "Optional[Callable[[str, Union[int, float]], Any]]" = None,
+    ) -> None:
+        """
+        Create a StatMatcher.
+
+        :param matches: the stats' match info. Stats read from a `file` are only
+            matched by `get_stats()`, after the output.
+        :param on_match: called with a stat's name and value as soon as it matches.
+        """
+        from codecs import getincrementaldecoder
+        from collections import deque
+        from re import compile
+
+        self.matches = matches
+        self.on_match = on_match
+        self.stats: "Dict[str, Union[int, float]]" = {}
+
+        self._pending: "Dict[str, Tuple[Pattern[str], int]]" = {
+            name: (compile(match.regex), match.lines or 1)
+            for name, match in matches.items()
+            if match.file is None
+        }
+        self._window: "Deque[str]" = deque(
+            maxlen=max((lines for _, lines in self._pending.values()), default=1)
+        )
+        self._partial = ""
+        self._decoder = getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, chunk: bytes) -> None:
+        """Match a chunk of (UTF-8) output."""
+        self.feed_text(self._decoder.decode(chunk))
+
+    def feed_text(self, text: str) -> None:
+        """Match a chunk of output text."""
+        if not self._pending:
+            return
+
+        # Universal newlines, as when reading the output from a file in text mode
+        lines = (
+            (self._partial + text).replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        )
+        self._partial = lines.pop()[-MAX_LINE_LENGTH:]
+
+        for line in lines:
+            self._match_line(line)
+            if not self._pending:
+                break
+
+    def close(self) -> None:
+        """Match the last (incomplete) line of output."""
+        self.feed_text(self._decoder.decode(b"", final=True))
+        if self._partial:
+            self._match_line(self._partial)
+            self._partial = ""
+
+    def get_stats(
+        self, dir: "Optional[str]" = None, partial: bool = False
+    ) -> "Dict[str, Union[int, float]]":
+        """
+        Get the matched stats, matching the ones read from files first.
+
+        :param dir: the directory the stats files are relative to.
+        :param partial: `True` to only get the stats which matched (e.g. in the
+            output of a benchmark which timed out), skipping missing stats files.
+        :raises BenchmarkStatsMatchError: if a stat's regex couldn't match.
+        """
+        from os.path import isfile, join
+
+        from openforbc_benchmark.benchmark import BenchmarkStatsMatchError
+
+        self.close()
+
+        files: "List[str]" = []
+        for match in self.matches.values():
+            if match.file is not None and match.file not in files:
+                files.append(match.file)
+        for file in files:
+            path = join(dir, file) if dir is not None else file
+            if partial and not isfile(path):
+                continue
+            self._match_file(path, file)
+
+        for name in self.matches:
+            if name not in self.stats and not partial:
+                raise BenchmarkStatsMatchError(
+                    f'No match for stat "{name}" in benchmark output'
+                )
+
+        return {name: self.stats[name] for name in self.matches if name in self.stats}
+
+    def _match_line(self, line: str) -> None:
+        """Search the pending stats' regexes in a new line."""
+        self._window.append(line)
+        window: "Optional[List[str]]" = None
+
+        for name, (regex, lines) in list(self._pending.items()):
+            if lines == 1:
+                m = regex.search(line)
+            else:
+                window = window if window is not None else list(self._window)
+                m = regex.search("\n".join(window[-lines:]))
+
+            if m is not None:
+                del self._pending[name]
+                self._set_stat(name, m.group(1))
+
+    def _match_file(self, path: str, file: str) -> None:
+        """
+        Match the stats read from a file.
+
+        :param path: the file path.
+        :param file: the `file` of the stats to be matched.
+        """
+        from openforbc_benchmark.json import StatMatchInfo
+
+        matcher = StatMatcher(
+            {
+                name: StatMatchInfo(match.regex, lines=match.lines)
+                for name, match in self.matches.items()
+                if match.file == file
+            },
+            self.on_match,
+        )
+
+        with open(path, "rb") as stats_file:
+            while matcher._pending and (chunk := stats_file.read(64 * 1024)):
+                matcher.feed(chunk)
+
+        matcher.close()
+        self.stats.update(matcher.stats)
+
+    def _set_stat(self, name: str, number: str) -> None:
+        """Set a matched stat's value."""
+        self.stats[name] = float(number) if "." in number else int(number)
+        if self.on_match is not None:
+            self.on_match(name, self.stats[name])
+
+
+class SeriesCollector:
+    """
+    Collects the samples benchmarks write into the stats channel.
+
+    The channel carries newline-delimited JSON records such as
+    `{"stat": "latency", "value": 0.012, "time": 12.5, "count": 32}`, where `time`
+    (in seconds) and `count` (the number of items the sample accounts for) are
+    optional. Records without a `time` are timestamped when they're read. Invalid
+    records are counted and skipped.
+    """
+
+    def __init__(self) -> None:
+        """Create a SeriesCollector."""
+        from time import monotonic
+
+        self.distributions: "Dict[str, Distribution]" = {}
+        self.errors = 0
+        self._partial = b""
+        self._start = monotonic()
+
+    def feed(self, chunk: bytes) -> None:
+        """Collect the records in a chunk of the channel's data."""
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()[-MAX_LINE_LENGTH:]
+
+        for line in lines:
+            self._add_record(line)
+
+    def close(self) -> None:
+        """Collect the last (unterminated) record."""
+        if self._partial:
+            self._add_record(self._partial)
+            self._partial = b""
+
+    def _add_record(self, line: bytes) -> None:
+        """Parse a record and add its sample."""
+        from json import loads
+        from time import monotonic
+
+        from openforbc_benchmark.analysis import Distribution
+
+        if not line.strip():
+            return
+
+        try:
+            record = loads(line)
+            stat = record["stat"]
+            value = record["value"]
+            timestamp = record.get("time", monotonic() - self._start)
+            count = record.get("count", 1)
+            if not isinstance(stat, str) or not all(
+                isinstance(x, (int, float)) and not isinstance(x, bool)
+                for x in (value, timestamp, count)
+            ):
+                raise TypeError(line)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.errors += 1
+            return
+
+        self.distributions.setdefault(stat, Distribution()).add(value, timestamp, count)
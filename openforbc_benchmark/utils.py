@@ -4,7 +4,9 @@
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from typing import Dict, Iterable, List, Optional
+    from typing import Any, Callable, Dict, Iterable, List, Optional
+    from openforbc_benchmark.json import PlacementDefinition
+    from openforbc_benchmark.placement import Placement
 
 
 from os import environ
@@ -16,6 +18,8 @@ class PopenArgs(TypedDict):
     args: "List[str]"
     cwd: "Optional[str]"
     env: "Optional[Dict[str, str]]"
+    preexec_fn: "Optional[Callable[[], Any]]"
+    start_new_session: bool
 
 
 class Runnable:
@@ -23,7 +27,8 @@ class Runnable:
     A runnable command.
 
     Contains command arguments and environment data, such as the current working
-    directory, environment variables and additional PATH entries.
+    directory, environment variables, additional PATH entries and the CPUs/NUMA node
+    the command runs on, along with the time the command is given to finish.
     """
 
     def __init__(
@@ -32,11 +37,15 @@ class Runnable:
         cwd: "Optional[str]" = None,
         env: "Optional[Dict[str, str]]" = None,
         path: "List[str]" = [],
+        placement: "Optional[PlacementDefinition]" = None,
+        timeout: "Optional[float]" = None,
     ) -> None:
         self.args = args
         self.cwd = cwd
         self.env = env
         self.path = path
+        self.placement = placement
+        self.timeout = timeout
 
     def __repr__(self) -> str:
         venv = False
@@ -65,8 +74,22 @@ class Runnable:
         """Return the contatenated args."""
         return argv_join(self.args)
 
+    def get_placement(self) -> "Optional[Placement]":
+        """
+        Resolve the command's placement on this host.
+
+        :raises PlacementError: if the placement can't be applied.
+        """
+        from openforbc_benchmark.placement import Placement
+
+        return Placement.resolve(self.placement) if self.placement is not None else None
+
     def into_popen_args(self, env: "Dict[str, str]" = environ.copy()) -> PopenArgs:
-        """Transform into subprocess.Popen init args."""
+        """
+        Transform into subprocess.Popen init args.
+
+        :raises PlacementError: if the command's placement can't be applied.
+        """
         from os.path import abspath
 
         if self.path:
@@ -81,13 +104,105 @@ class Runnable:
         if self.env is not None:
             env.update(self.env)
 
+        placement = self.get_placement()
+
         return {
-            "args": self.args,
+            "args": placement.get_command(self.args)
+            if placement is not None
+            else self.args,
             "cwd": self.cwd,
             "env": env if self.path or self.env is not None else None,
+            "preexec_fn": placement.get_preexec_fn() if placement is not None else None,
+            # Commands which may time out get a process group to be killed with
+            "start_new_session": self.timeout is not None,
         }
 
 
+def get_cache_dir() -> str:
+    """
+    Get the directory used to store the tool's caches.
+
+    Defaults to `$XDG_CACHE_HOME/openforbc-benchmark` and can be overridden by
+    setting the `O4BCB_CACHE` environment variable.
+    """
+    from os.path import expanduser, join
+
+    if "O4BCB_CACHE" in environ:
+        return environ["O4BCB_CACHE"]
+
+    return join(
+        environ.get("XDG_CACHE_HOME", expanduser(join("~", ".cache"))),
+        "openforbc-benchmark",
+    )
+
+
+def get_new_log_path(kind: str, name: str, extension: str = "") -> str:
+    """
+    Get a new path into the `logs/<kind>` directory of the current directory.
+
+    The path is named after `name` and the current date and time, with a numeric
+    suffix if the path already exists.
+
+    :param extension: the extension of the path (including the dot).
+    """
+    from datetime import datetime
+    from os import getcwd
+    from os.path import exists, join
+    from re import sub
+
+    prefix = join(
+        getcwd(),
+        "logs",
+        kind,
+        f"{sub(r'[^A-Za-z0-9_.-]+', '_', name)}_{datetime.now():%Y%m%d_%H%M%S}",
+    )
+    path = f"{prefix}{extension}"
+    i = 0
+    while exists(path):
+        i += 1
+        path = f"{prefix}.{i}{extension}"
+
+    return path
+
+
+def hash_file(path: str) -> str:
+    """Get the SHA-256 hash of a file's content."""
+    from hashlib import sha256
+
+    digest = sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(64 * 1024):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def hash_path(path: str) -> "Optional[str]":
+    """
+    Get the SHA-256 hash of a file's or a directory tree's content.
+
+    :returns: the hash, or `None` if the path doesn't exist.
+    """
+    from hashlib import sha256
+    from os import walk
+    from os.path import isdir, isfile, join, relpath
+
+    if isfile(path):
+        return hash_file(path)
+    if not isdir(path):
+        return None
+
+    digest = sha256()
+    for root, dirs, files in walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file = join(root, name)
+            if isfile(file):
+                digest.update(f"{relpath(file, path)}\0{hash_file(file)}\0".encode())
+
+    return digest.hexdigest()
+
+
 def argv_join(argv: "Iterable[str]") -> str:
     """
     Return a shell-escaped string from *argv*.
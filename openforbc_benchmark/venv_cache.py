@@ -0,0 +1,341 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`venv_cache` module shares benchmark virtualenvs through a content-addressed cache."""
+
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+    from openforbc_benchmark.benchmark import Benchmark
+
+VENV_CACHE_VERSION = 1
+
+# Default maximum size of the cached virtualenvs, in bytes
+DEFAULT_MAX_SIZE = 10 * 1024**3
+
+# Environment variable overriding the maximum size, in GiB
+MAX_SIZE_ENV = "O4BCB_VENV_CACHE_SIZE"
+
+
+@lru_cache(maxsize=None)
+def get_python_version() -> str:
+    """Get the version of the `python3` interpreter virtualenvs are created with."""
+    from shutil import which
+    from subprocess import PIPE, run
+
+    python = which("python3")
+    if python is None:
+        return "unknown"
+
+    result = run(
+        [python, "-c", "import platform, sys; print(sys.version, platform.machine())"],
+        stdout=PIPE,
+    )
+    return result.stdout.decode().strip()
+
+
+def get_venv_key(benchmark: "Benchmark") -> str:
+    """
+    Get the cache key of a benchmark's virtualenv.
+
+    The key is derived from the benchmark's `requirements.txt`, its setup commands
+    (along with the content of the files they refer to, e.g. setup scripts) and
+    the Python version.
+    """
+    from hashlib import sha256
+    from json import dumps
+    from os.path import exists, isfile, join, relpath
+
+    from openforbc_benchmark.utils import hash_file
+
+    requirements = join(benchmark.dir, "requirements.txt")
+    commands: "List[Dict[str, Any]]" = []
+    files: "Dict[str, str]" = {}
+    for command in benchmark.setup_commands or []:
+        runnable = command.into_runnable()
+        cwd = join(benchmark.dir, runnable.cwd or "")
+        commands.append(
+            {"args": runnable.args, "env": runnable.env, "cwd": runnable.cwd}
+        )
+        for arg in runnable.args:
+            path = join(cwd, arg)
+            if isfile(path):
+                files[relpath(path, benchmark.dir)] = hash_file(path)
+
+    return sha256(
+        dumps(
+            {
+                "version": VENV_CACHE_VERSION,
+                "python": get_python_version(),
+                "requirements": hash_file(requirements)
+                if exists(requirements)
+                else None,
+                "setup": commands,
+                "files": files,
+            },
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()[:32]
+
+
+class VenvCache:
+    """
+    A cache of virtualenvs keyed by their content (see `get_venv_key`).
+
+    Each virtualenv is built once, in its own directory, and becomes read-only
+    when its build is committed: benchmarks with an identical setup then share it.
+    Builds are serialized by an exclusive lock, while the runs using a virtualenv
+    hold a shared lock which prevents its eviction. When the cache grows over
+    `max_size` the least recently used virtualenvs are evicted.
+    """
+
+    def __init__(
+        self, dir: "Optional[str]" = None, max_size: "Optional[int]" = None
+    ) -> None:
+        """
+        Create a VenvCache.
+
+        :param dir: the cache directory (defaults to `venvs` in the cache dir).
+        :param max_size: the maximum size of the cache, in bytes (defaults to the
+            `O4BCB_VENV_CACHE_SIZE` environment variable, in GiB, or 10 GiB).
+        """
+        from os import environ
+        from os.path import join
+
+        from openforbc_benchmark.utils import get_cache_dir
+
+        self.dir = dir if dir is not None else join(get_cache_dir(), "venvs")
+        if max_size is None:
+            max_size = (
+                int(float(environ[MAX_SIZE_ENV]) * 1024**3)
+                if MAX_SIZE_ENV in environ
+                else DEFAULT_MAX_SIZE
+            )
+        self.max_size = max_size
+
+    def get_path(self, key: str) -> str:
+        """Get the path of a cached virtualenv."""
+        from os.path import join
+
+        return join(self.dir, key)
+
+    def is_ready(self, key: str) -> bool:
+        """Check whether a virtualenv has been built (and committed)."""
+        from os.path import exists
+
+        return exists(self._get_file(key, "json"))
+
+    def acquire(self, key: str) -> "IO[bytes]":
+        """
+        Mark a virtualenv as used, preventing its eviction.
+
+        :returns: a file holding the lock: the virtualenv is in use until it's
+            closed.
+        """
+        from fcntl import flock, LOCK_SH
+
+        file = self._open_lock(key, "use")
+        flock(file, LOCK_SH)
+        return file
+
+    @contextmanager
+    def lock(self, key: str) -> "Iterator[None]":
+        """Lock a virtualenv to check whether it's built and build it."""
+        from fcntl import flock, LOCK_EX
+
+        with self._open_lock(key, "lock") as file:
+            flock(file, LOCK_EX)
+            yield
+
+    def clear(self, key: str) -> None:
+        """Remove a virtualenv (e.g. the leftovers of its failed build)."""
+        from os import remove
+        from os.path import exists
+
+        if self.is_ready(key):
+            remove(self._get_file(key, "json"))
+        if exists(self.get_path(key)):
+            remove_tree(self.get_path(key))
+
+    def try_clear(self, key: str) -> bool:
+        """
+        Remove a virtualenv unless it's in use (or being built).
+
+        :returns: `True` if the virtualenv has been removed.
+        """
+        with self._try_lock(key) as locked:
+            if locked:
+                self.clear(key)
+
+        return locked
+
+    def commit(self, key: str) -> None:
+        """Mark a virtualenv as built, making it read-only, then evict old ones."""
+        from json import dumps
+        from os import replace
+        from tempfile import NamedTemporaryFile
+        from time import time
+
+        path = self.get_path(key)
+        size = get_tree_size(path)
+        make_read_only(path)
+
+        with NamedTemporaryFile(
+            "w", dir=self.dir, prefix=f"{key}.", suffix=".tmp", delete=False
+        ) as file:
+            file.write(dumps({"size": size, "created": time()}))
+        replace(file.name, self._get_file(key, "json"))
+
+        self.evict(keep=key)
+
+    def touch(self, key: str) -> None:
+        """Mark a virtualenv as just used."""
+        from os import utime
+
+        utime(self._get_file(key, "json"))
+
+    def get_entries(self) -> "List[Tuple[str, int, float]]":
+        """Get the key, size and last use time of each built virtualenv."""
+        from json import load
+        from os import listdir, stat
+        from os.path import join
+
+        entries: "List[Tuple[str, int, float]]" = []
+        for name in listdir(self.dir) if self._exists() else []:
+            if not name.endswith(".json"):
+                continue
+
+            try:
+                path = join(self.dir, name)
+                with open(path, "r") as file:
+                    size = int(load(file)["size"])
+                entries.append((name[:-5], size, stat(path).st_mtime))
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+        return entries
+
+    def evict(self, keep: "Optional[str]" = None) -> "List[str]":
+        """
+        Evict the least recently used virtualenvs until the cache fits its size.
+
+        Virtualenvs in use (or being built) are never evicted, while the leftovers
+        of failed builds always are.
+
+        :param keep: a virtualenv which mustn't be evicted.
+        :returns: the keys of the evicted virtualenvs.
+        """
+        from os import listdir, remove
+        from os.path import isdir, join
+
+        evicted: "List[str]" = []
+        entries = sorted(self.get_entries(), key=lambda entry: entry[2])
+        built = {key for key, _, _ in entries}
+
+        orphans = [
+            name
+            for name in (listdir(self.dir) if self._exists() else [])
+            if isdir(join(self.dir, name)) and name not in built and name != keep
+        ]
+        for key in orphans:
+            with self._try_lock(key) as locked:
+                if locked:
+                    remove_tree(self.get_path(key))
+                    evicted.append(key)
+
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+
+            with self._try_lock(key) as locked:
+                if not locked:
+                    continue
+
+                remove(self._get_file(key, "json"))
+                remove_tree(self.get_path(key))
+                evicted.append(key)
+                total -= size
+
+        return evicted
+
+    def _exists(self) -> bool:
+        """Check whether the cache directory exists."""
+        from os.path import isdir
+
+        return isdir(self.dir)
+
+    def _get_file(self, key: str, extension: str) -> str:
+        """Get the path of one of a virtualenv's bookkeeping files."""
+        from os.path import join
+
+        return join(self.dir, f"{key}.{extension}")
+
+    def _open_lock(self, key: str, kind: str) -> "IO[bytes]":
+        """Open (creating it) one of a virtualenv's lock files."""
+        from os import makedirs
+
+        makedirs(self.dir, exist_ok=True)
+        return open(self._get_file(key, kind), "ab")  # noqa: SIM115
+
+    @contextmanager
+    def _try_lock(self, key: str) -> "Iterator[bool]":
+        """Try to lock a virtualenv for eviction (it mustn't be in use)."""
+        from fcntl import flock, LOCK_EX, LOCK_NB
+
+        with self._open_lock(key, "use") as file:
+            try:
+                flock(file, LOCK_EX | LOCK_NB)
+            except OSError:
+                yield False
+            else:
+                yield True
+
+
+def get_tree_size(path: str) -> int:
+    """Get the size of the files in a directory tree, in bytes."""
+    from os import lstat, walk
+    from os.path import join
+
+    return sum(
+        lstat(join(root, name)).st_size
+        for root, _, files in walk(path)
+        for name in files
+    )
+
+
+def make_read_only(path: str) -> None:
+    """Remove the write permissions from a directory tree (except its symlinks)."""
+    from os import chmod, lstat, walk
+    from os.path import islink, join
+    from stat import S_IWGRP, S_IWOTH, S_IWUSR
+
+    write = S_IWUSR | S_IWGRP | S_IWOTH
+    for root, dirs, files in walk(path, topdown=False):
+        for name in files + dirs:
+            entry = join(root, name)
+            if not islink(entry):
+                chmod(entry, lstat(entry).st_mode & ~write)
+    chmod(path, lstat(path).st_mode & ~write)
+
+
+def remove_tree(path: str) -> None:
+    """Remove a (possibly read-only) directory tree."""
+    from os import chmod, lstat, walk
+    from os.path import islink, join
+    from shutil import rmtree
+    from stat import S_IRWXU
+
+    chmod(path, lstat(path).st_mode | S_IRWXU)
+    for root, dirs, _ in walk(path):
+        for name in dirs:
+            entry = join(root, name)
+            if not islink(entry):
+                chmod(entry, lstat(entry).st_mode | S_IRWXU)
+
+    rmtree(path)
@@ -0,0 +1,241 @@
+# Copyright (c) 2021-2022 Istituto Nazionale di Fisica Nucleare
+# SPDX-License-Identifier: MIT
+
+"""`worker` module runs presets in long-lived benchmark processes."""
+
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.utils import Runnable
+
+if TYPE_CHECKING:
+    from subprocess import Popen
+    from threading import Thread
+    from typing import Any, BinaryIO, Callable, Optional, Tuple
+    from openforbc_benchmark.stats import SeriesCollector
+
+
+class WorkerError(Exception):
+    """The worker exited or broke the protocol."""
+
+    pass
+
+
+class WorkerTimeout(WorkerError):
+    """The command run by the worker timed out, the worker has been killed."""
+
+    pass
+
+
+class WorkerRestart(WorkerError):
+    """The worker can't run the command in its process, a fresh worker has to."""
+
+    pass
+
+
+class WorkerTask(Runnable):
+    """
+    A run command which is executed by the benchmark's worker.
+
+    The worker runs the command (e.g. a Python script) in its own process instead
+    of spawning a new one.
+    """
+
+    def __repr__(self) -> str:
+        return f"(worker) {super().__repr__()}"
+
+
+class BenchmarkWorker:
+    """
+    A long-lived benchmark process which runs the commands it's sent.
+
+    Commands are sent as newline-delimited JSON requests into the worker's stdin
+    (`{"id": 1, "args": [...], "env": {...}, "cwd": "..."}`), and the worker
+    replies through the stats channel (`{"id": 1, "status": 0, "output": "..."}`,
+    where `output` is the command's stdout) after any sample the command wrote
+    into it. A worker which can't run a command in its process (e.g. because of
+    process-wide settings it can't change anymore) replies `{"id": 1, "restart":
+    true}` instead, without running it. The worker exits when its stdin is closed.
+
+    The worker's own stdout and stderr are pumped into log files for its whole
+    lifetime.
+    """
+
+    def __init__(
+        self,
+        task: "Runnable",
+        log_prefix: str,
+        mirror: "Optional[Callable[[str], Any]]" = None,
+    ) -> None:
+        """
+        Create a BenchmarkWorker.
+
+        :param task: the command starting the worker.
+        :param log_prefix: the worker's output filename prefix.
+        :param mirror: called with batches of the worker's output lines.
+        """
+        self.task = task
+        self.log_prefix = log_prefix
+        self.mirror = mirror
+        self.proc: "Optional[Popen[bytes]]" = None
+        self._replies: "Optional[BinaryIO]" = None
+        self._pump: "Optional[Thread]" = None
+        self._id = 0
+
+    def start(self) -> None:
+        """Start the worker."""
+        from os import close, environ, fdopen, pipe
+        from subprocess import PIPE, Popen
+        from threading import Thread
+
+        from openforbc_benchmark.stats import STATS_FD_ENV
+
+        popen_args = self.task.into_popen_args()
+        read_fd, write_fd = pipe()
+        env = dict(popen_args["env"] if popen_args["env"] is not None else environ)
+        env[STATS_FD_ENV] = str(write_fd)
+        popen_args["env"] = env
+        # The worker's process group is killed when a command times out
+        popen_args["start_new_session"] = True
+
+        try:
+            self.proc = Popen(
+                **popen_args, stdin=PIPE, stdout=PIPE, stderr=PIPE, pass_fds=(write_fd,)
+            )
+        except Exception:
+            close(read_fd)
+            raise
+        finally:
+            close(write_fd)
+
+        self._replies = fdopen(read_fd, "rb")
+        self._pump = Thread(target=self._pump_output, args=(self.proc,), daemon=True)
+        self._pump.start()
+
+    def is_running(self) -> bool:
+        """Check whether the worker is running."""
+        return self.proc is not None and self.proc.poll() is None
+
+    def run(
+        self,
+        task: "Runnable",
+        collector: "Optional[SeriesCollector]" = None,
+    ) -> "Tuple[int, bytes]":
+        """
+        Run a command in the worker.
+
+        The worker is killed if the command doesn't finish within its timeout.
+
+        :param collector: collects the samples the command writes into the stats
+            channel.
+        :returns: the command's exit status and stdout.
+        :raises WorkerTimeout: if the command timed out.
+        :raises WorkerRestart: if the command has to be run by a fresh worker.
+        :raises WorkerError: if the worker exited or its reply is not valid.
+        """
+        from threading import Event, Timer
+
+        from openforbc_benchmark.process import kill_process_group
+
+        proc = self.proc
+        if task.timeout is None or proc is None:
+            return self._run(task, collector)
+
+        timed_out = Event()
+
+        def kill() -> None:
+            timed_out.set()
+            kill_process_group(proc)
+
+        watchdog = Timer(task.timeout, kill)
+        watchdog.start()
+        try:
+            return self._run(task, collector)
+        except WorkerError:
+            if not timed_out.is_set():
+                raise
+            raise WorkerTimeout(
+                f"The command timed out after {task.timeout}s"
+            ) from None
+        finally:
+            watchdog.cancel()
+
+    def _run(
+        self, task: "Runnable", collector: "Optional[SeriesCollector]"
+    ) -> "Tuple[int, bytes]":
+        """Send a command to the worker and wait for its reply."""
+        from json import dumps, loads
+
+        if self.proc is None or self.proc.stdin is None or self._replies is None:
+            raise WorkerError("The worker is not running")
+
+        self._id += 1
+        request = {"id": self._id, "args": task.args, "env": task.env, "cwd": task.cwd}
+        try:
+            self.proc.stdin.write(f"{dumps(request)}\n".encode())
+            self.proc.stdin.flush()
+        except OSError:
+            raise WorkerError("The worker exited") from None
+
+        while True:
+            line = self._replies.readline()
+            if not line:
+                raise WorkerError("The worker exited")
+
+            # Anything but the reply is a sample
+            try:
+                reply = loads(line)
+            except ValueError:
+                reply = None
+            if not isinstance(reply, dict) or "id" not in reply:
+                if collector is not None:
+                    collector.feed(line)
+                continue
+
+            if reply["id"] != self._id:
+                raise WorkerError(f"Unexpected reply to request {reply['id']}")
+            if reply.get("restart"):
+                raise WorkerRestart("The worker asked to be restarted")
+
+            try:
+                return int(reply["status"]), str(reply.get("output", "")).encode()
+            except (KeyError, TypeError, ValueError):
+                raise WorkerError(f"Invalid reply: {line.decode().strip()}") from None
+
+    def stop(self, timeout: float = 10) -> "Optional[int]":
+        """
+        Stop the worker, closing its stdin and killing it if it doesn't exit.
+
+        :param timeout: the time the worker is given to exit, in seconds.
+        :returns: the worker's exit status (`None` if it wasn't started).
+        """
+        from contextlib import suppress
+        from subprocess import TimeoutExpired
+
+        if self.proc is None:
+            return None
+
+        if self.proc.stdin is not None:
+            with suppress(OSError):
+                self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout)
+        except TimeoutExpired:
+            self.proc.kill()
+
+        if self._pump is not None:
+            self._pump.join()
+        if self._replies is not None:
+            self._replies.close()
+
+        return self.proc.wait()
+
+    def _pump_output(self, proc: "Popen[bytes]") -> None:
+        """Pump the worker's output into its logs until it exits."""
+        from openforbc_benchmark.process import OutputPump
+
+        with open(f"{self.log_prefix}.err.log", "wb") as err_log, open(
+            f"{self.log_prefix}.out.log", "wb"
+        ) as out_log:
+            err_log.write(f"{self.task}\n".encode())
+            out_log.write(f"{self.task}\n".encode())
+            OutputPump(out_log, err_log, mirror=self.mirror).run(proc)
@@ -0,0 +1,60 @@
+"""
+Micro-benchmark for JSON definitions deserialization.
+
+Measures how many benchmark and preset definitions can be deserialized per second
+when the jsonschema validators are cached (default) and when they are rebuilt for
+every object (as they were before the validators cache was introduced).
+
+Run with `python -m tests.bench_json`.
+"""
+
+from json import load
+from os.path import join
+from timeit import repeat
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.json import (
+    BenchmarkDefinition,
+    PresetDefinition,
+    get_schemas,
+    get_validator,
+)
+
+from tests.test_benchmark import O4BC_BENCH_DIR
+
+if TYPE_CHECKING:
+    from typing import Any, Callable
+
+
+def load_definition(*path: str) -> "Any":
+    with open(join(O4BC_BENCH_DIR, "benchmarks", *path), "r") as file:
+        return load(file)
+
+
+def per_second(function: "Callable[[], Any]", number: int = 200) -> float:
+    return number / min(repeat(function, number=number, repeat=5))
+
+
+def main() -> None:
+    benchmark = load_definition("tensorflow_benchmark", "benchmark.json")
+    preset = load_definition("dummy_benchmark", "presets", "preset1.json")
+
+    def uncached(deserialize: "Callable[[Any], Any]", json: "Any") -> None:
+        get_schemas.cache_clear()
+        get_validator.cache_clear()
+        deserialize(json)
+
+    for name, cls, json in (
+        ("benchmark", BenchmarkDefinition, benchmark),
+        ("preset", PresetDefinition, preset),
+    ):
+        before = per_second(lambda: uncached(cls.deserialize, json))
+        after = per_second(lambda: cls.deserialize(json))
+        print(
+            f"{name} definitions/s: {before:10.0f} uncached, {after:10.0f} cached "
+            f"({after / before:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,70 @@
+from pytest import approx
+from typing import TYPE_CHECKING
+
 from typer.testing import CliRunner
 
 from openforbc_benchmark.cli.benchmark import app
 
+if TYPE_CHECKING:
+    from pathlib import Path
+    from pytest import MonkeyPatch
+
 runner = CliRunner()
 
 
+def make_slow_benchmark(search_path: "Path") -> None:
+    """Create a benchmark printing `x`, sleeping for its argument and printing `y`."""
+    from json import dumps
+
+    benchmark_dir = search_path / "benchmarks" / "slow_benchmark"
+    (benchmark_dir / "presets").mkdir(parents=True)
+    (benchmark_dir / "run.sh").write_text('echo "x: 1"; sleep "$1"; echo "y: 2"\n')
+    (benchmark_dir / "benchmark.json").write_text(
+        dumps(
+            {
+                "name": "Slow benchmark",
+                "description": "May hang",
+                "default_preset": "fast",
+                "run_command": "sh run.sh",
+                "test_command": "true",
+                "stats": {"x": {"regex": "x: (\\d+)"}, "y": {"regex": "y: (\\d+)"}},
+            }
+        )
+    )
+    for preset, delay in (("fast", "0"), ("slow", "30")):
+        (benchmark_dir / "presets" / f"{preset}.json").write_text(
+            dumps({"args": [delay]})
+        )
+
+
+def make_failing_benchmark(search_path: "Path") -> None:
+    """Create a benchmark failing its first setup and the runs after the first one."""
+    from json import dumps
+
+    benchmark_dir = search_path / "benchmarks" / "failing_benchmark"
+    (benchmark_dir / "presets").mkdir(parents=True)
+    (benchmark_dir / "setup.sh").write_text(
+        "[ -e setup.done ] && exit 0; touch setup.done; exit 1\n"
+    )
+    (benchmark_dir / "run.sh").write_text(
+        '[ -e "$1" ] && exit 1; touch "$1"; echo "x: 1"\n'
+    )
+    (benchmark_dir / "benchmark.json").write_text(
+        dumps(
+            {
+                "name": "Failing benchmark",
+                "description": "Fails sometimes",
+                "default_preset": "once",
+                "setup_command": "sh setup.sh",
+                "run_command": "sh run.sh",
+                "test_command": "true",
+                "stats": {"x": {"regex": "x: (\\d+)"}},
+            }
+        )
+    )
+    (benchmark_dir / "presets" / "once.json").write_text(dumps({"args": ["ran"]}))
+
+
 def test_benchmark_default_command() -> None:
     """Default command must be `list -t`."""
     default_result = runner.invoke(app)
@@ -81,3 +141,319 @@ def test_benchmark_test() -> None:
     result = runner.invoke(app, ["test", "dummy_benchmark"])
     assert result.exit_code == 0
     assert "true" in result.stdout
+
+
+def test_benchmark_run_repeat() -> None:
+    from json import loads
+
+    result = runner.invoke(
+        app, ["run", "--repeat", "3", "--warmup", "1", "-j", "dummy_benchmark"]
+    )
+    assert result.exit_code == 0
+
+    summary = loads(result.stdout.splitlines()[-1])["preset1"]["data_1"]
+    assert summary["samples"] == [135246, 135246, 135246]
+    assert summary["mean"] == 135246
+    assert summary["stddev"] == 0
+    assert all(x in summary for x in ("median", "min", "max", "ci"))
+
+    table_result = runner.invoke(app, ["run", "-r", "2", "dummy_benchmark"])
+    assert table_result.exit_code == 0
+    assert "Median" in table_result.stdout
+    assert "135246" in table_result.stdout
+
+
+def test_benchmark_run_until_stable() -> None:
+    from json import loads
+
+    result = runner.invoke(
+        app,
+        ["run", "--until-stable", "0.01", "--max-runs", "4", "-j", "dummy_benchmark"],
+    )
+    assert result.exit_code == 0
+    assert "is stable after 2 runs" in result.stdout
+
+    summary = loads(result.stdout.splitlines()[-1])["preset1"]["data_1"]
+    assert summary["samples"] == [135246, 135246]
+
+
+def test_benchmark_run_until_stable_invalid() -> None:
+    result = runner.invoke(app, ["run", "--until-stable", "0", "dummy_benchmark"])
+    assert result.exit_code == 2
+    assert "Invalid value for '--until-stable'" in result.stdout
+
+
+def test_benchmark_run_stats_channel(
+    tmp_path: "Path", monkeypatch: "MonkeyPatch"
+) -> None:
+    from json import dumps, load, loads
+    from os import listdir, makedirs
+    from os.path import join
+    from sys import executable
+
+    from openforbc_benchmark.cli.state import state
+
+    emit = (
+        "import json, os\n"
+        "channel = os.fdopen(int(os.environ['O4BCB_STATS_FD']), 'w')\n"
+        "for t, v in enumerate([0.5, 0.1, 0.2, 0.3, 0.4]):\n"
+        "    channel.write(json.dumps({'stat': 'latency', 'value': v, 'time': t, "
+        "'count': 2}) + '\\n')\n"
+        "print('data: 1')\n"
+    )
+    benchmark_dir = join(str(tmp_path), "benchmarks", "channel_benchmark")
+    makedirs(join(benchmark_dir, "presets"))
+    with open(join(benchmark_dir, "benchmark.json"), "w") as file:
+        file.write(
+            dumps(
+                {
+                    "name": "Stats channel benchmark",
+                    "description": "Writes samples into the stats channel",
+                    "default_preset": "preset1",
+                    "run_command": {"command": [executable, "-c", emit]},
+                    "test_command": "true",
+                    "stats": {"data": {"regex": "data: (\\d+)"}},
+                }
+            )
+        )
+    with open(join(benchmark_dir, "presets", "preset1.json"), "w") as file:
+        file.write(dumps({"args": []}))
+
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    result = runner.invoke(app, ["run", "--no-store", "-j", "channel_benchmark"])
+    assert result.exit_code == 0, result.stdout
+
+    stats = loads(result.stdout.splitlines()[-1])["preset1"]
+    assert stats["data"] == 1
+    assert stats["latency_count"] == 5
+    assert stats["latency_p50"] == approx(0.3)
+    assert stats["latency_max"] == 0.5
+    assert stats["latency_throughput"] == approx(2)
+
+    log_dir = join("logs", "channel_benchmark")
+    run_dir = sorted(listdir(log_dir))[-1]
+    with open(join(log_dir, run_dir, "run_preset1.series.json")) as file:
+        series = load(file)
+    assert series["latency"]["samples"] == [0.5, 0.1, 0.2, 0.3, 0.4]
+    assert series["latency"]["throughput_curve"][0] == [0, 2]
+
+
+def test_benchmark_run_worker(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps, loads
+    from os import makedirs
+    from os.path import join
+    from sys import executable
+
+    from openforbc_benchmark.cli.state import state
+
+    script = (
+        "import json, os, sys\n"
+        "def main(argv):\n"
+        "    print(f'pid: {os.getpid()}')\n"
+        "    print(f'value: {argv[0]}')\n"
+        "if sys.argv[1:] != ['--worker']:\n"
+        "    main(sys.argv[1:])\n"
+        "    sys.exit()\n"
+        "channel = os.fdopen(int(os.environ['O4BCB_STATS_FD']), 'w', buffering=1)\n"
+        "for i, line in enumerate(sys.stdin):\n"
+        "    request = json.loads(line)\n"
+        "    # Like a setting which can't be changed once the worker is initialized\n"
+        "    if i > 0 and request['args'][3:] == ['fresh']:\n"
+        "        reply = {'id': request['id'], 'restart': True}\n"
+        "        channel.write(json.dumps(reply) + '\\n')\n"
+        "        sys.exit()\n"
+        "    output = f'pid: {os.getpid()}\\nvalue: {request[\"args\"][2]}\\n'\n"
+        "    channel.write(json.dumps({'id': request['id'], 'status': 0, "
+        "'output': output}) + '\\n')\n"
+    )
+    benchmark_dir = join(str(tmp_path), "benchmarks", "worker_benchmark")
+    makedirs(join(benchmark_dir, "presets"))
+    with open(join(benchmark_dir, "bench.py"), "w") as file:
+        file.write(script)
+    with open(join(benchmark_dir, "benchmark.json"), "w") as file:
+        file.write(
+            dumps(
+                {
+                    "name": "Worker benchmark",
+                    "description": "Runs its presets in a worker",
+                    "default_preset": "preset1",
+                    "run_command": {"command": [executable, "bench.py"]},
+                    "worker_command": {"command": [executable, "bench.py", "--worker"]},
+                    "test_command": "true",
+                    "stats": {
+                        "pid": {"regex": "pid: (\\d+)"},
+                        "value": {"regex": "value: (\\d+)"},
+                    },
+                }
+            )
+        )
+    for i in (1, 2):
+        with open(join(benchmark_dir, "presets", f"preset{i}.json"), "w") as file:
+            file.write(dumps({"args": [str(i)]}))
+    with open(join(benchmark_dir, "presets", "preset3.json"), "w") as file:
+        file.write(dumps({"args": ["3", "fresh"]}))
+
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0", "-j", "worker_benchmark"]
+
+    # Without the worker each preset runs in its own process
+    result = runner.invoke(app, args + ["preset1", "preset2"])
+    assert result.exit_code == 0, result.stdout
+    stats = loads(result.stdout.splitlines()[-1])
+    assert stats["preset1"]["value"] == 1 and stats["preset2"]["value"] == 2
+    assert stats["preset1"]["pid"] != stats["preset2"]["pid"]
+
+    result = runner.invoke(app, args + ["--worker", "preset1", "preset2"])
+    assert result.exit_code == 0, result.stdout
+    stats = loads(result.stdout.splitlines()[-1])
+    assert stats["preset1"]["value"] == 1 and stats["preset2"]["value"] == 2
+    assert stats["preset1"]["pid"] == stats["preset2"]["pid"]
+
+    # A worker asking to be restarted is replaced by a new one
+    result = runner.invoke(app, args + ["--worker", "preset1", "preset3", "preset2"])
+    assert result.exit_code == 0, result.stdout
+    stats = loads(result.stdout.splitlines()[-1])
+    assert stats["preset3"]["value"] == 3 and stats["preset2"]["value"] == 2
+    assert stats["preset1"]["pid"] != stats["preset3"]["pid"]
+    assert stats["preset3"]["pid"] == stats["preset2"]["pid"]
+
+
+def test_benchmark_run_setup_stamps() -> None:
+    result = runner.invoke(app, ["run", "--force-setup", "dummy_benchmark"])
+    assert result.exit_code == 0
+    assert "up-to-date setup command" not in result.stdout
+
+    result = runner.invoke(app, ["run", "dummy_benchmark"])
+    assert result.exit_code == 0
+    assert "Skipped 1 up-to-date setup command(s)" in result.stdout
+
+
+def test_benchmark_run_resources() -> None:
+    from json import loads
+    from os import listdir
+    from os.path import join
+
+    result = runner.invoke(
+        app, ["run", "--sample-interval", "0.01", "-j", "dummy_benchmark"]
+    )
+    assert result.exit_code == 0
+
+    stats = loads(result.stdout.splitlines()[-1])["preset1"]
+    assert stats["data_1"] == 135246
+    assert all(x in stats for x in ("proc_cpu_time", "proc_cpu_percent_mean"))
+    assert stats["proc_minor_faults"] > 0
+
+    log_dir = join("logs", "dummy_benchmark")
+    run_dir = sorted(listdir(log_dir))[-1]
+    assert "run_preset1.resources.json" in listdir(join(log_dir, run_dir))
+
+    result = runner.invoke(
+        app, ["run", "--sample-interval", "0", "-j"] + ["dummy_benchmark"]
+    )
+    assert result.exit_code == 0
+    assert loads(result.stdout.splitlines()[-1]) == {"preset1": {"data_1": 135246}}
+
+
+def test_benchmark_run_timeout(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import loads
+    from time import monotonic
+
+    from openforbc_benchmark.cli.state import state
+
+    make_slow_benchmark(tmp_path)
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0", "--timeout", "1"]
+
+    result = runner.invoke(app, args + ["-j", "slow_benchmark", "fast"])
+    assert result.exit_code == 0, result.stdout
+    assert loads(result.stdout.splitlines()[-1]) == {"fast": {"x": 1, "y": 2}}
+
+    # The run stops at the preset which timed out, keeping the stats which matched
+    start = monotonic()
+    result = runner.invoke(app, args + ["-j", "slow_benchmark", "slow", "fast"])
+    assert monotonic() - start < 20
+    assert result.exit_code == 124, result.stdout
+    assert "timed out after 1.0s" in result.stdout
+    assert loads(result.stdout.splitlines()[-1]) == {"slow": {"x": 1}}
+
+    result = runner.invoke(app, args + ["slow_benchmark", "slow"])
+    assert result.exit_code == 124
+    assert "slow (partial)" in result.stdout
+
+
+def test_benchmark_run_sweep(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps, loads
+
+    from openforbc_benchmark.cli.state import state
+
+    make_slow_benchmark(tmp_path)
+    (tmp_path / "benchmarks" / "slow_benchmark" / "presets" / "sweep.json").write_text(
+        dumps({"matrix": {"delay": [0, "0.1"]}, "args": ["{delay}"]})
+    )
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0"]
+
+    result = runner.invoke(app, args + ["-j", "slow_benchmark", "sweep"])
+    assert result.exit_code == 0, result.stdout
+    assert loads(result.stdout.splitlines()[-1]) == {
+        "sweep@delay=0": {"x": 1, "y": 2},
+        "sweep@delay=0.1": {"x": 1, "y": 2},
+    }
+
+    result = runner.invoke(app, args + ["slow_benchmark", "fast", "sweep@delay=0.1"])
+    assert result.exit_code == 0, result.stdout
+    table = result.stdout[result.stdout.index('Sweep "sweep"') :].splitlines()
+    assert table[1].split() == ["delay", "x", "y"]
+    assert table[3].split() == ["0.1", "1", "2"]
+
+    result = runner.invoke(app, args + ["slow_benchmark", "sweep@delay=1"])
+    assert result.exit_code == 1
+
+
+def test_benchmark_run_retries(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from glob import glob
+
+    from openforbc_benchmark.cli.state import state
+
+    make_failing_benchmark(tmp_path)
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0", "failing_benchmark"]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 1
+    assert "setup command" in result.stdout
+
+    (tmp_path / "benchmarks" / "failing_benchmark" / "setup.done").unlink()
+    result = runner.invoke(app, args + ["--retries", "2", "--retry-delay", "0"])
+    assert result.exit_code == 0, result.stdout
+    assert "retrying in 0s (1/2)" in result.stdout
+
+    # The failed attempt's logs are kept
+    assert glob("logs/failing_benchmark/*/setup.1.attempt1.err.log")
+
+
+def test_benchmark_run_failure_results(
+    tmp_path: "Path", monkeypatch: "MonkeyPatch"
+) -> None:
+    from json import loads
+
+    from openforbc_benchmark.cli.state import state
+    from openforbc_benchmark.results import ResultStore
+
+    make_failing_benchmark(tmp_path)
+    (tmp_path / "benchmarks" / "failing_benchmark" / "setup.done").touch()
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    monkeypatch.setitem(state, "results_db", str(tmp_path / "results.db"))
+
+    # The preset fails on its second trial: the first one is kept
+    result = runner.invoke(
+        app, ["run", "--sample-interval", "0", "-r", "3", "-j", "failing_benchmark"]
+    )
+    assert result.exit_code == 1
+    stats = loads(result.stdout.splitlines()[-1])
+    assert stats["once"]["x"]["samples"] == [1]
+
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        (run,) = store.get_runs("failing_benchmark")
+    assert run.samples == {"x": [1]}
+    assert run.metadata["partial"]
@@ -0,0 +1,112 @@
+from json import loads
+from pytest import approx
+from typing import TYPE_CHECKING
+
+from typer.testing import CliRunner
+
+from openforbc_benchmark.cli.app import app
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from pytest import MonkeyPatch
+
+runner = CliRunner()
+
+
+def test_results_store_and_compare(tmp_path: "Path") -> None:
+    db = str(tmp_path / "results.db")
+
+    for _ in range(3):
+        result = runner.invoke(
+            app,
+            [
+                "--results-db",
+                db,
+                "benchmark",
+                "run",
+                "dummy_benchmark",
+                "--sample-interval",
+                "0",
+            ],
+        )
+        assert result.exit_code == 0
+
+    result = runner.invoke(
+        app, ["--results-db", db, "benchmark", "run", "--no-store", "dummy_benchmark"]
+    )
+    assert result.exit_code == 0
+
+    result = runner.invoke(app, ["--results-db", db, "results", "list"])
+    assert result.exit_code == 0
+    assert result.stdout.count("dummy_benchmark") == 3
+    assert "data_1=135246" in result.stdout
+
+    result = runner.invoke(
+        app, ["--results-db", db, "results", "compare", "--json", "--check"]
+    )
+    assert result.exit_code == 0
+    (comparison,) = loads(result.stdout)
+    assert comparison["stat"] == "data_1"
+    assert comparison["baseline"] == [135246, 135246]
+    assert comparison["status"] == "ok"
+
+
+def test_results_missing_db(tmp_path: "Path") -> None:
+    db = str(tmp_path / "missing.db")
+    result = runner.invoke(app, ["--results-db", db, "results", "list"])
+    assert result.exit_code == 1
+
+
+def test_results_scaling(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps
+
+    from openforbc_benchmark.cli.state import state
+
+    # The options set the global state, restored after the test
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    monkeypatch.setitem(state, "results_db", str(tmp_path / "results.db"))
+
+    benchmark_dir = tmp_path / "benchmarks" / "square_benchmark"
+    (benchmark_dir / "presets").mkdir(parents=True)
+    (benchmark_dir / "run.sh").write_text('echo "time: $(($1 * $1))"\n')
+    (benchmark_dir / "benchmark.json").write_text(
+        dumps(
+            {
+                "name": "Square benchmark",
+                "description": "Takes n^2 seconds",
+                "default_preset": "sweep",
+                "run_command": "sh run.sh",
+                "test_command": "true",
+                "stats": {"time": {"regex": "time: (\\d+)"}},
+            }
+        )
+    )
+    (benchmark_dir / "presets" / "sweep.json").write_text(
+        dumps({"matrix": {"n": [1, 10, 100]}, "args": ["{n}"]})
+    )
+    db = ["--results-db", str(tmp_path / "results.db"), "--search-path"]
+    db.append(str(tmp_path))
+
+    result = runner.invoke(
+        app, db + ["benchmark", "run", "--sample-interval", "0", "square_benchmark"]
+    )
+    assert result.exit_code == 0, result.stdout
+
+    args = ["results", "scaling", "square_benchmark", "sweep", "-s", "time", "-a", "n"]
+    result = runner.invoke(app, db + args + ["--flops", "n**2"])
+    assert result.exit_code == 0, result.stdout
+    assert "Fit: time = 1 * n^2.000 (R² = 1.0000)" in result.stdout
+    assert "GFLOP/s" in result.stdout
+
+    result = runner.invoke(app, db + args + ["--json"])
+    assert result.exit_code == 0, result.stdout
+    (curve,) = loads(result.stdout)
+    assert curve["exponent"] == approx(2)
+    assert [point["size"] for point in curve["points"]] == [1, 10, 100]
+    assert curve["points"][2]["value"] == 10000
+    assert curve["points"][2]["gflops"] is None
+
+    result = runner.invoke(app, db + args + ["--flops", "2 * m"])
+    assert result.exit_code == 1
+    result = runner.invoke(app, db + args[:-1] + ["size"])
+    assert result.exit_code == 1
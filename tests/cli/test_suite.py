@@ -1,7 +1,12 @@
 from typer.testing import CliRunner
+from typing import TYPE_CHECKING
 
 from openforbc_benchmark.cli.suite import app
 
+if TYPE_CHECKING:
+    from pathlib import Path
+    from pytest import MonkeyPatch
+
 runner = CliRunner()
 
 
@@ -43,3 +48,245 @@ def test_suite_run() -> None:
     assert "RUN#2" in result.stdout
     assert "preset1" in result.stdout
     assert "preset2" in result.stdout
+
+
+def test_suite_run_parallel() -> None:
+    result = runner.invoke(app, ["run", "--jobs", "2", "Dummy benchmark suite"])
+    assert result.exit_code == 0
+    assert "RUN#1" in result.stdout
+    assert "RUN#2" in result.stdout
+    assert "135246" in result.stdout
+
+
+def test_suite_run_repeat() -> None:
+    from json import loads
+
+    result = runner.invoke(app, ["run", "-r", "2", "-j", "Dummy benchmark suite"])
+    assert result.exit_code == 0
+
+    runs = loads(result.stdout.splitlines()[-1])
+    assert len(runs) == 2
+    assert runs[1]["preset2"]["data_1"]["samples"] == [135246, 135246]
+
+
+def test_suite_run_until_stable_invalid() -> None:
+    for command in ("run", "serve"):
+        result = runner.invoke(app, [command, "-s", "-1", "Dummy benchmark suite"])
+        assert result.exit_code == 2
+        assert "Invalid value for '--until-stable'" in result.stdout
+
+
+def test_suite_run_timeout(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps, loads
+
+    from openforbc_benchmark.cli.state import state
+    from tests.cli.test_benchmark import make_slow_benchmark
+
+    make_slow_benchmark(tmp_path)
+    (tmp_path / "suites").mkdir()
+    (tmp_path / "suites" / "slow.json").write_text(
+        dumps(
+            {
+                "name": "Slow suite",
+                "description": "Has a run which hangs",
+                "timeout": 10,
+                "benchmark_runs": [
+                    {
+                        "benchmark_folder": "slow_benchmark",
+                        "presets": ["slow"],
+                        "timeout": 1,
+                    },
+                    {"benchmark_folder": "slow_benchmark", "presets": ["fast"]},
+                ],
+            }
+        )
+    )
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0", "Slow suite"]
+
+    # The suite goes on after a run times out
+    for jobs in ("1", "2"):
+        result = runner.invoke(app, args + ["--jobs", jobs, "-j"])
+        assert result.exit_code == 124, result.stdout
+        assert "Benchmark run #1 timed out" in result.stdout
+        assert loads(result.stdout.splitlines()[-1]) == [
+            {"slow": {"x": 1}},
+            {"fast": {"x": 1, "y": 2}},
+        ]
+
+    result = runner.invoke(app, args)
+    assert "slow (partial)" in result.stdout
+
+
+def test_suite_run_keep_going(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps, loads
+
+    from openforbc_benchmark.cli.state import state
+    from tests.cli.test_benchmark import make_failing_benchmark, make_slow_benchmark
+
+    make_failing_benchmark(tmp_path)
+    make_slow_benchmark(tmp_path)
+    (tmp_path / "suites").mkdir()
+    (tmp_path / "suites" / "failing.json").write_text(
+        dumps(
+            {
+                "name": "Failing suite",
+                "description": "Has a run which fails",
+                "benchmark_runs": [
+                    {"benchmark_folder": "failing_benchmark", "presets": ["once"]},
+                    {"benchmark_folder": "slow_benchmark", "presets": ["fast"]},
+                ],
+            }
+        )
+    )
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    args = ["run", "--no-store", "--sample-interval", "0", "Failing suite"]
+
+    # The first failure stops the suite
+    result = runner.invoke(app, args + ["-j"])
+    assert result.exit_code == 1
+    assert "Benchmark run #2" not in result.stdout
+
+    for jobs in ("1", "2"):
+        (tmp_path / "benchmarks" / "failing_benchmark" / "setup.done").unlink()
+        result = runner.invoke(app, args + ["--keep-going", "--jobs", jobs, "-j"])
+        assert result.exit_code == 1, result.stdout
+        assert "Benchmark run #1 failed, going on" in result.stdout
+
+        failed, ok = loads(result.stdout.splitlines()[-1])
+        assert failed["status"] == "failed"
+        assert "return code 1" in failed["error"]
+        assert ok == {
+            "run": 2,
+            "benchmark": "slow_benchmark",
+            "status": "ok",
+            "error": None,
+            "stats": {"fast": {"x": 1, "y": 2}},
+            "partial": [],
+        }
+
+    (tmp_path / "benchmarks" / "failing_benchmark" / "setup.done").unlink()
+    result = runner.invoke(app, args + ["--keep-going"])
+    assert "RUN#1 - Failing benchmark (failed)" in result.stdout
+
+
+def test_suite_run_resume(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import dumps, loads
+
+    from openforbc_benchmark.cli.state import state
+    from tests.cli.test_benchmark import make_failing_benchmark, make_slow_benchmark
+
+    make_failing_benchmark(tmp_path)
+    make_slow_benchmark(tmp_path)
+    (tmp_path / "suites").mkdir()
+    (tmp_path / "suites" / "resumed.json").write_text(
+        dumps(
+            {
+                "name": "Resumed suite",
+                "description": "Dies midway",
+                "benchmark_runs": [
+                    {"benchmark_folder": "slow_benchmark", "presets": ["fast"]},
+                    {"benchmark_folder": "failing_benchmark", "presets": ["once"]},
+                ],
+            }
+        )
+    )
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    journal = str(tmp_path / "journal.jsonl")
+    args = ["run", "--no-store", "--sample-interval", "0", "-j", "Resumed suite"]
+
+    result = runner.invoke(app, args + ["--journal", journal])
+    assert result.exit_code == 1
+
+    # The failing benchmark's preset fails if it's run again
+    stats = [{"fast": {"x": 1, "y": 2}}, {"once": {"x": 1}}]
+    for _ in range(2):
+        result = runner.invoke(app, args + ["--resume", journal])
+        assert result.exit_code == 0, result.stdout
+        assert 'Skipping "slow_benchmark" preset "fast"' in result.stdout
+        assert loads(result.stdout.splitlines()[-1]) == stats
+
+    # Presets whose definitions changed are run again
+    run_script = tmp_path / "benchmarks" / "slow_benchmark" / "run.sh"
+    run_script.write_text('echo "x: 3"; echo "y: 4"\n')
+    result = runner.invoke(app, args + ["--resume", journal])
+    assert result.exit_code == 0, result.stdout
+    assert '"slow_benchmark" preset "fast" changed' in result.stdout
+    assert loads(result.stdout.splitlines()[-1])[0] == {"fast": {"x": 3, "y": 4}}
+
+    result = runner.invoke(app, args + ["--resume", str(tmp_path / "missing")])
+    assert result.exit_code == 1
+
+
+def test_suite_serve(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from json import loads
+    from socket import socket
+    from threading import Thread
+
+    from openforbc_benchmark.cli.state import state
+    from openforbc_benchmark.cli.suite import run_work_item
+    from openforbc_benchmark.distributed import Agent
+    from tests.test_distributed import make_suite
+
+    make_suite(tmp_path)
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    with socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    agents = [
+        Agent(
+            ("127.0.0.1", port),
+            lambda item: run_work_item(item, str(tmp_path), {"sample_interval": 0}),
+            f"agent{n}",
+        )
+        for n in range(2)
+    ]
+    threads = [Thread(target=agent.run, args=(30,)) for agent in agents]
+    for thread in threads:
+        thread.start()
+
+    result = runner.invoke(
+        app, ["serve", "--port", str(port), "-j", "Distributed suite"]
+    )
+    for thread in threads:
+        thread.join(30)
+    assert result.exit_code == 0, result.stdout
+
+    reports = loads(result.stdout.splitlines()[-1])
+    assert [(report["run"], report["preset"]) for report in reports] == [
+        (1, "fast"),
+        (2, "fast"),
+        (2, "fast"),
+    ]
+    assert {report["agent"] for report in reports} <= {
+        "agent0 (127.0.0.1)",
+        "agent1 (127.0.0.1)",
+    }
+    assert all(report["stats"] == {"fast": {"x": 1, "y": 2}} for report in reports)
+    assert list((tmp_path / "logs" / "distributed").glob("*/results.json"))
+
+
+def test_suite_agent(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    from openforbc_benchmark.cli.state import state
+    from openforbc_benchmark.distributed import Coordinator
+    from tests.test_distributed import make_suite
+
+    monkeypatch.setitem(state, "search_path", str(tmp_path))
+    coordinator = Coordinator(
+        make_suite(tmp_path), str(tmp_path / "results"), address=("127.0.0.1", 0)
+    )
+    coordinator.start()
+    host, port = coordinator.address
+
+    result = runner.invoke(
+        app, ["agent", "--no-store", "--sample-interval", "0", f"{host}:{port}"]
+    )
+    coordinator.stop()
+    assert result.exit_code == 0, result.stdout
+    assert "Done, 3 presets run" in result.stdout
+    assert all(result.status == "ok" for result in coordinator.wait(0))
+
+    result = runner.invoke(app, ["agent", "--connect-timeout", "0", f"{host}:{port}"])
+    assert result.exit_code == 1
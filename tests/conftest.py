@@ -0,0 +1,12 @@
+from pytest import fixture
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from pytest import MonkeyPatch
+
+
+@fixture(autouse=True)
+def cache_dir(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    """Keep the tool's caches (e.g. the benchmark catalog) out of the user's home."""
+    monkeypatch.setenv("O4BCB_CACHE", str(tmp_path / "cache"))
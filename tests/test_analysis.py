@@ -0,0 +1,202 @@
+from pytest import approx, raises
+
+from openforbc_benchmark.analysis import (
+    Distribution,
+    evaluate_formula,
+    fit_power_law,
+    flatten_distributions,
+    RepetitionPolicy,
+    ScalingCurve,
+    StatSummary,
+    summarize,
+    t_quantile,
+)
+
+
+def test_t_quantile() -> None:
+    assert t_quantile(0.975, 1) == approx(12.7062, abs=1e-4)
+    assert t_quantile(0.975, 2) == approx(4.3027, abs=1e-4)
+    assert t_quantile(0.975, 3) == approx(3.1824, abs=1e-4)
+    assert t_quantile(0.995, 4) == approx(4.6041, abs=1e-4)
+    assert t_quantile(0.975, 10) == approx(2.2281, abs=1e-4)
+    assert t_quantile(0.975, 1000) == approx(1.9623, abs=1e-4)
+
+
+def test_stat_summary() -> None:
+    summary = StatSummary([1, 2, 3, 4, 10])
+    assert summary.mean == 4
+    assert summary.median == 3
+    assert summary.stddev == approx(3.5355, abs=1e-4)
+    assert summary.min == 1
+    assert summary.max == 10
+    assert summary.ci is not None
+    assert summary.ci == approx((4 - 4.3899, 4 + 4.3899), abs=1e-4)
+    assert summary.relative_ci() == approx(4.3899 / 4, abs=1e-4)
+
+    json = StatSummary.serialize(summary)
+    assert json["samples"] == [1, 2, 3, 4, 10]
+    assert json["ci"] == list(summary.ci)
+
+    single = StatSummary([5])
+    assert single.stddev == 0
+    assert single.ci is None
+    assert single.relative_ci() is None
+
+    with raises(ValueError):
+        StatSummary([])
+
+
+def test_summarize() -> None:
+    summaries = summarize({"a": [1, 2], "b": []})
+    assert list(summaries) == ["a"]
+    assert summaries["a"].mean == 1.5
+
+
+def test_repetition_policy() -> None:
+    assert RepetitionPolicy().is_single()
+    assert list(RepetitionPolicy().trials()) == [("trial1", True)]
+
+    policy = RepetitionPolicy(2, 1)
+    assert not policy.is_single()
+    assert list(policy.trials()) == [
+        ("warmup1", False),
+        ("trial1", True),
+        ("trial2", True),
+    ]
+
+    with raises(ValueError):
+        RepetitionPolicy(0)
+
+
+def test_repetition_policy_adaptive() -> None:
+    from typing import Dict, List, Union
+
+    policy = RepetitionPolicy(repeat=3, warmup=1, target_ci=0.01, max_runs=10)
+    assert policy.is_adaptive()
+    assert not policy.is_single()
+
+    values = iter([100, 100.1, 99.9, 100, 100.05, 99.95])
+    samples: "Dict[str, List[Union[int, float]]]" = {}
+    trials = []
+    for label, measured in policy.trials(samples):
+        trials.append(label)
+        if measured:
+            samples.setdefault("time", []).append(next(values))
+
+    # Minimum number of runs is respected even if stats are stable earlier
+    assert trials == ["warmup1", "trial1", "trial2", "trial3"]
+    assert policy.is_stable(samples)
+
+    noisy = iter([1, 100] * 10)
+    samples = {}
+    for _, measured in policy.trials(samples):
+        if measured:
+            samples.setdefault("time", []).append(next(noisy))
+    assert len(samples["time"]) == 10
+    assert not policy.is_stable(samples)
+
+
+def test_repetition_policy_max_time() -> None:
+    from time import sleep
+
+    policy = RepetitionPolicy(repeat=100, max_time=0.01)
+    trials = []
+    for label, _ in policy.trials():
+        trials.append(label)
+        sleep(0.01)
+    assert trials == ["trial1"]
+
+
+def test_distribution() -> None:
+    distribution = Distribution([4, 1, 3, 2, 5], [0, 0.5, 1, 1.5, 2], [8] * 5)
+    assert distribution.percentile(50) == 3
+    assert distribution.percentile(95) == approx(4.8)
+    assert distribution.percentile(0) == 1
+    assert distribution.percentile(100) == 5
+    assert distribution.get_throughput() == approx(16)
+    assert distribution.get_throughput_curve() == [(0, 16), (1, 16), (2, 8)]
+
+    summary = distribution.summarize()
+    assert summary["count"] == 5
+    assert summary["mean"] == 3
+    assert summary["p99"] == approx(4.96)
+    assert summary["throughput"] == approx(16)
+
+    untimed = Distribution([1.0])
+    assert untimed.get_throughput() is None
+    assert "throughput" not in untimed.summarize()
+    assert Distribution.serialize(untimed) == {
+        "samples": [1.0],
+        "summary": untimed.summarize(),
+    }
+
+    with raises(ValueError):
+        untimed.add(2.0, timestamp=1.0)
+    with raises(ValueError):
+        Distribution([1.0, 2.0], [0.0])
+
+
+def test_flatten_distributions() -> None:
+    stats = flatten_distributions(
+        {"latency": Distribution([1, 3]), "empty": Distribution()}
+    )
+    assert stats["latency_p50"] == 2
+    assert stats["latency_count"] == 2
+    assert not any(name.startswith("empty") for name in stats)
+
+
+def test_fit_power_law() -> None:
+    fit = fit_power_law([10, 100, 1000], [0.5, 50, 5000])
+    assert fit is not None
+    assert fit == approx((0.005, 2, 1))
+
+    fit = fit_power_law([1, 2, 4, 8], [1, 2.2, 3.9, 8.3])
+    assert fit is not None
+    _, exponent, r_squared = fit
+    assert exponent == approx(1, abs=0.05)
+    assert 0.9 < r_squared < 1
+
+    assert fit_power_law([10, 10], [1, 2]) is None
+    assert fit_power_law([10, 100], [1, 0]) is None
+
+
+def test_scaling_curve() -> None:
+    # Time doubles from 200 to 400: falling off a cliff
+    curve = ScalingCurve(
+        "time",
+        "n",
+        [400, 100, 200],
+        [0.016, 0.0001, 0.0008],
+        [2 * 400**3, 2 * 100**3, 2 * 200**3],
+        {"device": "cpu"},
+    )
+    assert curve.sizes == [100, 200, 400]
+    assert curve.exponent is not None and 3 < curve.exponent < 4
+    assert curve.get_local_exponents() == [None, approx(3), approx(4.3219, abs=1e-4)]
+    assert curve.get_gflops() == [approx(20), approx(20), approx(8)]
+
+    json = ScalingCurve.serialize(curve)
+    assert json["labels"] == {"device": "cpu"}
+    assert json["points"][2] == {
+        "size": 400,
+        "value": 0.016,
+        "local_exponent": approx(4.3219, abs=1e-4),
+        "flops": 2 * 400**3,
+        "gflops": approx(8),
+    }
+
+    single = ScalingCurve("time", "n", [100], [1])
+    assert single.exponent is None
+    assert single.get_gflops() is None
+
+    with raises(ValueError):
+        ScalingCurve("time", "n", [100, 200], [1])
+
+
+def test_evaluate_formula() -> None:
+    assert evaluate_formula("2 * n**3", {"n": 10}) == 2000
+    assert evaluate_formula("-(rows + 1) / 2 * cols", {"rows": 3, "cols": 4}) == -8
+
+    for formula in ("m * 2", "n.real", "print(n)", "n +", "1 / 0", "'n'"):
+        with raises(ValueError):
+            evaluate_formula(formula, {"n": 1})
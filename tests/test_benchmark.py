@@ -1,4 +1,5 @@
 from os.path import dirname, join, pardir
+from typing import TYPE_CHECKING
 
 from openforbc_benchmark.benchmark import (
     Benchmark,
@@ -13,9 +14,14 @@ from openforbc_benchmark.json import (
     BenchmarkRunDefinition,
     BenchmarkSuiteDefinition,
     CommandInfo,
+    PlacementDefinition,
+    ResourcesDefinition,
     StatMatchInfo,
 )
 
+if TYPE_CHECKING:
+    from typing import List, Optional
+
 O4BC_BENCH_DIR = join(dirname(__file__), pardir)
 
 
@@ -33,13 +39,17 @@ def get_dummy_py_benchmark() -> Benchmark:
 
 def get_dummy_run() -> BenchmarkRun:
     return BenchmarkRun(
-        get_dummy_benchmark(), [get_dummy_benchmark().get_default_preset()]
+        get_dummy_benchmark(),
+        [get_dummy_benchmark().get_default_preset()],
+        force_setup=True,
     )
 
 
 def get_dummy_py_run() -> BenchmarkRun:
     return BenchmarkRun(
-        get_dummy_py_benchmark(), [get_dummy_py_benchmark().get_default_preset()]
+        get_dummy_py_benchmark(),
+        [get_dummy_py_benchmark().get_default_preset()],
+        force_setup=True,
     )
 
 
@@ -210,6 +220,62 @@ def test_benchmark_run_from_definition() -> None:
     assert bench_run.presets[1].name == "preset2"
 
 
+def test_preset_expand() -> None:
+    sweep = Preset(
+        "sweep",
+        "{device} --size {size} {other}",
+        env={"DEVICE": "{device}"},
+        post_commands=[CommandInfo("rm out_{size}.txt")],
+        matrix={"size": [20, 200], "device": ["cpu", "gpu"]},
+    )
+    presets = sweep.expand()
+
+    assert [preset.name for preset in presets] == [
+        "sweep@size=20,device=cpu",
+        "sweep@size=20,device=gpu",
+        "sweep@size=200,device=cpu",
+        "sweep@size=200,device=gpu",
+    ]
+    assert presets[1].args == ["gpu", "--size", "20", "{other}"]
+    assert presets[1].env == {"DEVICE": "gpu"}
+    assert presets[1].post_commands is not None
+    assert presets[1].post_commands[0].command == ["rm", "out_20.txt"]
+    assert presets[1].sweep == "sweep"
+    assert presets[1].axes == {"size": 20, "device": "gpu"}
+    assert presets[1].matrix is None
+
+    preset = Preset("preset", "--size 1")
+    assert preset.expand() == [preset]
+
+
+def test_benchmark_get_sweep_preset() -> None:
+    benchmark = find_benchmark("matmul_benchmark", O4BC_BENCH_DIR)
+    assert benchmark is not None
+
+    sweep = benchmark.get_preset("matrix_sweep@device=cpu")
+    assert sweep is not None and sweep.matrix is not None
+    assert sweep.matrix["device"] == ["cpu"]
+    assert len(sweep.expand()) == len(sweep.matrix["size"])
+
+    preset = benchmark.get_preset("matrix_sweep@size=200,device=cpu")
+    assert preset is not None
+    assert preset.name == "matrix_sweep@device=cpu,size=200"
+    assert preset.args == ["cpu", "200", "200"]
+
+    assert benchmark.get_preset("matrix_sweep@device=tpu") is None
+    assert benchmark.get_preset("matrix_sweep@shape=200") is None
+    assert benchmark.get_preset("matrix_20x30_GPU@device=cpu") is None
+
+    bench_run = BenchmarkRun.from_definition(
+        BenchmarkRunDefinition("matmul_benchmark", ["matrix_sweep@size=20"]),
+        search_path=O4BC_BENCH_DIR,
+    )
+    assert [preset.name for preset in bench_run.presets] == [
+        "matrix_sweep@device=cpu,size=20",
+        "matrix_sweep@device=gpu,size=20",
+    ]
+
+
 def test_get_benchmarks() -> None:
     benchmarks = get_benchmarks(O4BC_BENCH_DIR)
     assert benchmarks
@@ -219,3 +285,77 @@ def test_find_benchmark() -> None:
     benchmark = find_benchmark("dummy_benchmark", O4BC_BENCH_DIR)
     assert benchmark is not None
     assert benchmark.name == "Dummy Benchmark"
+
+
+def test_benchmark_run_get_resources() -> None:
+    benchmark = get_dummy_benchmark()
+    preset1 = benchmark.get_preset("preset1")
+    preset2 = benchmark.get_preset("preset2")
+    assert preset1 is not None and preset2 is not None
+
+    resources = BenchmarkRun(benchmark, [preset1]).get_resources()
+    assert resources.cores is None
+    assert not resources.exclusive
+
+    preset1.resources = ResourcesDefinition(cores=4)
+    preset2.resources = ResourcesDefinition(cores=2, exclusive=True)
+    resources = BenchmarkRun(benchmark, [preset1, preset2]).get_resources()
+    assert resources.cores == 4
+    assert resources.exclusive
+
+    run = BenchmarkRun(benchmark, [preset1, preset2], ResourcesDefinition(cores=1))
+    assert run.get_resources().cores == 1
+    assert not run.get_resources().exclusive
+
+
+def test_benchmark_run_placement() -> None:
+    benchmark = get_dummy_benchmark()
+    preset = benchmark.get_default_preset()
+    preset.placement = PlacementDefinition(cpus=[0], isolate=True)
+
+    run = BenchmarkRun(benchmark, [preset])
+    assert run.get_placement(preset) is preset.placement
+
+    # Only the run commands are placed
+    tasks = list(run.run_preset(preset))
+    assert tasks[-1].placement is preset.placement
+    assert all(task.placement is None for task in run.setup())
+
+    placement = PlacementDefinition(numa_node=0)
+    run = BenchmarkRun(benchmark, [preset], placement=placement)
+    assert run.get_placement(preset) is placement
+
+
+def test_benchmark_run_timeout() -> None:
+    benchmark = get_dummy_benchmark()
+    benchmark.run_commands = [CommandInfo("true", timeout=5), CommandInfo("true")]
+    preset = benchmark.get_default_preset()
+
+    def get_timeouts(run: BenchmarkRun) -> "List[Optional[float]]":
+        return [task.timeout for task in run.run_preset(preset)]
+
+    # The preset has an init command as well
+    run = BenchmarkRun(benchmark, [preset])
+    assert get_timeouts(run) == [None, 5, None]
+
+    # The command's timeout comes first, then the preset's and the run's ones
+    run.timeout = 30
+    assert get_timeouts(run) == [30, 5, 30]
+    assert all(task.timeout == 30 for task in run.test())
+    preset.timeout = 10
+    assert get_timeouts(run) == [10, 5, 10]
+    assert all(task.timeout == 30 for task in run.test())
+
+    suite = BenchmarkSuite.from_definition(
+        BenchmarkSuiteDefinition(
+            "Test suite",
+            "",
+            [
+                BenchmarkRunDefinition("dummy_benchmark", ["preset1"]),
+                BenchmarkRunDefinition("dummy_benchmark", ["preset1"], timeout=20),
+            ],
+            timeout=60,
+        ),
+        search_path=O4BC_BENCH_DIR,
+    )
+    assert [run.timeout for run in suite.benchmark_runs] == [60, 20]
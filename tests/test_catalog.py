@@ -0,0 +1,89 @@
+from json import load
+from os import mkdir, utime
+from os.path import join
+from shutil import copytree
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import find_benchmark, get_benchmarks
+from openforbc_benchmark.catalog import BenchmarkCatalog
+from openforbc_benchmark.json import BenchmarkDefinition
+
+from tests.test_benchmark import O4BC_BENCH_DIR
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from pytest import MonkeyPatch
+
+
+def make_search_path(tmp_path: "Path") -> str:
+    search_path = str(tmp_path / "search")
+    mkdir(search_path)
+    copytree(
+        join(O4BC_BENCH_DIR, "benchmarks", "dummy_benchmark"),
+        join(search_path, "benchmarks", "dummy_benchmark"),
+    )
+    return search_path
+
+
+def test_catalog_find(tmp_path: "Path") -> None:
+    search_path = make_search_path(tmp_path)
+    catalog = BenchmarkCatalog(str(tmp_path / "catalog.json"))
+
+    benchmark = find_benchmark("dummy_benchmark", search_path, catalog)
+    assert benchmark is not None
+    assert benchmark.name == "Dummy Benchmark"
+    assert benchmark.get_id() == "dummy_benchmark"
+
+    assert find_benchmark("missing_benchmark", search_path, catalog) is None
+    assert find_benchmark("..", search_path, catalog) is None
+
+
+def test_catalog_persistence(tmp_path: "Path", monkeypatch: "MonkeyPatch") -> None:
+    search_path = make_search_path(tmp_path)
+    path = str(tmp_path / "catalog.json")
+
+    assert BenchmarkCatalog(path).find("dummy_benchmark", search_path) is not None
+
+    with open(path, "r") as file:
+        index = load(file)
+    (root,) = index["roots"].values()
+    assert root["dummy_benchmark"]["definition"]["name"] == "Dummy Benchmark"
+
+    # A new catalog instance must not need to parse the definition file again
+    definition_file = join(
+        search_path, "benchmarks", "dummy_benchmark", "benchmark.json"
+    )
+    catalog = BenchmarkCatalog(path)
+    catalog._index = None  # type: ignore
+    # ...nor to validate it again
+    with monkeypatch.context() as m:
+        m.setattr(BenchmarkDefinition, "validate", None)
+        benchmark = catalog.find("dummy_benchmark", search_path)
+    assert benchmark is not None
+    assert benchmark.dir.endswith("dummy_benchmark")
+
+    # A modified definition must be re-indexed
+    with open(definition_file, "r") as file:
+        definition = file.read()
+    with open(definition_file, "w") as file:
+        file.write(definition.replace("Does nothing", "Does nothing at all"))
+    utime(definition_file, ns=(0, 0))
+
+    benchmark = BenchmarkCatalog(path).find("dummy_benchmark", search_path)
+    assert benchmark is not None
+    assert benchmark.description == "Does nothing at all"
+
+
+def test_catalog_benchmarks(tmp_path: "Path") -> None:
+    from shutil import rmtree
+
+    search_path = make_search_path(tmp_path)
+    catalog = BenchmarkCatalog(str(tmp_path / "catalog.json"))
+
+    assert [b.get_id() for b in get_benchmarks(search_path, catalog)] == [
+        "dummy_benchmark"
+    ]
+
+    rmtree(join(search_path, "benchmarks", "dummy_benchmark"))
+    assert not list(get_benchmarks(search_path, catalog))
+    assert find_benchmark("dummy_benchmark", search_path, catalog) is None
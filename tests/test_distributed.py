@@ -0,0 +1,196 @@
+from json import dumps
+from threading import Thread
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import BenchmarkSuite
+from openforbc_benchmark.cli.suite import run_work_item
+from openforbc_benchmark.distributed import (
+    Agent,
+    Coordinator,
+    DEFAULT_PORT,
+    parse_address,
+    receive,
+    send,
+)
+from tests.cli.test_benchmark import make_slow_benchmark
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import List
+
+
+def make_suite(search_path: "Path") -> BenchmarkSuite:
+    """Create a suite with three presets of the slow benchmark."""
+    make_slow_benchmark(search_path)
+    (search_path / "suites").mkdir()
+    (search_path / "suites" / "distributed.json").write_text(
+        dumps(
+            {
+                "name": "Distributed suite",
+                "description": "Runs on many hosts",
+                "benchmark_runs": [
+                    {"benchmark_folder": "slow_benchmark", "presets": ["fast"]},
+                    {
+                        "benchmark_folder": "slow_benchmark",
+                        "presets": ["fast", "fast"],
+                    },
+                ],
+            }
+        )
+    )
+
+    return BenchmarkSuite.from_definition_file(
+        str(search_path / "suites" / "distributed.json"), str(search_path)
+    )
+
+
+def start_agent(
+    coordinator: Coordinator, search_path: str, done: "List[int]"
+) -> Thread:
+    """Start an agent thread, appending the number of items it ran to `done`."""
+    agent = Agent(
+        coordinator.address,
+        lambda item: run_work_item(item, search_path, {"sample_interval": 0}),
+    )
+    thread = Thread(target=lambda: done.append(agent.run(10)))
+    thread.start()
+    return thread
+
+
+def test_coordinator(tmp_path: "Path") -> None:
+    coordinator = Coordinator(
+        make_suite(tmp_path), str(tmp_path / "results"), address=("127.0.0.1", 0)
+    )
+    coordinator.start()
+
+    done: "List[int]" = []
+    agents = [start_agent(coordinator, str(tmp_path), done) for _ in range(2)]
+    results = coordinator.wait(60)
+    for agent in agents:
+        agent.join(30)
+    coordinator.stop()
+
+    assert sum(done) == 3
+    assert [(result.item.run, result.item.get_preset()) for result in results] == [
+        (0, "fast"),
+        (1, "fast"),
+        (1, "fast"),
+    ]
+    for result in results:
+        assert result.status == "ok"
+        assert result.stats == {"fast": {"x": 1, "y": 2}}
+        assert result.log_dir is not None
+        assert (tmp_path / "results" / result.log_dir / "run_fast.1.out.log").exists()
+
+
+def test_coordinator_requeue(tmp_path: "Path") -> None:
+    from socket import create_connection
+
+    messages: "List[str]" = []
+    coordinator = Coordinator(
+        make_suite(tmp_path),
+        str(tmp_path / "results"),
+        address=("127.0.0.1", 0),
+        log=messages.append,
+    )
+    coordinator.start()
+
+    # An agent leaving while running an item
+    with create_connection(coordinator.address) as connection, connection.makefile(
+        "rwb"
+    ) as file:
+        send(file, {"type": "hello", "agent": "lost"})
+        send(file, {"type": "request"})
+        reply = receive(file)
+        assert reply is not None and reply["type"] == "work"
+
+    done: "List[int]" = []
+    start_agent(coordinator, str(tmp_path), done).join(60)
+    coordinator.stop()
+
+    assert done == [3]
+    assert len(coordinator.wait(0)) == 3
+    assert any("handing it out again" in message for message in messages)
+
+
+def test_coordinator_invalid_result(tmp_path: "Path") -> None:
+    from socket import create_connection
+
+    messages: "List[str]" = []
+    coordinator = Coordinator(
+        make_suite(tmp_path),
+        str(tmp_path / "results"),
+        address=("127.0.0.1", 0),
+        log=messages.append,
+    )
+    coordinator.start()
+
+    # An agent sending a result without a status
+    with create_connection(coordinator.address) as connection, connection.makefile(
+        "rwb"
+    ) as file:
+        send(file, {"type": "hello", "agent": "broken"})
+        send(file, {"type": "request"})
+        reply = receive(file)
+        assert reply is not None and reply["type"] == "work"
+        send(file, {"type": "result", "id": reply["item"]["id"]})
+        assert receive(file) is None
+
+    done: "List[int]" = []
+    start_agent(coordinator, str(tmp_path), done).join(60)
+    coordinator.stop()
+
+    assert done == [3]
+    assert [result.status for result in coordinator.wait(0)] == ["ok"] * 3
+    assert any("Invalid result" in message for message in messages)
+    assert any("handing it out again" in message for message in messages)
+
+
+def test_coordinator_max_attempts(tmp_path: "Path") -> None:
+    from socket import create_connection
+
+    coordinator = Coordinator(
+        make_suite(tmp_path),
+        str(tmp_path / "results"),
+        address=("127.0.0.1", 0),
+        max_attempts=2,
+    )
+    coordinator.start()
+
+    # Every agent leaves while running the first item
+    for _ in range(2):
+        with create_connection(coordinator.address) as connection, connection.makefile(
+            "rwb"
+        ) as file:
+            send(file, {"type": "hello", "agent": "lost"})
+            send(file, {"type": "request"})
+            reply = receive(file)
+            assert reply is not None and reply["item"]["id"] == 0
+
+    done: "List[int]" = []
+    start_agent(coordinator, str(tmp_path), done).join(60)
+    coordinator.stop()
+
+    assert done == [2]
+    results = coordinator.wait(0)
+    assert results[0].status == "failed"
+    assert results[0].error is not None and "Handed out 2 times" in results[0].error
+    assert [result.status for result in results[1:]] == ["ok", "ok"]
+
+
+def test_run_work_item_error(tmp_path: "Path") -> None:
+    suite = make_suite(tmp_path)
+    (tmp_path / "benchmarks" / "slow_benchmark" / "presets" / "fast.json").write_text(
+        dumps({"args": 0})
+    )
+
+    coordinator = Coordinator(suite, str(tmp_path / "results"))
+    result = run_work_item(coordinator.items[0], str(tmp_path), {})
+    assert result.status == "failed"
+    assert result.error is not None
+
+
+def test_parse_address() -> None:
+    assert parse_address("node1") == ("node1", DEFAULT_PORT)
+    assert parse_address("node1:1234") == ("node1", 1234)
+    assert parse_address("[::1]:1234") == ("::1", 1234)
@@ -0,0 +1,74 @@
+from pytest import raises
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.analysis import RepetitionPolicy
+from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun, Preset
+from openforbc_benchmark.journal import (
+    get_preset_hash,
+    JournalEntry,
+    JournalError,
+    SuiteJournal,
+)
+from openforbc_benchmark.json import CommandInfo
+from tests.cli.test_benchmark import make_slow_benchmark
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_journal(tmp_path: "Path") -> None:
+    path = str(tmp_path / "journals" / "suite.jsonl")
+    journal = SuiteJournal(path, "Suite")
+    journal.add(JournalEntry(0, "preset1", "a", "logs/1", {"x": 1}, {"x": [1]}))
+    journal.add(JournalEntry(1, "preset1", "b", "logs/2", {"x": 2}, {"x": [2]}))
+    journal.add(JournalEntry(0, "preset1", "c", "logs/3", {"x": 3}, {"x": [3]}))
+
+    # The journal can't be overwritten
+    with raises(JournalError):
+        SuiteJournal(path, "Suite")
+
+    journal = SuiteJournal(path, "Suite", resume=True)
+    entry = journal.get(0, "preset1")
+    assert entry is not None
+    assert (entry.hash, entry.log_dir, entry.stats) == ("c", "logs/3", {"x": 3})
+    assert journal.get(1, "preset2") is None
+
+    with raises(JournalError):
+        SuiteJournal(path, "Another suite", resume=True)
+    with raises(JournalError):
+        SuiteJournal(str(tmp_path / "missing.jsonl"), "Suite", resume=True)
+
+    # A line cut short by the suite dying is ignored
+    with open(path, "a") as file:
+        file.write('{"run": 2, "pre')
+    assert SuiteJournal(path, "Suite", resume=True).get(1, "preset1") is not None
+
+
+def test_preset_hash(tmp_path: "Path") -> None:
+    make_slow_benchmark(tmp_path)
+    benchmark_dir = tmp_path / "benchmarks" / "slow_benchmark"
+    benchmark = Benchmark.from_definition_file(str(benchmark_dir / "benchmark.json"))
+    fast, slow = sorted(benchmark.get_presets(), key=lambda preset: preset.name)
+    benchmark_run = BenchmarkRun(benchmark, [fast, slow])
+    policy = RepetitionPolicy()
+
+    hash = get_preset_hash(benchmark_run, fast, policy)
+    assert hash == get_preset_hash(benchmark_run, fast, RepetitionPolicy())
+    assert hash != get_preset_hash(benchmark_run, slow, policy)
+    assert hash != get_preset_hash(benchmark_run, fast, RepetitionPolicy(3))
+
+    # The benchmark's scripts are part of its definition
+    (benchmark_dir / "run.sh").write_text('echo "x: 1"\n')
+    assert hash != get_preset_hash(benchmark_run, fast, policy)
+
+    # ...so are the ones in the preset's arguments and in the worker command
+    (benchmark_dir / "script.sh").write_text("echo 1\n")
+    (benchmark_dir / "worker.sh").write_text("echo 1\n")
+    script = Preset("script", ["script.sh"])
+    benchmark.worker_command = CommandInfo("sh worker.sh")
+    hash = get_preset_hash(benchmark_run, script, policy)
+    (benchmark_dir / "script.sh").write_text("echo 2\n")
+    assert hash != get_preset_hash(benchmark_run, script, policy)
+    hash = get_preset_hash(benchmark_run, script, policy)
+    (benchmark_dir / "worker.sh").write_text("echo 2\n")
+    assert hash != get_preset_hash(benchmark_run, script, policy)
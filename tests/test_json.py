@@ -6,7 +6,9 @@ from openforbc_benchmark.json import (
     BenchmarkStats,
     BenchmarkSuiteDefinition,
     CommandInfo,
+    PlacementDefinition,
     PresetDefinition,
+    ResourcesDefinition,
     StatMatchInfo,
 )
 
@@ -74,6 +76,10 @@ def test_preset_deserialization() -> None:
     assert preset.init_commands[0].command == ["setup_preset.sh", "preset_57.conf"]
     assert preset.post_commands is not None
     assert preset.post_commands[0].command == ["setup_preset.sh", "--teardown"]
+    assert preset.timeout is None
+
+    preset = PresetDefinition.deserialize({"args": "", "timeout": 600})
+    assert preset.timeout == 600
 
 
 def test_benchmark_suite_deserialization() -> None:
@@ -127,6 +133,13 @@ def test_command_deserialization() -> None:
     assert cmd_3.command == ["echo", "hello world"]
     assert cmd_3.env == {"GPU": "CUDA"}
     assert cmd_3.workdir == "presets/gpu"
+    assert cmd_3.timeout is None
+
+    cmd_4 = CommandInfo.deserialize({"command": "sleep 10", "timeout": 2.5})
+    assert cmd_4.timeout == 2.5
+    assert cmd_4.into_runnable().timeout == 2.5
+    assert CommandInfo.serialize(cmd_4)["timeout"] == 2.5
+    assert "timeout" not in CommandInfo.serialize(cmd_3)
 
 
 def test_stat_match_deserialization() -> None:
@@ -140,6 +153,11 @@ def test_stat_match_deserialization() -> None:
     assert isinstance(statmatch, StatMatchInfo)
     assert statmatch.file == "output"
     assert statmatch.regex == "testregex ()"
+    assert statmatch.lines is None
+
+    statmatch = StatMatchInfo.deserialize({"regex": "a\nb ()", "lines": 2})
+    assert statmatch.lines == 2
+    assert StatMatchInfo.serialize(statmatch) == {"regex": "a\nb ()", "lines": 2}
 
 
 def test_stats_deserialization() -> None:
@@ -167,6 +185,21 @@ def test_stats_deserialization() -> None:
     with raises(ValidationError):
         BenchmarkStats.deserialize(invalid_json_2)
 
+    stats = BenchmarkStats.deserialize(
+        {"data1": 1, "latency": {"samples": [1, 2, 3], "timestamps": [0, 1, 2]}}
+    )
+    assert list(stats.distributions["latency"].samples) == [1, 2, 3]
+    all_stats = stats.get_all_stats()
+    assert all_stats["data1"] == 1
+    assert all_stats["latency_p50"] == 2
+    assert all_stats["latency_throughput"] == 1
+    assert BenchmarkStats.serialize(stats)["latency"]["timestamps"] == [0, 1, 2]
+
+    with raises(ValidationError):
+        BenchmarkStats.deserialize({"latency": {"samples": []}})
+    with raises(ValidationError):
+        BenchmarkStats.deserialize({"latency": {"samples": [1], "counts": [1, 1]}})
+
 
 def test_benchmark_run_definition() -> None:
     json = r"""
@@ -179,3 +212,80 @@ def test_benchmark_run_definition() -> None:
     assert isinstance(run, BenchmarkRunDefinition)
     assert run.benchmark_folder == "dummy"
     assert run.presets == ["preset1", "preset2"]
+
+
+def test_validator_cache() -> None:
+    from openforbc_benchmark.json import get_validator
+
+    validator = get_validator("benchmark_preset.schema.json")
+    assert get_validator("benchmark_preset.schema.json") is validator
+    assert validator.is_valid({"args": "--preset"})
+    assert not validator.is_valid({"env": {}})
+
+
+def test_resources_deserialization() -> None:
+    from jsonschema import ValidationError
+    from pytest import raises
+
+    json = r"""
+    {
+        "args": "--threads 8",
+        "resources": { "cores": 8, "exclusive": true }
+    }
+    """
+    preset = PresetDefinition.deserialize(loads(json))
+    assert isinstance(preset.resources, ResourcesDefinition)
+    assert preset.resources.cores == 8
+    assert preset.resources.exclusive
+
+    run = BenchmarkRunDefinition.deserialize(
+        loads('{"benchmark_folder": "dummy", "presets": "p", "resources": {}}')
+    )
+    assert isinstance(run.resources, ResourcesDefinition)
+    assert run.resources.cores is None
+    assert not run.resources.exclusive
+
+    with raises(ValidationError):
+        PresetDefinition.deserialize({"args": "", "resources": {"cores": 0}})
+    run_json = {"benchmark_folder": "d", "presets": "p", "resources": {"cores": 0}}
+    with raises(ValidationError):
+        BenchmarkSuiteDefinition.deserialize(
+            {"name": "s", "description": "", "benchmark_runs": [run_json]}
+        )
+
+
+def test_placement_deserialization() -> None:
+    from jsonschema import ValidationError
+    from pytest import raises
+
+    json = r"""
+    {
+        "args": "--threads 4",
+        "placement": { "cpus": "0-3, 8", "numa_node": 0, "isolate": true }
+    }
+    """
+    preset = PresetDefinition.deserialize(loads(json))
+    assert isinstance(preset.placement, PlacementDefinition)
+    assert preset.placement.cpus == [0, 1, 2, 3, 8]
+    assert preset.placement.numa_node == 0
+    assert preset.placement.isolate
+
+    run = BenchmarkRunDefinition.deserialize(
+        loads('{"benchmark_folder": "d", "presets": "p", "placement": {"cpus": [2]}}')
+    )
+    assert isinstance(run.placement, PlacementDefinition)
+    assert run.placement.cpus == [2]
+    assert run.placement.numa_node is None
+    assert not run.placement.isolate
+    assert PlacementDefinition.serialize(run.placement) == {
+        "cpus": [2],
+        "isolate": False,
+    }
+
+    with raises(ValidationError):
+        PresetDefinition.deserialize({"args": "", "placement": {"cpus": "0-"}})
+    run_json = {"benchmark_folder": "d", "presets": "p", "placement": {"cpus": "0-"}}
+    with raises(ValidationError):
+        BenchmarkSuiteDefinition.deserialize(
+            {"name": "s", "description": "", "benchmark_runs": [run_json]}
+        )
@@ -0,0 +1,132 @@
+import os
+from pytest import mark, raises
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark import placement as placement_module
+from openforbc_benchmark.json import PlacementDefinition
+from openforbc_benchmark.placement import (
+    format_cpu_list,
+    parse_cpu_list,
+    Placement,
+    PlacementError,
+)
+from openforbc_benchmark.utils import Runnable
+
+if TYPE_CHECKING:
+    from typing import List
+    from pytest import MonkeyPatch
+
+
+def mock_host(monkeypatch: "MonkeyPatch", numactl: bool = False) -> None:
+    """Mock a host with two NUMA nodes of four CPUs each."""
+    nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+    def get_node_cpus(node: int) -> "List[int]":
+        if node not in nodes:
+            raise PlacementError(f"NUMA node {node} not found")
+        return nodes[node]
+
+    monkeypatch.setattr(placement_module, "get_available_cpus", lambda: list(range(8)))
+    monkeypatch.setattr(placement_module, "get_node_cpus", get_node_cpus)
+    monkeypatch.setattr(
+        "shutil.which", lambda name: f"/usr/bin/{name}" if numactl else None
+    )
+
+
+def test_cpu_list() -> None:
+    assert parse_cpu_list("0-3,8") == [0, 1, 2, 3, 8]
+    assert parse_cpu_list(" 5, 1-2 ,2\n") == [1, 2, 5]
+    assert format_cpu_list([8, 0, 1, 2, 3]) == "0-3,8"
+    assert format_cpu_list([1, 3, 5, 6]) == "1,3,5-6"
+
+    with raises(ValueError):
+        parse_cpu_list("3-1")
+    with raises(ValueError):
+        parse_cpu_list("a")
+
+
+def test_placement_resolve(monkeypatch: "MonkeyPatch") -> None:
+    mock_host(monkeypatch)
+
+    placement = Placement.resolve(PlacementDefinition(cpus=[2, 3, 9]))
+    assert placement.cpus == [2, 3]
+    assert placement.harness_cpus is None
+    assert placement.get_command(["bench"]) == ["bench"]
+
+    # Without numactl only the CPUs are bound to the node
+    placement = Placement.resolve(PlacementDefinition(numa_node=1))
+    assert placement.cpus == [4, 5, 6, 7]
+    assert not placement.membind
+
+    placement = Placement.resolve(PlacementDefinition(cpus=[3, 4], numa_node=1))
+    assert placement.cpus == [4]
+
+    with raises(PlacementError):
+        Placement.resolve(PlacementDefinition(cpus=[9]))
+    with raises(PlacementError):
+        Placement.resolve(PlacementDefinition(numa_node=2))
+
+
+def test_placement_isolate(monkeypatch: "MonkeyPatch") -> None:
+    mock_host(monkeypatch)
+
+    placement = Placement.resolve(PlacementDefinition(numa_node=0, isolate=True))
+    assert placement.cpus == [0, 1, 2, 3]
+    assert placement.harness_cpus == [4, 5, 6, 7]
+
+    # With every CPU requested the harness takes the first one
+    placement = Placement.resolve(PlacementDefinition(isolate=True))
+    assert placement.cpus == [1, 2, 3, 4, 5, 6, 7]
+    assert placement.harness_cpus == [0]
+
+    placement = Placement.resolve(
+        PlacementDefinition(cpus=list(range(8)), isolate=True)
+    )
+    assert placement.cpus == [1, 2, 3, 4, 5, 6, 7]
+    assert Placement.serialize(placement) == {
+        "cpus": "1-7",
+        "numa_node": None,
+        "membind": False,
+        "harness_cpus": "0",
+    }
+
+    monkeypatch.setattr(placement_module, "get_available_cpus", lambda: [0])
+    placement = Placement.resolve(PlacementDefinition(isolate=True))
+    assert placement.cpus is None
+    assert placement.harness_cpus is None
+
+
+def test_placement_numactl(monkeypatch: "MonkeyPatch") -> None:
+    mock_host(monkeypatch, numactl=True)
+
+    placement = Placement.resolve(PlacementDefinition(numa_node=1))
+    assert placement.membind
+    assert placement.get_command(["bench", "-x"]) == [
+        "numactl",
+        "--membind=1",
+        "--",
+        "bench",
+        "-x",
+    ]
+    assert "memory bound with numactl" in repr(placement)
+
+
+@mark.skipif(not hasattr(os, "sched_getaffinity"), reason="No CPU affinity support")
+def test_placement_spawn() -> None:
+    from os import sched_getaffinity
+    from subprocess import PIPE, run
+    from sys import executable
+
+    cpu = min(sched_getaffinity(0))
+    task = Runnable(
+        [executable, "-c", "import os; print(sorted(os.sched_getaffinity(0)))"],
+        placement=PlacementDefinition(cpus=[cpu]),
+    )
+    result = run(**task.into_popen_args(), stdout=PIPE)
+    assert result.stdout.decode().strip() == f"[{cpu}]"
+
+    placement = Placement([cpu], harness_cpus=[cpu])
+    available = sched_getaffinity(0)
+    with placement.isolate_harness():
+        assert sched_getaffinity(0) == {cpu}
+    assert sched_getaffinity(0) == available
@@ -0,0 +1,97 @@
+from io import BytesIO
+from subprocess import PIPE, Popen
+from sys import executable
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.process import CHUNK_SIZE, LineMirror, OutputPump
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import List
+
+
+def run_python(code: str, pump: OutputPump) -> int:
+    return pump.run(Popen([executable, "-c", code], stdout=PIPE, stderr=PIPE))
+
+
+def test_output_pump() -> None:
+    out_log, err_log = BytesIO(), BytesIO()
+    mirrored: "List[str]" = []
+    chunks: "List[bytes]" = []
+
+    pump = OutputPump(out_log, err_log, mirror=mirrored.append)
+    pump.add_consumer(chunks.append)
+    ret = run_python(
+        "import sys\n"
+        "print('out1')\n"
+        "print('err1', file=sys.stderr)\n"
+        "sys.stdout.write('x' * 200000 + '\\nno newline')\n"
+        "sys.exit(3)",
+        pump,
+    )
+
+    assert ret == 3
+    assert out_log.getvalue() == b"out1\n" + b"x" * 200000 + b"\nno newline"
+    assert err_log.getvalue() == b"err1\n"
+    assert b"".join(chunks) == out_log.getvalue()
+
+    lines = "\n".join(mirrored).split("\n")
+    assert "out1" in lines
+    assert "err1" in lines
+    assert "no newline" in lines
+
+
+def test_output_pump_no_mirror() -> None:
+    out_log = BytesIO()
+    pump = OutputPump(out_log, BytesIO())
+    assert run_python("print('a' * (2 * %d))" % CHUNK_SIZE, pump) == 0
+    assert out_log.getvalue() == b"a" * (2 * CHUNK_SIZE) + b"\n"
+
+
+def test_line_mirror() -> None:
+    batches: "List[str]" = []
+    mirror = LineMirror(batches.append, interval=1000, max_lines=3)
+
+    mirror.feed(b"first\n")
+    mirror.flush()
+    assert batches == ["first"]
+
+    # Rate limited: nothing is mirrored until the interval has passed
+    mirror.feed(b"10%\r50%\r100%\nline1\nline2\nline3\npartial")
+    mirror.flush()
+    assert batches == ["first"]
+    assert mirror.get_timeout() is not None
+
+    mirror.flush(final=True)
+    assert batches[1] == "[2 lines omitted, see logs]\nline2\nline3\npartial"
+
+    mirror.feed(b"10%\r50%\r100%\r\n")
+    mirror.flush(final=True)
+    assert batches[2] == "100%"
+
+
+def test_output_pump_timeout(tmp_path: "Path") -> None:
+    from contextlib import suppress
+    from time import monotonic
+
+    pid_file = tmp_path / "child.pid"
+    out_log = BytesIO()
+    pump = OutputPump(out_log, BytesIO())
+    start = monotonic()
+
+    # The child, which keeps the pipes open, is killed along with its parent
+    proc = Popen(
+        ["sh", "-c", f"echo started; sleep 30 & echo $! > {pid_file}; wait"],
+        stdout=PIPE,
+        stderr=PIPE,
+        start_new_session=True,
+    )
+    assert pump.run(proc, timeout=0.5) < 0
+    assert monotonic() - start < 10
+    assert pump.timed_out
+    assert out_log.getvalue() == b"started\n"
+
+    # (it may be left as a zombie, if nothing reaps orphans)
+    stat_file = f"/proc/{pid_file.read_text().strip()}/stat"
+    with suppress(FileNotFoundError), open(stat_file) as stat:
+        assert stat.read().split(")")[-1].split()[0] == "Z"
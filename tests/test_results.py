@@ -0,0 +1,148 @@
+from pytest import approx, raises
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.analysis import prediction_test
+from openforbc_benchmark.benchmark import Preset
+from openforbc_benchmark.results import (
+    compare,
+    get_params_hash,
+    get_scaling_curves,
+    ResultStore,
+    ResultStoreError,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+PRESET = Preset("preset1", ["--config=preset1"], env={"THREADS": "4"})
+
+
+def test_prediction_test() -> None:
+    baseline = [100.0, 101.0, 99.0, 100.5, 99.5]
+    assert prediction_test(baseline, 100.0) == approx(1.0)
+    assert prediction_test(baseline, 101.0) > 0.05
+    assert prediction_test(baseline, 90.0) < 0.001
+    assert prediction_test([1.0, 1.0], 1.0) == 1.0
+    assert prediction_test([1.0, 1.0], 2.0) == 0.0
+
+    with raises(ValueError):
+        prediction_test([1.0], 1.0)
+
+
+def test_params_hash() -> None:
+    other_env = Preset("preset1", ["--config=preset1"], env={"THREADS": "8"})
+    renamed = Preset("renamed", ["--config=preset1"], env={"THREADS": "4"})
+
+    assert get_params_hash(PRESET) != get_params_hash(other_env)
+    assert get_params_hash(PRESET) == get_params_hash(renamed)
+
+
+def test_result_store(tmp_path: "Path") -> None:
+    path = str(tmp_path / "results.db")
+
+    with ResultStore(path) as store:
+        first = store.add_run("bench", PRESET, {"fps": [60, 62]}, timestamp=1.0)
+        second = store.add_run("bench", PRESET, {"fps": [61]}, "logs/x", 2.0)
+        store.add_run("other", PRESET, {"time": [1.5]}, timestamp=3.0)
+
+    with ResultStore(path) as store:
+        runs = store.get_runs("bench")
+        assert [run.id for run in runs] == [second, first]
+        assert runs[0].log_dir == "logs/x"
+        assert runs[0].metadata["env"] == {"THREADS": "4"}
+        assert runs[1].samples == {"fps": [60, 62]}
+        assert runs[1].get_means() == {"fps": 61}
+
+        assert [run.id for run in store.get_runs(before=2.0)] == [first]
+        assert len(store.get_runs(limit=2)) == 2
+        assert len(store.get_series()) == 2
+
+        run = store.get_run(first)
+        assert run is not None and run.benchmark == "bench"
+        assert store.get_run(1000) is None
+
+        # "_" is not a wildcard
+        point = store.add_run("bench", Preset("a_b@n=1", []), {"x": [1]}, None, 4.0)
+        store.add_run("bench", Preset("axb@n=1", []), {"x": [2]}, None, 5.0)
+        runs = store.get_latest_runs("bench")
+        assert [(run.preset, run.id) for run in runs] == [
+            ("a_b@n=1", point),
+            ("axb@n=1", point + 1),
+            ("preset1", second),
+        ]
+        assert runs[0].samples == {"x": [1]}
+        assert [run.id for run in store.get_latest_runs("bench", "a_b@")] == [point]
+
+
+def test_result_store_newer_schema(tmp_path: "Path") -> None:
+    from sqlite3 import connect
+
+    path = str(tmp_path / "results.db")
+    db = connect(path)
+    db.execute("PRAGMA user_version = 1000")
+    db.close()
+
+    with raises(ResultStoreError):
+        ResultStore(path)
+
+
+def test_compare(tmp_path: "Path") -> None:
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        for i, (fps, time) in enumerate(
+            [(60, 10), (61, 10.2), (59, 9.9), (60.5, 10.1), (59.5, 9.8)]
+        ):
+            store.add_run("bench", PRESET, {"fps": [fps], "time": [time]}, None, i)
+
+        comparisons = {c.stat: c for c in compare(store)}
+        assert comparisons["fps"].get_status() == "ok"
+        assert comparisons["fps"].higher_is_better
+        assert not comparisons["time"].higher_is_better
+
+        # Lower fps and higher time are both regressions
+        store.add_run("bench", PRESET, {"fps": [50], "time": [12]}, None, 10)
+        comparisons = {c.stat: c for c in compare(store)}
+        assert comparisons["fps"].is_regression()
+        assert comparisons["fps"].get_change() == approx(50 / 60 - 1)
+        assert comparisons["time"].get_status() == "REGRESSION"
+
+        comparisons = {c.stat: c for c in compare(store, higher_is_better="time")}
+        assert comparisons["fps"].get_status() == "improvement"
+        assert not comparisons["time"].is_regression()
+
+        # A window of one run isn't enough to estimate the variance
+        assert all(
+            c.get_status() == "insufficient data" for c in compare(store, window=1)
+        )
+
+
+def test_get_scaling_curves(tmp_path: "Path") -> None:
+    sweep = Preset(
+        "sweep", ["{device}", "{n}"], matrix={"device": ["cpu", "gpu"], "n": [10, 100]}
+    )
+
+    with ResultStore(str(tmp_path / "results.db")) as store:
+        for preset in sweep.expand():
+            assert preset.axes is not None
+            n = float(preset.axes["n"])
+            store.add_run("bench", preset, {"time": [n**2 / 1e4]}, timestamp=1.0)
+        # Only the latest run of each preset is used
+        gpu_100 = next(p for p in sweep.expand() if p.name == "sweep@device=gpu,n=100")
+        store.add_run("bench", gpu_100, {"time": [1e-2]}, timestamp=2.0)
+        store.add_run("bench", PRESET, {"time": [1.0]}, timestamp=3.0)
+
+        cpu, gpu = get_scaling_curves(store, "bench", "sweep", "time", "n", "n**2")
+        assert cpu.labels == {"device": "cpu"}
+        assert cpu.sizes == [10, 100]
+        assert cpu.exponent == approx(2)
+        assert cpu.get_gflops() == [approx(1e-5), approx(1e-5)]
+        assert gpu.labels == {"device": "gpu"}
+        assert gpu.values == [approx(1e-2), approx(1e-2)]
+        assert gpu.exponent == approx(0)
+
+        assert get_scaling_curves(store, "bench", "sweep", "fps", "n") == []
+        with raises(ValueError):
+            get_scaling_curves(store, "bench", "sweep", "time", "size")
+        with raises(ValueError):
+            get_scaling_curves(store, "bench", "sweep", "time", "device")
+        with raises(ValueError):
+            get_scaling_curves(store, "bench", "sweep", "time", "n", "2 * size")
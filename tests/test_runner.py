@@ -0,0 +1,184 @@
+from asyncio import create_task, run, sleep
+from json import dump
+from pytest import raises
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun
+from openforbc_benchmark.runner import (
+    AsyncBenchmarkRunner,
+    StatFound,
+    TaskFailed,
+    TaskFinished,
+    TaskOutput,
+    TaskStarted,
+)
+from openforbc_benchmark.venv_cache import VenvCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Any, List, Optional
+    from openforbc_benchmark.runner import RunnerEvent, Subscription
+
+
+def make_run(
+    dir: "Path",
+    run_command: str = "sh run.sh",
+    delay: str = "0.1",
+    venv_cache: "Optional[VenvCache]" = None,
+) -> BenchmarkRun:
+    """
+    Create a run of a benchmark printing the `x` stat after `delay` seconds.
+
+    With a `venv_cache` the benchmark has a (cached) virtualenv and no setup
+    files.
+    """
+    dir.mkdir(exist_ok=True)
+    (dir / "presets").mkdir()
+    with open(dir / "presets" / "preset1.json", "w") as file:
+        dump({"args": [delay]}, file)
+    (dir / "run.sh").write_text('echo start; sleep "$1"; echo "x: 42"; echo done >&2\n')
+    with open(dir / "benchmark.json", "w") as file:
+        dump(
+            {
+                "name": "Async",
+                "description": "Runs asynchronously",
+                "default_preset": "preset1",
+                "setup_command": "touch setup.txt" if venv_cache is None else "true",
+                "run_command": run_command,
+                "test_command": "true",
+                "cleanup_command": "rm setup.txt" if venv_cache is None else "true",
+                "stats": {"x": {"regex": "x: (\\d+)"}},
+                "virtualenv": venv_cache is not None,
+            },
+            file,
+        )
+
+    benchmark = Benchmark.from_definition_file(str(dir / "benchmark.json"))
+    return BenchmarkRun(
+        benchmark, benchmark.get_presets(), force_setup=True, venv_cache=venv_cache
+    )
+
+
+async def collect(subscription: "Subscription") -> "List[RunnerEvent]":
+    return [event async for event in subscription]
+
+
+def test_runner_events(tmp_path: "Path") -> None:
+    benchmark_run = make_run(tmp_path)
+
+    async def main() -> "Any":
+        runner = AsyncBenchmarkRunner()
+        events = create_task(collect(runner.subscribe()))
+        stats = await runner.run(benchmark_run)
+        runner.close()
+        return stats, await events
+
+    stats, events = run(main())
+    assert stats == {"preset1": {"x": 42}}
+    assert not (tmp_path / "setup.txt").exists()
+
+    started = [e for e in events if isinstance(e, TaskStarted)]
+    assert [(e.phase, e.task.args) for e in started] == [
+        ("setup", ["touch", "setup.txt"]),
+        ("run", ["sh", "run.sh", "0.1"]),
+        ("cleanup", ["rm", "setup.txt"]),
+    ]
+    assert all(
+        e.returncode == 0 and not e.timed_out
+        for e in events
+        if isinstance(e, TaskFinished)
+    )
+
+    output = [(e.stream, e.line) for e in events if isinstance(e, TaskOutput)]
+    assert output == [("stdout", "start"), ("stdout", "x: 42"), ("stderr", "done")]
+
+    (stat,) = [e for e in events if isinstance(e, StatFound)]
+    assert (stat.preset.name if stat.preset else None, stat.name) == ("preset1", "x")
+    assert events[-1].serialize()["stats"] == {"preset1": {"x": 42}}
+
+    # The setup is stamped once it succeeded (the cleanup removed its input)
+    (tmp_path / "setup.txt").touch()
+    benchmark_run.force_setup = False
+    assert list(benchmark_run.setup()) == []
+
+
+def test_runner_timeout(tmp_path: "Path") -> None:
+    runner = AsyncBenchmarkRunner(task_timeout=0.5)
+    subscription = runner.subscribe()
+    benchmark_run = make_run(tmp_path, "sleep 10")
+
+    start = monotonic()
+    with raises(TaskFailed) as e:
+        run(runner.run(benchmark_run))
+    assert e.value.timed_out
+    assert monotonic() - start < 5
+
+    runner.close()
+    events = run(collect(subscription))
+    finished = [e for e in events if isinstance(e, TaskFinished)]
+    assert [(e.phase, e.timed_out) for e in finished] == [
+        ("setup", False),
+        ("run", True),
+        ("cleanup", False),
+    ]
+    assert str(events[-1].serialize()["error"]).endswith("timed out")
+
+
+def test_runner_concurrency(tmp_path: "Path") -> None:
+    runs = [make_run(tmp_path / str(i), delay="1") for i in range(3)]
+    runs.append(make_run(tmp_path / "3", "false"))
+
+    start = monotonic()
+    results = run(AsyncBenchmarkRunner().run_all(runs))
+    assert monotonic() - start < 2.5
+
+    # A failed run doesn't stop the other ones
+    assert results[:3] == [{"preset1": {"x": 42}}] * 3
+    assert isinstance(results[3], TaskFailed) and results[3].returncode == 1
+
+    start = monotonic()
+    assert len(run(AsyncBenchmarkRunner(jobs=1).run_all(runs[:2]))) == 2
+    assert monotonic() - start >= 2
+
+
+def test_runner_venv_cache(tmp_path: "Path") -> None:
+    from asyncio import wait_for
+
+    # Concurrent runs building the same virtualenv wait for each other
+    cache = VenvCache(str(tmp_path / "venvs"))
+    runs = [make_run(tmp_path / str(i), venv_cache=cache) for i in range(2)]
+
+    results = run(wait_for(AsyncBenchmarkRunner().run_all(runs), 60))
+    assert results == [{"preset1": {"x": 42}}] * 2
+    assert len(list((tmp_path / "venvs").glob("*/pyvenv.cfg"))) == 1
+
+
+def test_runner_cancel(tmp_path: "Path") -> None:
+    benchmark_run = make_run(tmp_path, "sleep 10")
+
+    async def main() -> "List[RunnerEvent]":
+        from asyncio import CancelledError
+
+        runner = AsyncBenchmarkRunner()
+        subscription = runner.subscribe()
+        job = create_task(runner.run(benchmark_run))
+        async for event in subscription:
+            if isinstance(event, TaskStarted) and event.phase == "run":
+                break
+
+        await sleep(0.1)
+        job.cancel()
+        with raises(CancelledError):
+            await job
+        runner.close()
+        return await collect(subscription)
+
+    start = monotonic()
+    events = run(main())
+    assert monotonic() - start < 5
+
+    (finished,) = [e for e in events if isinstance(e, TaskFinished)]
+    assert finished.cancelled and finished.returncode is not None
+    # The cleanup is not run
+    assert (tmp_path / "setup.txt").exists()
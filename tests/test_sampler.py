@@ -0,0 +1,101 @@
+from pytest import approx, mark
+from subprocess import Popen
+from sys import executable
+
+from openforbc_benchmark.sampler import (
+    get_children,
+    is_supported,
+    read_process,
+    ResourceSampler,
+)
+
+pytestmark = mark.skipif(not is_supported(), reason="/proc is not available")
+
+
+def test_read_process() -> None:
+    from os import getpid, getppid
+
+    usage = read_process(getpid())
+    assert usage is not None
+    assert usage["ppid"] == getppid()
+    assert usage["rss"] > 0
+    assert usage["cpu_time"] > 0
+
+    proc = Popen([executable, "-c", "import time; time.sleep(10)"])
+    try:
+        assert proc.pid in get_children(getpid())
+    finally:
+        proc.kill()
+        proc.wait()
+
+    assert read_process(proc.pid) is None
+    assert get_children(proc.pid) == []
+
+
+def test_resource_sampler() -> None:
+    sampler = ResourceSampler(0.05)
+    assert sampler.summarize() == {}
+
+    # A busy child allocating 64 MiB, spawned by another process
+    busy = (
+        "import time\\n"
+        "x = bytearray(64 * 2**20)\\n"
+        "start = time.monotonic()\\n"
+        "while time.monotonic() - start < 0.5: pass"
+    )
+    proc = Popen(
+        [
+            executable,
+            "-c",
+            f"import subprocess, sys; subprocess.run([sys.executable, '-c', '{busy}'])",
+        ]
+    )
+    sampler.start(proc.pid)
+    proc.wait()
+    sampler.stop()
+
+    assert sampler.samples
+    assert max(s["processes"] for s in sampler.samples) == 2
+    assert all(s["task"] == 1 for s in sampler.samples)
+
+    summary = sampler.summarize()
+    assert summary["proc_peak_rss_mb"] >= 64
+    assert summary["proc_cpu_time"] >= 0.4
+    assert summary["proc_cpu_percent_mean"] == approx(
+        100 * summary["proc_cpu_time"] / sampler.usage["wall_time"]
+    )
+    assert summary["proc_cpu_percent_max"] > 50
+    assert summary["proc_minor_faults"] > 0
+
+    # Processes exiting before the first sample still count
+    proc = Popen(["true"])
+    sampler.start(proc.pid)
+    proc.wait()
+    sampler.stop()
+
+    assert sampler.usage["cpu_time"] >= summary["proc_cpu_time"]
+    assert sampler.summarize()["proc_minor_faults"] > summary["proc_minor_faults"]
+
+
+def test_resource_sampler_peak_rss() -> None:
+    from subprocess import run
+
+    # A child larger than the next ones, waited for before sampling
+    run([executable, "-c", "x = bytearray(128 * 2**20)"])
+
+    # The 64 MiB are freed right away
+    proc = Popen(
+        [
+            executable,
+            "-c",
+            "import time\n" "x = bytearray(64 * 2**20)\n" "del x\n" "time.sleep(0.5)",
+        ]
+    )
+    sampler = ResourceSampler(0.05)
+    sampler.start(proc.pid)
+    proc.wait()
+    sampler.stop()
+
+    assert sampler.samples[-1]["rss"] < 64 * 2**20
+    assert sampler.samples[-1]["peak_rss"] >= 64 * 2**20
+    assert sampler.summarize()["proc_peak_rss_mb"] >= 64
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import sleep
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.json import ResourcesDefinition
+from openforbc_benchmark.scheduler import ResourceScheduler
+
+if TYPE_CHECKING:
+    from typing import List, Set
+
+
+class Tracker:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.running: "Set[str]" = set()
+        self.overlaps: "List[Set[str]]" = []
+
+    def __call__(self, name: str) -> str:
+        with self.lock:
+            self.running.add(name)
+            self.overlaps.append(set(self.running))
+        sleep(0.05)
+        with self.lock:
+            self.running.remove(name)
+        return name.upper()
+
+
+def test_scheduler_concurrency() -> None:
+    tracker = Tracker()
+    jobs = [(name, ResourcesDefinition(cores=1)) for name in "abcd"]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = dict(ResourceScheduler(2, cores=4).run(executor, tracker, jobs))
+
+    assert results == {0: "A", 1: "B", 2: "C", 3: "D"}
+    assert max(len(x) for x in tracker.overlaps) == 2
+
+
+def test_scheduler_cores() -> None:
+    tracker = Tracker()
+    jobs = [(name, ResourcesDefinition(cores=3)) for name in "abc"]
+
+    with ThreadPoolExecutor(4) as executor:
+        list(ResourceScheduler(4, cores=4).run(executor, tracker, jobs))
+
+    assert max(len(x) for x in tracker.overlaps) == 1
+
+
+def test_scheduler_exclusive() -> None:
+    tracker = Tracker()
+    jobs = [
+        ("a", ResourcesDefinition()),
+        ("b", ResourcesDefinition()),
+        ("x", ResourcesDefinition(exclusive=True)),
+        ("c", ResourcesDefinition()),
+        ("d", ResourcesDefinition()),
+    ]
+
+    with ThreadPoolExecutor(4) as executor:
+        list(ResourceScheduler(4, cores=4).run(executor, tracker, jobs))
+
+    assert all(x == {"x"} for x in tracker.overlaps if "x" in x)
+    assert max(len(x) for x in tracker.overlaps) == 2
+
+
+def test_scheduler_error() -> None:
+    from pytest import raises
+
+    started: "List[int]" = []
+
+    def job(i: int) -> int:
+        started.append(i)
+        if i == 0:
+            raise ValueError("job failed")
+        return i
+
+    jobs = [(i, ResourcesDefinition()) for i in range(3)]
+    with ThreadPoolExecutor(1) as executor, raises(ValueError):
+        list(ResourceScheduler(1, cores=1).run(executor, job, jobs))
+
+    assert started == [0]
@@ -0,0 +1,127 @@
+from json import dump
+from subprocess import run
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import List
+
+
+def make_benchmark(dir: "Path") -> Benchmark:
+    """Create a benchmark building `out.txt` from `src.txt` with `build.sh`."""
+    (dir / "presets").mkdir()
+    (dir / "presets" / "preset1.json").write_text("{}")
+    (dir / "src.txt").write_text("1\n")
+    (dir / "build.sh").write_text("cat src.txt > out.txt\n")
+    with open(dir / "benchmark.json", "w") as file:
+        dump(
+            {
+                "name": "Build",
+                "description": "Builds its output",
+                "default_preset": "preset1",
+                "setup_command": [
+                    {
+                        "command": "sh build.sh",
+                        "inputs": ["src.txt"],
+                        "outputs": ["out.txt"],
+                    },
+                    "chmod +x out.txt",
+                ],
+                "run_command": "cat out.txt",
+                "test_command": "true",
+                "stats": {"x": {"regex": "(\\d+)"}},
+            },
+            file,
+        )
+
+    return Benchmark.from_definition_file(str(dir / "benchmark.json"))
+
+
+def run_setup(benchmark: Benchmark, force: bool = False) -> "List[List[str]]":
+    """Run a benchmark's setup, returning the commands which were run."""
+    args = []
+    for task in BenchmarkRun(benchmark, [], force_setup=force).setup():
+        run(**task.into_popen_args(), check=True)
+        args.append(task.args)
+
+    return args
+
+
+def test_setup_stamps(tmp_path: "Path") -> None:
+    benchmark = make_benchmark(tmp_path)
+    build, chmod = ["sh", "build.sh"], ["chmod", "+x", "out.txt"]
+
+    assert run_setup(benchmark) == [build, chmod]
+    assert run_setup(benchmark) == []
+
+    # Commands after one which is run again are run again as well
+    (tmp_path / "src.txt").write_text("2\n")
+    assert run_setup(benchmark) == [build, chmod]
+    assert run_setup(benchmark) == []
+
+    (tmp_path / "out.txt").unlink()
+    assert run_setup(benchmark) == [build, chmod]
+
+    # Files in the command's arguments are inputs too
+    (tmp_path / "build.sh").write_text("cat src.txt src.txt > out.txt\n")
+    assert run_setup(benchmark) == [build, chmod]
+
+    (tmp_path / "out.txt").write_text("3\n")
+    assert run_setup(benchmark) == [build, chmod]
+
+    assert run_setup(benchmark, force=True) == [build, chmod]
+
+    benchmark_run = BenchmarkRun(benchmark, [])
+    assert list(benchmark_run.setup()) == []
+    assert [task.args for task in benchmark_run.skipped_setup] == [build, chmod]
+
+
+def test_setup_stamps_failure(tmp_path: "Path") -> None:
+    from pytest import raises
+    from subprocess import CalledProcessError
+
+    benchmark = make_benchmark(tmp_path)
+    assert len(run_setup(benchmark)) == 2
+
+    (tmp_path / "src.txt").write_text("2\n")
+    (tmp_path / "build.sh").write_text("exit 1\n")
+    with raises(CalledProcessError):
+        run_setup(benchmark)
+
+    # A failed command is not stamped, even if its outputs are unchanged
+    (tmp_path / "build.sh").write_text("cat src.txt > out.txt\n")
+    (tmp_path / "src.txt").write_text("1\n")
+    assert len(run_setup(benchmark)) == 2
+    assert (tmp_path / "out.txt").read_text() == "1\n"
+
+
+def test_setup_stamps_concurrent(tmp_path: "Path") -> None:
+    from threading import Thread
+
+    from openforbc_benchmark.setup_stamps import SetupStamps
+
+    benchmark = make_benchmark(tmp_path)
+    assert benchmark.setup_commands is not None
+    task = benchmark.setup_commands[0].into_runnable()
+    errors: "List[BaseException]" = []
+
+    def record() -> None:
+        try:
+            for _ in range(50):
+                SetupStamps(str(tmp_path)).record(0, task)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert SetupStamps(str(tmp_path)).is_valid(0, task)
+    assert [p.name for p in tmp_path.glob(".setup-stamps.json*")] == [
+        ".setup-stamps.json"
+    ]
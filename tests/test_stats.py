@@ -0,0 +1,115 @@
+from io import StringIO
+from pytest import raises
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import BenchmarkStatsMatchError
+from openforbc_benchmark.json import StatMatchInfo
+from openforbc_benchmark.stats import MAX_LINE_LENGTH, SeriesCollector, StatMatcher
+
+from tests.test_benchmark import get_dummy_run
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import List, Tuple, Union
+
+
+def test_stat_matcher_stream() -> None:
+    matched: "List[Tuple[str, Union[int, float]]]" = []
+    matcher = StatMatcher(
+        {
+            "time": StatMatchInfo(r"time: (\d+\.\d+)"),
+            "count": StatMatchInfo(r"count: (\d+)"),
+        },
+        lambda name, value: matched.append((name, value)),
+    )
+
+    # Chunks are split in the middle of lines and of UTF-8 characters
+    output = "héllo\ncount: 12\r\ncount: 13\ntime: 1.5".encode()
+    for i in range(len(output)):
+        matcher.feed(output[i : i + 1])
+    assert matched == [("count", 12)]
+
+    assert matcher.get_stats() == {"time": 1.5, "count": 12}
+    assert matched == [("count", 12), ("time", 1.5)]
+
+
+def test_stat_matcher_multiline() -> None:
+    output = "FPS:    58.3\nsomething else\nFPS:    60.2\r\nUnigine~# quit\n"
+    regex = r"FPS:\s+(\d+(?:\.\d+))\nUnigine~# quit"
+
+    matcher = StatMatcher({"fps": StatMatchInfo(regex, lines=2)})
+    matcher.feed_text(output)
+    assert matcher.get_stats() == {"fps": 60.2}
+
+    # Without a window, regexes are matched against single lines
+    matcher = StatMatcher({"fps": StatMatchInfo(regex)})
+    matcher.feed_text(output)
+    with raises(BenchmarkStatsMatchError):
+        matcher.get_stats()
+
+
+def test_stat_matcher_bounded_memory() -> None:
+    matcher = StatMatcher({"stat": StatMatchInfo(r"stat: (\d+)", lines=3)})
+    for _ in range(100):
+        matcher.feed(b"x" * MAX_LINE_LENGTH)
+        matcher.feed(b"\nfiller\n" * 10)
+    assert len(matcher._window) == 3
+    assert len(matcher._partial) <= MAX_LINE_LENGTH
+
+    matcher.feed(b"stat: 1\n")
+    assert matcher.get_stats() == {"stat": 1}
+
+
+def test_stat_matcher_file(tmp_path: "Path") -> None:
+    (tmp_path / "results.txt").write_text("score = 42\n")
+    matcher = StatMatcher(
+        {
+            "score": StatMatchInfo(r"score = (\d+)", "results.txt"),
+            "time": StatMatchInfo(r"time: (\d+)"),
+        }
+    )
+    matcher.feed(b"score = 1\ntime: 3\n")
+    assert matcher.get_stats(str(tmp_path)) == {"score": 42, "time": 3}
+
+
+def test_stat_matcher_partial(tmp_path: "Path") -> None:
+    matcher = StatMatcher(
+        {
+            "score": StatMatchInfo(r"score = (\d+)", "results.txt"),
+            "time": StatMatchInfo(r"time: (\d+)"),
+            "count": StatMatchInfo(r"count: (\d+)"),
+        }
+    )
+    matcher.feed(b"count: 3\n")
+
+    # Missing stats and stats files are skipped
+    assert matcher.get_stats(str(tmp_path), partial=True) == {"count": 3}
+
+
+def test_benchmark_run_get_stats() -> None:
+    run = get_dummy_run()
+    assert run.get_stats(StringIO("running\ndata: 135246\n")) == {"data_1": 135246}
+
+    with raises(BenchmarkStatsMatchError):
+        run.get_stats(StringIO("no data\n"))
+
+
+def test_series_collector() -> None:
+    collector = SeriesCollector()
+    records = (
+        b'{"stat": "latency", "value": 0.5, "time": 1.0, "count": 4}\n'
+        b"not json\n\n"
+        b'{"stat": "latency", "value": "slow"}\n'
+        b'{"stat": "loss", "value": 2}\n'
+        b'{"stat": "latency", "value": 0.25, "time": 2.0, "count": 4}'
+    )
+    for i in range(0, len(records), 7):
+        collector.feed(records[i : i + 7])
+    collector.close()
+
+    assert collector.errors == 2
+    latency = collector.distributions["latency"]
+    assert list(latency.samples) == [0.5, 0.25]
+    assert latency.get_throughput() == 4
+    # Records without a time are timestamped when read
+    assert len(collector.distributions["loss"].timestamps) == 1
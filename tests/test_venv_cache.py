@@ -0,0 +1,166 @@
+from os.path import dirname, exists, join, pardir
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.benchmark import Benchmark, BenchmarkRun
+from openforbc_benchmark.venv_cache import get_venv_key, VenvCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from typing import Iterator
+    from openforbc_benchmark.utils import Runnable
+
+O4BC_BENCH_DIR = join(dirname(__file__), pardir)
+
+
+def copy_dummy_py_benchmark(dir: str) -> Benchmark:
+    from shutil import copytree
+
+    path = join(dir, "dummy_py_benchmark")
+    copytree(join(O4BC_BENCH_DIR, "benchmarks", "dummy_py_benchmark"), path)
+    return Benchmark.from_definition_file(join(path, "benchmark.json"))
+
+
+def run_setup(tasks: "Iterator[Runnable]") -> int:
+    """Pretend to run setup tasks, creating a fake virtualenv."""
+    from os import makedirs
+
+    count = 0
+    for count, task in enumerate(tasks, 1):
+        if task.args[:3] == ["python3", "-m", "venv"]:
+            makedirs(join(task.args[3], "bin"))
+            with open(join(task.args[3], "bin", "python"), "w") as file:
+                file.write("x" * 1000)
+
+    return count
+
+
+def test_venv_key(tmp_path: "Path") -> None:
+    benchmark = copy_dummy_py_benchmark(str(tmp_path / "a"))
+    other = copy_dummy_py_benchmark(str(tmp_path / "b"))
+
+    # Identical setups share the same key, wherever they are
+    key = get_venv_key(benchmark)
+    assert get_venv_key(other) == key
+
+    with open(join(other.dir, "requirements.txt"), "w") as file:
+        file.write("numpy\n")
+    assert get_venv_key(other) != key
+
+    # Files referred to by setup commands are part of the key
+    assert benchmark.setup_commands is not None
+    benchmark.setup_commands[0].command = ["sh", "setup.sh"]
+    with open(join(benchmark.dir, "presets", "setup.sh"), "w") as file:
+        file.write("echo 1\n")
+    key = get_venv_key(benchmark)
+    with open(join(benchmark.dir, "presets", "setup.sh"), "w") as file:
+        file.write("echo 2\n")
+    assert get_venv_key(benchmark) != key
+
+
+def test_venv_cache_setup(tmp_path: "Path") -> None:
+    from os import remove, stat
+    from stat import S_IWUSR
+
+    cache = VenvCache(str(tmp_path / "venvs"))
+    benchmark = copy_dummy_py_benchmark(str(tmp_path))
+    key = get_venv_key(benchmark)
+    path = cache.get_path(key)
+
+    # An abandoned build is discarded
+    tasks = BenchmarkRun(benchmark, [], venv_cache=cache).setup()
+    assert next(tasks).args == ["python3", "-m", "venv", path]
+    del tasks
+    assert not cache.is_ready(key)
+
+    run = BenchmarkRun(benchmark, [], venv_cache=cache)
+    assert run_setup(run.setup()) == 2
+    assert cache.is_ready(key)
+    assert not stat(join(path, "bin", "python")).st_mode & S_IWUSR
+
+    # The setup is skipped when the virtualenv is cached
+    run = BenchmarkRun(benchmark, [benchmark.get_default_preset()], venv_cache=cache)
+    assert run_setup(run.setup()) == 0
+    for _, tasks in run.run():
+        for task in tasks:
+            assert task.env is not None and task.env["VIRTUAL_ENV"] == path
+
+    # Setup commands are run again in a fresh checkout, with the cached virtualenv
+    other = copy_dummy_py_benchmark(str(tmp_path / "other"))
+    assert other.setup_commands is not None
+    other.setup_commands[0].outputs = ["setup.txt"]
+    assert get_venv_key(other) == key
+
+    run = BenchmarkRun(other, [], venv_cache=cache)
+    setup = list(run.setup())
+    assert [task.args for task in setup] == [["echo", "hello world"]]
+    assert setup[0].env is not None
+    assert setup[0].env["VIRTUAL_ENV"] == path
+    assert setup[0].env["PIP_NO_INDEX"] == "1"
+
+    # ...until their outputs are there
+    with open(join(other.dir, "presets", "setup.txt"), "w") as file:
+        file.write("done\n")
+    assert run_setup(BenchmarkRun(other, [], venv_cache=cache).setup()) == 1
+    assert run_setup(BenchmarkRun(other, [], venv_cache=cache).setup()) == 0
+
+    remove(join(other.dir, "presets", "setup.txt"))
+    assert run_setup(BenchmarkRun(other, [], venv_cache=cache).setup()) == 1
+
+
+def test_venv_cache_force_setup(tmp_path: "Path") -> None:
+    cache = VenvCache(str(tmp_path / "venvs"))
+    benchmark = copy_dummy_py_benchmark(str(tmp_path))
+    key = get_venv_key(benchmark)
+    path = cache.get_path(key)
+
+    run = BenchmarkRun(benchmark, [], venv_cache=cache)
+    assert run_setup(run.setup()) == 2
+    del run
+
+    # A forced setup builds the virtualenv again...
+    forced = BenchmarkRun(benchmark, [], venv_cache=cache, force_setup=True)
+    tasks = forced.setup()
+    assert next(tasks).args == ["python3", "-m", "venv", path]
+    del tasks
+    assert not cache.is_ready(key)
+
+    # ...unless another run is using it
+    assert run_setup(forced.setup()) == 2
+    assert cache.is_ready(key)
+    with open(join(path, ".built"), "w") as file:
+        file.write("")
+
+    other = BenchmarkRun(benchmark, [], venv_cache=cache, force_setup=True)
+    assert [task.args for task in other.setup()] == [["echo", "hello world"]]
+    assert cache.is_ready(key)
+    assert exists(join(path, ".built"))
+
+
+def test_venv_cache_evict(tmp_path: "Path") -> None:
+    cache = VenvCache(str(tmp_path / "venvs"), max_size=2500)
+    benchmarks = [copy_dummy_py_benchmark(str(tmp_path / str(i))) for i in range(4)]
+    for i, benchmark in enumerate(benchmarks):
+        with open(join(benchmark.dir, "requirements.txt"), "w") as file:
+            file.write(f"package{i}\n")
+
+    keys = [get_venv_key(benchmark) for benchmark in benchmarks]
+    runs = [BenchmarkRun(benchmark, [], venv_cache=cache) for benchmark in benchmarks]
+
+    run_setup(runs[0].setup())
+    run_setup(BenchmarkRun(benchmarks[1], [], venv_cache=cache).setup())
+    assert cache.is_ready(keys[0]) and cache.is_ready(keys[1])
+
+    # The least recently used virtualenv not in use is evicted
+    run_setup(runs[2].setup())
+    assert cache.is_ready(keys[0])
+    assert not cache.is_ready(keys[1])
+    assert cache.is_ready(keys[2])
+
+    # Virtualenvs in use are kept even if the cache grows too much
+    run_setup(runs[3].setup())
+    assert all(cache.is_ready(key) for key in (keys[0], keys[2], keys[3]))
+    assert sum(size for _, size, _ in cache.get_entries()) == 3000
+
+    assert runs[0]._venv_lock is not None
+    runs[0]._venv_lock.close()
+    assert cache.evict() == [keys[0]]
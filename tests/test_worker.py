@@ -0,0 +1,102 @@
+from pytest import raises
+from sys import executable
+from typing import TYPE_CHECKING
+
+from openforbc_benchmark.stats import SeriesCollector
+from openforbc_benchmark.utils import Runnable
+from openforbc_benchmark.worker import (
+    BenchmarkWorker,
+    WorkerError,
+    WorkerRestart,
+    WorkerTask,
+    WorkerTimeout,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# A worker echoing its arguments, exiting (or asking to be restarted) when asked to
+WORKER = """
+import json, os, sys, time
+
+channel = os.fdopen(int(os.environ["O4BCB_STATS_FD"]), "w", buffering=1)
+print("worker started", flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["args"] == ["exit"]:
+        sys.exit(3)
+    if request["args"] == ["hang"]:
+        time.sleep(30)
+    if request["args"] == ["restart"]:
+        channel.write(json.dumps({"id": request["id"], "restart": True}) + "\\n")
+        sys.exit()
+
+    channel.write(json.dumps({"stat": "latency", "value": 0.5}) + "\\n")
+    output = f"pid: {os.getpid()}\\nargs: {' '.join(request['args'])}\\n"
+    reply = {"id": request["id"], "status": len(request["args"]), "output": output}
+    channel.write(json.dumps(reply) + "\\n")
+"""
+
+
+def test_worker(tmp_path: "Path") -> None:
+    worker = BenchmarkWorker(
+        Runnable([executable, "-c", WORKER]), str(tmp_path / "worker")
+    )
+    worker.start()
+    assert worker.is_running()
+
+    collector = SeriesCollector()
+    ret, output = worker.run(WorkerTask(["bench", "a"]), collector)
+    assert ret == 2
+    pid, args = output.decode().splitlines()
+    assert args == "args: bench a"
+
+    # The same process runs every command
+    ret, output = worker.run(WorkerTask(["bench"]))
+    assert ret == 1
+    assert output.decode().splitlines() == [pid, "args: bench"]
+
+    collector.close()
+    assert list(collector.distributions["latency"].samples) == [0.5]
+
+    assert worker.stop() == 0
+    assert not worker.is_running()
+    assert "worker started" in (tmp_path / "worker.out.log").read_text()
+
+
+def test_worker_exit(tmp_path: "Path") -> None:
+    worker = BenchmarkWorker(
+        Runnable([executable, "-c", WORKER]), str(tmp_path / "worker")
+    )
+    worker.start()
+
+    with raises(WorkerError):
+        worker.run(WorkerTask(["exit"]))
+    assert worker.stop() == 3
+
+
+def test_worker_restart(tmp_path: "Path") -> None:
+    worker = BenchmarkWorker(
+        Runnable([executable, "-c", WORKER]), str(tmp_path / "worker")
+    )
+    worker.start()
+
+    with raises(WorkerRestart):
+        worker.run(WorkerTask(["restart"]))
+    assert worker.stop() == 0
+
+
+def test_worker_timeout(tmp_path: "Path") -> None:
+    from time import monotonic
+
+    worker = BenchmarkWorker(
+        Runnable([executable, "-c", WORKER]), str(tmp_path / "worker")
+    )
+    worker.start()
+    assert worker.run(WorkerTask(["bench"], timeout=5))[0] == 1
+
+    start = monotonic()
+    with raises(WorkerTimeout):
+        worker.run(WorkerTask(["hang"], timeout=0.5))
+    assert monotonic() - start < 10
+    assert worker.stop() == -9